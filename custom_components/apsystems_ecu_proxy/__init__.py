@@ -1,26 +1,31 @@
-from datetime import datetime, timedelta
+from datetime import datetime
 import logging
+import time
 from typing import Any
 
 from homeassistant.components.network import async_get_source_ip
 from homeassistant.components.persistent_notification import async_create
 from homeassistant.config_entries import ConfigEntry
-from homeassistant.core import HomeAssistant
+from homeassistant.core import Event, HomeAssistant, callback
 from homeassistant.helpers import device_registry as dr
 from homeassistant.helpers.dispatcher import async_dispatcher_send
-from homeassistant.helpers.event import async_call_later, async_track_utc_time_change
-from homeassistant.util.dt import as_local
 
 from .api import MySocketAPI
 from .const import (
     ATTR_INVERTERS,
     ATTR_TIMESTAMP,
-    ATTR_VALUE_IF_NO_UPDATE,
     DOMAIN,
     SOCKET_PORTS,
+    SummationPeriod,
 )
-from .helpers import slugify
-from .sensor import ECU_SENSORS, INVERTER_CHANNEL_SENSORS, INVERTER_SENSORS, SensorData
+from .dedup import FrameDedup
+from .energy import EnergyIntegrator, InverterEnergyIntegrator
+from .hub import FrameHub
+from .parser import MODELS_FILE, UNKNOWN_MODEL, load_models
+from .scheduler import PeriodScheduler
+from .services import async_setup_services, async_unload_services
+from .stats import STAGE_SENSOR_WRITE, StageTimings
+from .watchdog import StaleDeviceWatchdog
 
 _LOGGER = logging.getLogger(__name__)
 PLATFORMS = ["sensor"]
@@ -35,6 +40,11 @@ async def async_setup_entry(hass: HomeAssistant, config_entry: ConfigEntry):
 
     hass.data.setdefault(DOMAIN, {})
 
+    # Add inverter models defined by the user before frames are interpreted.
+    await hass.async_add_executor_job(
+        load_models, hass.config.path(DOMAIN, MODELS_FILE)
+    )
+
     # Initialize the API manager
     api_handler = APIManager(hass, config_entry)
     await api_handler.setup_socket_servers()
@@ -45,6 +55,8 @@ async def async_setup_entry(hass: HomeAssistant, config_entry: ConfigEntry):
     # Forward any configured platforms (e.g., sensors)
     await hass.config_entries.async_forward_entry_setups(config_entry, PLATFORMS)
 
+    await async_setup_services(hass)
+
     # Add an update listener to listen for config entry changes
     config_entry.add_update_listener(update_listener)
 
@@ -64,18 +76,21 @@ async def update_listener(hass: HomeAssistant, config_entry: ConfigEntry):
         if new_timeout != api_handler.no_update_timeout:
             _LOGGER.debug("no_update_timeout has changed. Updating API manager.")
             api_handler.no_update_timeout = new_timeout
+            api_handler.watchdog.set_timeout(new_timeout, time.monotonic())
 
-            # Reset the existing no_update_timer.
-            if api_handler.no_update_timer_unregister:
-                api_handler.no_update_timer_unregister()
-            api_handler.no_update_timer_unregister = async_call_later(
-                hass, timedelta(seconds=new_timeout), api_handler.fire_no_update
-            )
+    api_handler.frame_dedup.max_age = int(config_entry.data.get("message_ignore_age"))
+    max_stub_interval = int(config_entry.data.get("max_stub_interval"))
+    api_handler.inverter_energy.max_stub_interval = max_stub_interval
+    for integrator in api_handler.energy.values():
+        integrator.max_stub_interval = max_stub_interval
 
     # Update config values in api module.
     for socket_server in api_handler.socket_servers:
         socket_server.update_config(config_entry)
 
+    # Sensors read the write mode and force write interval again.
+    async_dispatcher_send(hass, f"{DOMAIN}_write_settings")
+
 
 async def async_unload_entry(hass: HomeAssistant, config_entry: ConfigEntry) -> bool:
     """Unload a config entry."""
@@ -91,6 +106,7 @@ async def async_unload_entry(hass: HomeAssistant, config_entry: ConfigEntry) ->
 
     # Remove the config entry from the hass data object.
     if unload_ok:
+        await async_unload_services(hass)
         hass.data[DOMAIN].pop(config_entry.entry_id)
         _LOGGER.debug("%s unloaded config id - %s", DOMAIN, config_entry.entry_id)
 
@@ -124,27 +140,55 @@ class APIManager:
         self.hass = hass
         self.config_entry = config_entry
 
-        # Add listener for midnight reset.
-        self.midnight_tracker_unregister = async_track_utc_time_change(
-            hass, self.midnight_reset, "0", "0", "0", local=True
-        )
-
         # Get configuration
         self.no_update_timeout = int(self.config_entry.data.get("no_update_timeout"))
 
-        # Add listener for 0 or None if no update.
-        self.no_update_timer_unregister = None
+        # Sets 0 or None on sensors of devices without update.
+        self.watchdog = StaleDeviceWatchdog(
+            hass, self.no_update_timeout, self.fire_no_update
+        )
 
-    async def midnight_reset(self, *args):
-        """Send dispatcher message to all listeners to reset."""
-        _LOGGER.debug("midnight reset")
+        # Index of registered devices by identifier (ecu_<id> or inverter_<uid>),
+        # kept in sync with the device registry.
+        self.known_devices: set[str] = set()
+        # Devices registered with an unknown model, so without channel sensors.
+        self.unknown_model_devices: set[str] = set()
+        self._device_identifiers: dict[str, set[str]] = {}
+        self._load_known_devices()
+        self.device_registry_unregister = hass.bus.async_listen(
+            dr.EVENT_DEVICE_REGISTRY_UPDATED, self._device_registry_updated
+        )
 
-        attribute_values = {}
-        attribute_values[ATTR_TIMESTAMP] = as_local(datetime.now())
-        self._request_sensor_to_update(
-            f"{DOMAIN}_midnight_reset",
-            SensorData(data=0, attributes=attribute_values),
+        # Readings already received, shared by the ports.
+        self.frame_dedup = FrameDedup(
+            max_age=int(self.config_entry.data.get("message_ignore_age"))
         )
+        # Power of each ECU integrated for its summation sensors, by ECU id.
+        self.energy: dict[str, EnergyIntegrator] = {}
+        # Channel power of all inverters integrated for their energy sensors.
+        self.inverter_energy = InverterEnergyIntegrator(
+            int(self.config_entry.data.get("max_stub_interval"))
+        )
+        # Passes each frame to the sensors of its devices.
+        self.hub = FrameHub()
+        # Monotonic time of the last frame per ECU id and inverter uid.
+        self.ecu_last_frame: dict[str, float] = {}
+        self.inverter_last_frame: dict[str, float] = {}
+        # Latency of sensor state writes, while statistics sensors are enabled.
+        self.write_timings = StageTimings((STAGE_SENSOR_WRITE,))
+
+        # Resets summation sensors at the start of their period.
+        self.period_scheduler = PeriodScheduler(hass, self.period_start)
+        self.period_scheduler.async_start()
+
+    @callback
+    def period_start(self, period: SummationPeriod, start: datetime) -> None:
+        """Start period in the energy integrators and update its sensors."""
+        _LOGGER.debug("Start of %s period", period)
+        for integrator in self.energy.values():
+            integrator.advance(start)
+        self.inverter_energy.advance(start)
+        async_dispatcher_send(self.hass, f"{DOMAIN}_{period}_start")
 
     async def setup_socket_servers(self) -> None:
         """Initialise socket server."""
@@ -153,7 +197,13 @@ class APIManager:
         for port in SOCKET_PORTS:
             _LOGGER.debug("Creating server for port %s", port)
             server = MySocketAPI(
-                host, port, self.async_update_callback, self.config_entry
+                host,
+                port,
+                self.async_update_callback,
+                self.config_entry,
+                spool_path=self.hass.config.path(DOMAIN, "spool", f"{port}.spool"),
+                capture_dir=self.hass.config.path(DOMAIN, "capture"),
+                dedup=self.frame_dedup,
             )
             await server.start()
             self.socket_servers.append(server)
@@ -164,129 +214,134 @@ class APIManager:
             await socket_server.stop()
         self.socket_servers.clear()
 
-        await self.midnight_tracker_unregister()
-        if self.no_update_timer_unregister is not None:
-            self.no_update_timer_unregister()
+        self.device_registry_unregister()
+        self.period_scheduler.async_stop()
+        self.watchdog.async_stop()
 
     def get_device(self, identifiers):
         """Get device from device registry."""
         device_registry = dr.async_get(self.hass)
         return device_registry.async_get_device(identifiers)
 
+    def _load_known_devices(self) -> None:
+        """Fill known device index from the device registry."""
+        device_registry = dr.async_get(self.hass)
+        for device in dr.async_entries_for_config_entry(
+            device_registry, self.config_entry.entry_id
+        ):
+            self._index_device(device)
+        _LOGGER.debug("Known devices: %s", len(self.known_devices))
+
+    def _index_device(self, device: dr.DeviceEntry) -> None:
+        """Add device to known device index."""
+        identifiers = {
+            identifier for domain, identifier in device.identifiers if domain == DOMAIN
+        }
+        self._device_identifiers[device.id] = identifiers
+        self.known_devices.update(identifiers)
+        if device.model == UNKNOWN_MODEL:
+            self.unknown_model_devices.update(identifiers)
+        else:
+            self.unknown_model_devices.difference_update(identifiers)
+
+    @callback
+    def _device_registry_updated(self, event: Event) -> None:
+        """Keep known device index in sync with device registry changes."""
+        device_id = event.data["device_id"]
+        if event.data["action"] == "remove":
+            identifiers = self._device_identifiers.pop(device_id, set())
+            self.known_devices.difference_update(identifiers)
+            self.unknown_model_devices.difference_update(identifiers)
+            return
+
+        device = dr.async_get(self.hass).async_get(device_id)
+        if device and self.config_entry.entry_id in device.config_entries:
+            if identifiers := self._device_identifiers.pop(device_id, None):
+                self.known_devices.difference_update(identifiers)
+            self._index_device(device)
+
+    def _register_devices(
+        self, ecu: dict[str, Any] | None, inverters: list[dict[str, Any]]
+    ) -> None:
+        """Request sensor platform to create devices and add them to the index.
+
+        The new devices of a frame are registered in one go, so that their sensors
+        are added in one batch.
+        """
+        async_dispatcher_send(
+            self.hass, f"{DOMAIN}_register", {"ecu": ecu, "inverters": inverters}
+        )
+        # Registration runs synchronously, index now rather than wait for the event.
+        identifiers = [f"inverter_{inverter['uid']}" for inverter in inverters]
+        if ecu is not None:
+            identifiers.append(f"ecu_{ecu['ecu-id']}")
+        for identifier in identifiers:
+            if device := self.get_device({(DOMAIN, identifier)}):
+                self._index_device(device)
+
     def async_update_callback(self, data: dict[str, Any]):
         """Dispatcher version of update callback."""
 
-        # Cancel no update timer as we have an update.
-        if self.no_update_timer_unregister:
-            _LOGGER.debug("Cancel 'No update' timer")
-            self.no_update_timer_unregister()
-            self.no_update_timer_unregister = None
-
         ecu_id = data.get("ecu-id")
+        now = time.monotonic()
+        self.ecu_last_frame[ecu_id] = now
+        watchdog_seen = self.watchdog.seen
+        device_key = f"ecu_{ecu_id}"
+        watchdog_seen(device_key, now)
 
         # Check if ECU is registered in devices
-        if not self.get_device({(DOMAIN, f"ecu_{ecu_id}")}):
+        new_ecu = None
+        if device_key not in self.known_devices:
             _LOGGER.debug("Found new ECU: %s", ecu_id)
-            # Send signal to sensor listener to add new ECU
-            async_dispatcher_send(self.hass, f"{DOMAIN}_ecu_register", data)
-        else:
-            _LOGGER.debug("Update for ECU: %s", ecu_id)
-            # Request sensors to update
-            for sensor in ECU_SENSORS:
-                # Added for summation sensors to get initial attribute values
-                attribute_values = {}
-                if sensor.summation_entity:
-                    attribute_values[ATTR_TIMESTAMP] = data.get(ATTR_TIMESTAMP)
-                # Added to support no update value changes
-                if sensor.value_if_no_update != -1:
-                    attribute_values[ATTR_VALUE_IF_NO_UPDATE] = (
-                        sensor.value_if_no_update
-                    )
-                self._request_sensor_to_update(
-                    f"{DOMAIN}_{ecu_id}_{slugify(sensor.name)}",
-                    SensorData(
-                        data=data.get(sensor.parameter), attributes=attribute_values
-                    ),
-                )
+            new_ecu = data
 
         # Check if inverters registered in devices
+        inverter_last_frame = self.inverter_last_frame
+        new_inverters = []
         for uid, inverter in data.get(ATTR_INVERTERS, {}).items():
-            if not self.get_device({(DOMAIN, f"inverter_{uid}")}):
+            inverter_last_frame[uid] = now
+            device_key = f"inverter_{uid}"
+            watchdog_seen(device_key, now)
+            if device_key not in self.known_devices or (
+                # Model added since, registration adds the channel sensors.
+                inverter["channel_qty"] and device_key in self.unknown_model_devices
+            ):
                 _LOGGER.debug("Found new Inverter: %s", inverter.get("uid"))
 
                 # Add ecu-id to inverter data so that sensor can use this.
                 inverter["ecu-id"] = ecu_id
+                new_inverters.append(inverter)
 
-                # Send signal to sensor listener to add new Inverter
-                async_dispatcher_send(
-                    self.hass, f"{DOMAIN}_inverter_register", inverter
-                )
-            else:
-                _LOGGER.debug("Update for known inverter: %s", inverter.get("uid"))
-                for uid, inverter in data.get(ATTR_INVERTERS).items():
-                    for inverter_sensor in INVERTER_SENSORS:
-                        # Added for summation sensors to get initial attribute values
-                        attribute_values = {}
-                        if sensor.summation_entity:
-                            attribute_values[ATTR_TIMESTAMP] = data.get(ATTR_TIMESTAMP)
-                        # Added to support no update value changes
-                        if inverter_sensor.value_if_no_update != -1:
-                            attribute_values[ATTR_VALUE_IF_NO_UPDATE] = (
-                                inverter_sensor.value_if_no_update
-                            )
-                        self._request_sensor_to_update(
-                            f"{DOMAIN}_{ecu_id}_{uid}_{slugify(inverter_sensor.name)}",
-                            SensorData(
-                                data=inverter.get(inverter_sensor.parameter),
-                                attributes=attribute_values,
-                            ),
-                        )
-
-                    for channel in range(inverter.get("channel_qty", 0)):
-                        for inverter_channel_sensor in INVERTER_CHANNEL_SENSORS:
-                            try:
-                                # Added for summation sensors to get initial attribute values
-                                attribute_values = {}
-                                if inverter_channel_sensor.summation_entity:
-                                    attribute_values[ATTR_TIMESTAMP] = data.get(
-                                        ATTR_TIMESTAMP
-                                    )
-                                # Added to support no update value changes
-                                if inverter_channel_sensor.value_if_no_update != -1:
-                                    attribute_values[ATTR_VALUE_IF_NO_UPDATE] = (
-                                        inverter_channel_sensor.value_if_no_update
-                                    )
-                                self._request_sensor_to_update(
-                                    f"{DOMAIN}_{ecu_id}_{uid}_{slugify(inverter_channel_sensor.name)}_{channel + 1}",
-                                    SensorData(
-                                        data=inverter.get(
-                                            inverter_channel_sensor.parameter
-                                        )[channel],
-                                        attributes=attribute_values,
-                                    ),
-                                )
-                            except (ValueError, IndexError):
-                                _LOGGER.warning("There was a value or index error")
-                                continue
-
-        # Start the no update timer with the updated value.
-        self.no_update_timer_unregister = async_call_later(
-            self.hass, timedelta(seconds=self.no_update_timeout), self.fire_no_update
-        )
+        # Send signal to sensor listener to add new ECU and inverters
+        if new_ecu is not None or new_inverters:
+            self._register_devices(new_ecu, new_inverters)
 
-    def _request_sensor_to_update(self, channel_id: str, data: Any):
-        """Send a dispatch message to update sensor."""
-        _LOGGER.debug(
-            "Requesting %s to update with value %s",
-            channel_id.replace(f"{DOMAIN}_", ""),
-            data,
+        # Integrate once for all summation sensors, before they are updated.
+        self.energy_integrator(ecu_id).integrate(
+            data["current_power"], data[ATTR_TIMESTAMP]
+        )
+        self.inverter_energy.integrate(
+            ecu_id, data.get(ATTR_INVERTERS, {}), data[ATTR_TIMESTAMP]
         )
-        async_dispatcher_send(self.hass, channel_id, data)
 
-    async def fire_no_update(self, *args):
-        """Update no update sensors."""
-        _LOGGER.debug("Firing no update")
+        # Request sensors of known devices to update. New devices have been
+        # created with the values of this frame.
+        _LOGGER.debug("Update for ECU: %s", ecu_id)
+        self.hub.async_publish(data)
+
+    def energy_integrator(self, ecu_id: str) -> EnergyIntegrator:
+        """Get energy integrator of ECU, adding it if needed."""
+        if (integrator := self.energy.get(ecu_id)) is None:
+            integrator = self.energy[ecu_id] = EnergyIntegrator(
+                int(self.config_entry.data.get("max_stub_interval"))
+            )
+        return integrator
+
+    @callback
+    def fire_no_update(self, device_key: str):
+        """Update no update sensors of a device."""
+        _LOGGER.debug("Firing no update for %s", device_key)
         async_dispatcher_send(
             self.hass,
-            f"{DOMAIN}_no_update",
+            f"{DOMAIN}_no_update_{device_key}",
         )
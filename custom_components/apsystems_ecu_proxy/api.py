@@ -1,62 +1,66 @@
 """API to interact with APsystems ECU."""
 
 import asyncio
+from collections import Counter, defaultdict, deque
 from collections.abc import Callable
 from datetime import datetime
 import logging
-import re
+import sys
+import time
 import traceback
 from typing import Any
 
 from homeassistant.config_entries import ConfigEntry
 
+from .capture import FrameCapture
+from .const import DEFAULTS
+from .dedup import ECU_ID, FrameDedup
+from .ema import EMAConnectionPool, EMAUnavailableError
+from .framing import FrameBuffer, read_frames
+from .parser import (
+    frame_length,
+    has_valid_length,
+    is_data_frame,
+    parse_frame,
+    parse_timestamp,
+)
+from .spool import FrameSpool
+from .stats import (
+    PORT_STAGES,
+    STAGE_ECU_REPLY,
+    STAGE_EMA,
+    STAGE_FAN_OUT,
+    STAGE_PARSE,
+    STAGE_RECEIVE,
+    StageTimings,
+)
+
 _LOGGER = logging.getLogger(__name__)
 
-ECU_MODELS_216 = {
-    "2160": "ECU-R",
-    "2162": "ECU-R Pro",
-    "2163": "ECU-B",
-}
-
-ECU_MODELS_215 = {"215": "ECU-C"}
-YC500_MODEL_CODES = ["403", "404"]
-YC600_MODEL_CODES = ["406", "407", "408", "409", "703", "706"]
-QS1_MODEL_CODES = ["801", "802", "805", "806"]
-YC1000_MODEL_CODES = ["501", "502", "503", "504"]
-
-POWER_CHANNELS = [63, 83, 103, 123]
-VOLTAGE_CHANNELS = [51, 71, 91, 111]
-CURRENT_CHANNELS = [60, 80, 100, 120]
-
-INVERTER_MODELS = [
-    {
-        "name": "YC500 series",
-        "channels": 2,
-        "model_codes": YC500_MODEL_CODES,
-    },
-    {
-        "name": "YC600/DS3 series",
-        "channels": 2,
-        "model_codes": YC600_MODEL_CODES,
-    },
-    {
-        "name": "QS1",
-        "channels": 4,
-        "model_codes": QS1_MODEL_CODES,
-    },
-    {
-        "name": "YC1000/QT2",
-        "channels": 4,
-        "model_codes": YC1000_MODEL_CODES,
-    },
-]
+# Messages a connection may have waiting for EMA, further ones are not relayed.
+RELAY_QUEUE_SIZE = 16
+# Messages waiting to be interpreted before reading from the ECU pauses.
+PARSE_QUEUE_SIZE = 64
+# Seconds without a message after which an ECU connection is closed.
+CONNECTION_IDLE_TIMEOUT = 900
+# Connections per port, the oldest is closed to make room for a new one.
+MAX_CONNECTIONS = 8
+# Exceptions kept for diagnostics.
+RECENT_EXCEPTIONS = 10
 
 
 class MySocketAPI:
     """API class."""
 
     def __init__(
-        self, host: str, port: int, callback: Callable, config_entry: ConfigEntry
+        self,
+        host: str,
+        port: int,
+        callback: Callable,
+        config_entry: ConfigEntry,
+        spool_path: str | None = None,
+        capture_dir: str | None = None,
+        dedup: FrameDedup | None = None,
     ) -> None:
         """Initialize API."""
         self.host = host
@@ -70,10 +74,45 @@ class MySocketAPI:
         self.send_to_ema = self.get_config_value("send_to_ema", bool)
         self.message_ignore_age = self.get_config_value("message_ignore_age", int)
         self.ema_host = self.get_config_value("ema_host", str)
+        self.ema_pool = EMAConnectionPool(
+            self.ema_host,
+            port,
+            self.get_config_value("ema_connect_timeout", float),
+            self.get_config_value("ema_read_timeout", float),
+        )
+        # Last EMA response per message type, replayed to the ECU while EMA is down.
+        self.ema_acks: dict[bytes, bytes] = {}
+        # Data frames that could not be relayed, forwarded once EMA is back.
+        self.spool = FrameSpool(spool_path, self.ema_pool.send) if spool_path else None
+
+        # Raw messages written to capture files when enabled in the options.
+        self.capture_dir = capture_dir
+        self.capture: FrameCapture | None = None
+        # Captures being stopped, kept until their file is flushed and closed.
+        self._capture_stops: set[asyncio.Task] = set()
+        self._set_capture()
+
+        # Messages waiting to be interpreted, shared by all connections on this port.
+        self.parse_queue: asyncio.Queue[bytes] = asyncio.Queue(PARSE_QUEUE_SIZE)
+        self.parse_task: asyncio.Task | None = None
+        # Frames seen on any port of the config entry, duplicates are not parsed.
+        self.dedup = dedup
+
+        # Open ECU connections, oldest first, with their relay queue.
+        self.connections: dict[asyncio.StreamWriter, asyncio.Queue] = {}
+        # Messages accepted, not interpreted by reason, and exceptions.
+        self.message_counts: Counter[str] = Counter()
+        # The same counts of data frames by ECU id, for the sensors of each ECU.
+        self.ecu_message_counts: defaultdict[str, Counter[str]] = defaultdict(Counter)
+        # Bytes and messages from and to the ECU.
+        self.traffic: Counter[str] = Counter()
+        self.recent_exceptions: deque[dict[str, str]] = deque(maxlen=RECENT_EXCEPTIONS)
+        # Latency of each stage, while statistics sensors are enabled.
+        self.timings = StageTimings(PORT_STAGES)
 
     def get_config_value(self, key, default_type):
         """Get config value."""
-        return default_type(self.config_entry.data.get(key))
+        return default_type(self.config_entry.data.get(key, DEFAULTS.get(key)))
 
     def update_config(self, new_config_entry: ConfigEntry):
         """Update configuration values based on a new config entry."""
@@ -81,6 +120,27 @@ class MySocketAPI:
         self.send_to_ema = self.get_config_value("send_to_ema", bool)
         self.message_ignore_age = self.get_config_value("message_ignore_age", int)
         self.ema_host = self.get_config_value("ema_host", str)
+        self.ema_pool.set_host(self.ema_host)
+        self.ema_pool.connect_timeout = self.get_config_value(
+            "ema_connect_timeout", float
+        )
+        self.ema_pool.read_timeout = self.get_config_value("ema_read_timeout", float)
+        self._set_capture()
+
+    def _set_capture(self) -> None:
+        """Start or stop capture as configured."""
+        enabled = self.capture_dir is not None and self.get_config_value(
+            "capture", bool
+        )
+        if enabled and self.capture is None:
+            _LOGGER.debug("Capturing messages on port %s", self.port)
+            self.capture = FrameCapture(self.capture_dir, self.port)
+        elif not enabled and self.capture is not None:
+            _LOGGER.debug("Stopped capturing messages on port %s", self.port)
+            task = asyncio.create_task(self.capture.stop())
+            self._capture_stops.add(task)
+            task.add_done_callback(self._capture_stops.discard)
+            self.capture = None
 
     async def start(self) -> bool:
         """Start listening socket server."""
@@ -88,6 +148,9 @@ class MySocketAPI:
             self.server = await asyncio.start_server(
                 self.data_received, self.host, self.port
             )
+            self.parse_task = asyncio.create_task(self._parse_worker())
+            if self.spool:
+                await self.spool.start()
             _LOGGER.debug("Server for port %s started", self.port)
         except OSError as ex:
             _LOGGER.debug("Error starting server - %s", ex)
@@ -100,154 +163,283 @@ class MySocketAPI:
             self.server.close()
             self.server = None
             _LOGGER.debug("Server for port %s stopped", self.port)
+        for writer in list(self.connections):
+            writer.close()
+        if self.parse_task:
+            self.parse_task.cancel()
+            self.parse_task = None
+        if self.spool:
+            await self.spool.stop()
+        if self.capture:
+            await self.capture.stop()
+        if self._capture_stops:
+            await asyncio.gather(*self._capture_stops)
+        await self.ema_pool.close()
 
     async def data_received(
         self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
     ) -> dict[str, Any]:
-        """Decode received message."""
-
-        _LOGGER.debug("Connected clients: %s", len(self.server.sockets))
-        while self.serve:
-            try:
-                ecu = {}
-
-                data = await reader.read(1024)
-                if data == b"":
-                    _LOGGER.debug("Client disconnected")
+        """Receive messages from ECU.
+
+        Messages that pass the message filters are handed to the parse worker, then
+        all messages to the relay task of this connection. Parsing never waits on
+        EMA: messages that do not fit in the relay queue are spooled instead.
+        """
+
+        if len(self.connections) >= MAX_CONNECTIONS:
+            oldest = next(iter(self.connections))
+            _LOGGER.debug("Too many connections on port %s, closing oldest", self.port)
+            oldest.close()
+            self.connections.pop(oldest, None)
+        _LOGGER.debug("Connected clients: %s", len(self.connections) + 1)
+
+        addr = writer.get_extra_info("peername")
+        frame_buffer = FrameBuffer()
+        # Messages with the time they were received.
+        relay_queue: asyncio.Queue[tuple[float, bytes]] = asyncio.Queue(
+            RELAY_QUEUE_SIZE
+        )
+        self.connections[writer] = relay_queue
+        relay_task = asyncio.create_task(self._relay_worker(writer, addr, relay_queue))
+        timings = self.timings
+        try:
+            while self.serve:
+                try:
+                    async with asyncio.timeout(CONNECTION_IDLE_TIMEOUT):
+                        frames = await read_frames(reader, frame_buffer)
+                    if not frames:
+                        _LOGGER.debug("Client disconnected")
+                        return
+
+                    received = time.time()
+                    read_at = timings.enabled and time.perf_counter()
+                    self.traffic["messages_in"] += len(frames)
+                    for data in frames:
+                        try:
+                            await self._handle_message(
+                                data, addr, received, relay_queue
+                            )
+                        except Exception:  # noqa: BLE001 - keep the next messages
+                            self.note_exception("receive", data)
+                            _LOGGER.warning(
+                                "Exception error with %s where data is: %s",
+                                traceback.format_exc(),
+                                data,
+                            )
+                        if read_at:
+                            timings.record(STAGE_RECEIVE, read_at)
+                except TimeoutError:
+                    _LOGGER.debug("Closing idle connection from %s", addr[0])
                     return
+                except (ConnectionResetError, BrokenPipeError):
+                    _LOGGER.warning("Error: Connection was reset")
+                    return
+        finally:
+            # Let EMA receive what the ECU has sent before closing.
+            await relay_queue.join()
+            relay_task.cancel()
+            self.connections.pop(writer, None)
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except OSError:
+                pass
+
+    async def _handle_message(
+        self,
+        data: bytes,
+        addr: tuple,
+        received: float,
+        relay_queue: asyncio.Queue[tuple[float, bytes]],
+    ) -> None:
+        """Queue message to be interpreted and relayed to EMA."""
+        self.traffic["bytes_in"] += len(data)
+        # Only decode for logging when debug is enabled.
+        message = ""
+        if _LOGGER.isEnabledFor(logging.DEBUG):
+            message = data.decode("utf-8", "replace").replace("\n", "")
+
+        _LOGGER.debug("From ECU @ %s on port %s - %s", addr[0], self.port, message)
+
+        # Filtered messages are skipped, the connection stays open. Queued for
+        # parsing first, so sensors do not wait on EMA.
+        if self.filter_message(data, addr, message):
+            await self.parse_queue.put(data)
+
+        # Send data to EMA and send response from EMA to ECU
+        # send_to_ema is used to stop sending for testing purposes.
+        _LOGGER.debug("Send to EMA = %s", self.send_to_ema)
+        if not self.send_to_ema:
+            if self.capture:
+                self.capture.record(received, addr[0], data, None)
+            return
+        try:
+            relay_queue.put_nowait((received, data))
+        except asyncio.QueueFull:
+            # EMA is too slow to keep up, forward data frames later.
+            self.count_message("relay_overflow", data)
+            _LOGGER.debug("Relay queue full, not relaying message from %s", addr[0])
+            if self.spool and is_data_frame(data):
+                self.spool.append(data)
+            if self.capture:
+                self.capture.record(received, addr[0], data, None)
+
+    def filter_message(self, data: bytes, addr: tuple, message: str) -> bool:
+        """Return if message passes the message filters."""
+
+        # MessageFilter: whitelist data message and message checksum.
+        if not is_data_frame(data) or not has_valid_length(data):
+            self.count_message(
+                "checksum_error" if is_data_frame(data) else "ignored", data
+            )
+            _LOGGER.debug(
+                "Ignored message from ECU @ %s on port %s - %s",
+                addr[0],
+                self.port,
+                message
+                if not is_data_frame(data)
+                else f"Checksum error - sum: {frame_length(data)}, len: {len(data) - 1}",
+            )
+            return False
 
-                message = data.decode("utf-8")
-
-                addr = writer.get_extra_info("peername")
-                _LOGGER.debug(
-                    "From ECU @ %s on port %s - %s",
-                    addr[0],
-                    self.port,
-                    message.replace("\n", ""),
-                )
-
-                # Send data to EMA and send response from EMA to ECU
-                # send_to_ema is used to stop sending for testing purposes.
-                # Get configuration. If initial data else options.
-                _LOGGER.debug("Send to EMA = %s", self.send_to_ema)
-                if self.send_to_ema:
-                    response = await self.send_data_to_ema(self.port, data)
-                    await self.send_data_to_ecu(writer, response)
-
-                # MessageFilter: whitelist data message and message checksum.
-                if (
-                    not message.startswith("APS18AA")
-                    or int(message[7:10]) != len(message) - 1
-                ):
-                    _LOGGER.debug(
-                        "Ignored message from ECU @ %s on port %s - %s",
-                        addr[0],
-                        self.port,
-                        message.replace("\n", "")
-                        if not message.startswith("APS18AA")
-                        else f"Checksum error - sum: {message[7:10]}, len: {len(message) - 1}",
-                    )
-                    return None
+        # MessageFilter: Ignore old messages.
+        _LOGGER.debug("Message ignore age = %s", self.message_ignore_age)
+        timestamp = parse_timestamp(data)
+        if (
+            message_age := (datetime.now() - timestamp).total_seconds()
+        ) > self.message_ignore_age:
+            self.count_message("too_old", data)
+            _LOGGER.debug(
+                "Message told old with %s sec",
+                int(message_age),
+            )
+            return False
 
-                # Get & interpret ECU data.
-                ecu["ecu-id"] = message[18:30]
-                ecu["model"] = self.get_model(message[18:22])
-                ecu["lifetime_energy"] = int(message[42:60]) / 10
-                ecu["current_power"] = int(message[30:42]) / 100
-                ecu["qty_of_online_inverters"] = int(message[74:77])
-                ecu["inverters"] = self.get_inverters(ecu["ecu-id"], message)
-                ecu["timestamp"] = datetime.strptime(message[60:74], "%Y%m%d%H%M%S")
-
-                # MessageFilter: Ignore old messages.
-                _LOGGER.debug("Message ignore age = %s", self.message_ignore_age)
-                if (
-                    message_age := (datetime.now() - ecu["timestamp"]).total_seconds()
-                ) > self.message_ignore_age:
-                    _LOGGER.debug(
-                        "Message told old with %s sec",
-                        int(message_age),
-                    )
-                    return None
-
-                _LOGGER.debug(
-                    "Processing message from ECU @ %s on port %s - %s",
-                    addr[0],
-                    self.port,
-                    message.replace("\n", ""),
-                )
+        # MessageFilter: Ignore readings already received, on any port. They have
+        # been relayed to EMA, which acknowledges every copy.
+        if self.dedup is not None and self.dedup.is_duplicate(data, time.monotonic()):
+            self.count_message("duplicate", data)
+            _LOGGER.debug("Duplicate message from ECU @ %s", addr[0])
+            return False
 
-                self.callback(ecu)
+        self.count_message("accepted", data)
+        _LOGGER.debug(
+            "Processing message from ECU @ %s on port %s - %s",
+            addr[0],
+            self.port,
+            message,
+        )
+        return True
+
+    async def _relay_worker(
+        self,
+        writer: asyncio.StreamWriter,
+        addr: tuple,
+        relay_queue: asyncio.Queue[tuple[float, bytes]],
+    ) -> None:
+        """Relay messages of one ECU connection to EMA and responses back."""
+        timings = self.timings
+        while True:
+            received, data = await relay_queue.get()
+            response = None
+            try:
+                start = timings.enabled and time.perf_counter()
+                response = await self.send_data_to_ema(data)
+                if start:
+                    timings.record(STAGE_EMA, start)
+                    start = time.perf_counter()
+                await self.send_data_to_ecu(writer, response)
+                if start:
+                    timings.record(STAGE_ECU_REPLY, start)
+            except EMAUnavailableError as ex:
+                _LOGGER.debug("Not relayed - %s", ex)
             except ConnectionResetError:
                 _LOGGER.warning("Error: Connection was reset")
-            except Exception:
+            except (OSError, asyncio.IncompleteReadError):
+                self.note_exception("relay", data)
+                _LOGGER.warning(
+                    "Exception relaying to EMA with %s where data is: %s",
+                    traceback.format_exc(),
+                    data,
+                )
+            finally:
+                if self.capture:
+                    self.capture.record(received, addr[0], data, response)
+                relay_queue.task_done()
+
+    async def _parse_worker(self) -> None:
+        """Interpret queued messages and pass them to the callback."""
+        timings = self.timings
+        while True:
+            data = await self.parse_queue.get()
+            try:
+                # Get & interpret ECU data.
+                start = timings.enabled and time.perf_counter()
+                frame = parse_frame(data)
+                if start:
+                    timings.record(STAGE_PARSE, start)
+                    start = time.perf_counter()
+                self.callback(frame)
+                if start:
+                    timings.record(STAGE_FAN_OUT, start)
+            except Exception:  # noqa: BLE001 - callback runs sensor updates
+                self.note_exception("parse", data)
                 _LOGGER.warning(
                     "Exception error with %s where data is: %s",
                     traceback.format_exc(),
                     data,
                 )
-    
-    def get_model(self, model_code: str) -> str:
-        """Get model from model code."""
-        if model := ECU_MODELS_216.get(model_code) or ECU_MODELS_215.get(
-            model_code[:3]
-        ):
-            return model
-        return "Unknown"
-
-    def get_inverters(self, ecu_id: str, message: str) -> list[dict[str, Any]]:
-        """Get inveters."""
-        inverters = {}
-
-        for idx, m in enumerate(
-            re.finditer(r"END\d+", message)
-        ):  # walk through inverters
-            inverter = {}
-
-            def msg_slice(start_pos: int, end_pos: int, m: re.Match = m) -> int:
-                s = m.start()
-                return message[s + start_pos : s + end_pos]
-
-            inverter["uid"] = str(msg_slice(3, 15))
-            inverter["index"] = idx
-            inverter["temperature"] = int(msg_slice(25, 28)) - 100
-            inverter["frequency"] = int(msg_slice(20, 25)) / 10
-
-            model_code = str(msg_slice(3, 6))
-
-            for model_refs in INVERTER_MODELS:
-                if model_code in model_refs.get("model_codes"):
-                    inverter["model"] = model_refs.get("name")
-                    inverter["channel_qty"] = model_refs.get("channels")
-                    inverter["power"] = [
-                        int(msg_slice(offset, offset + 3))
-                        for offset in POWER_CHANNELS[: model_refs.get("channels")]
-                    ]
-                    inverter["voltage"] = [
-                        int(msg_slice(offset, offset + 3)) / 10
-                        for offset in VOLTAGE_CHANNELS[: model_refs.get("channels")]
-                    ]
-                    inverter["current"] = [
-                        int(msg_slice(offset, offset + 3)) / 100
-                        for offset in CURRENT_CHANNELS[: model_refs.get("channels")]
-                    ]
-
-                    inverters[inverter.get("uid")] = inverter
-        return inverters
-
-    async def send_data_to_ema(self, port: int, data: bytes) -> bytes:
-        """Send data over async socket."""
+            finally:
+                self.parse_queue.task_done()
+
+    async def send_data_to_ema(self, data: bytes) -> bytes:
+        """Send data to EMA over a pooled connection.
+
+        If EMA cannot be reached, data frames are spooled to be forwarded later and
+        the last response from EMA to the same message type is returned so that the
+        ECU keeps sending.
+        """
         _LOGGER.debug("EMA host = %s", self.ema_host)
 
-        reader, writer = await asyncio.open_connection(self.ema_host, port)
-        writer.write(data)
-        await writer.drain()
-        response = await reader.read(1024)
+        message_type = data[:7]
+        try:
+            response = await self.ema_pool.send(data)
+        except (OSError, TimeoutError, EMAUnavailableError):
+            if self.spool and is_data_frame(data):
+                self.spool.append(data)
+            if (response := self.ema_acks.get(message_type)) is None:
+                raise
+            _LOGGER.debug("EMA unavailable, replying with cached response")
+            return response
+
         _LOGGER.debug("From EMA - %s", response)
-        writer.close()
-        await writer.wait_closed()
+        if response:
+            self.ema_acks[message_type] = response
+        if self.spool and self.spool.has_pending:
+            self.spool.wake()
         return response
 
     async def send_data_to_ecu(self, writer: asyncio.StreamWriter, data: bytes):
         """Send data to ECU."""
         writer.write(data)
+        self.traffic["messages_out"] += 1
+        self.traffic["bytes_out"] += len(data)
         await writer.drain()
+
+    def count_message(self, key: str, data: bytes) -> None:
+        """Count message for the port and, if a data frame, for its ECU."""
+        self.message_counts[key] += 1
+        if is_data_frame(data) and len(data) >= ECU_ID.stop:
+            self.ecu_message_counts[data[ECU_ID].decode(errors="replace")][key] += 1
+
+    def note_exception(self, stage: str, data: bytes) -> None:
+        """Count exception being handled and keep a summary for diagnostics."""
+        self.count_message("exception", data)
+        ex = sys.exc_info()[1]
+        self.recent_exceptions.append(
+            {
+                "time": datetime.now().isoformat(timespec="seconds"),
+                "stage": stage,
+                "error": f"{type(ex).__name__}: {ex}",
+            }
+        )
@@ -0,0 +1,169 @@
+"""Capture of raw ECU messages to rotating compressed files."""
+
+import asyncio
+import gzip
+import json
+import logging
+import os
+import time
+
+_LOGGER = logging.getLogger(__name__)
+
+# A new file is started when the current one reaches this size or age.
+MAX_FILE_SIZE = 1024 * 1024
+MAX_FILE_AGE = 3600
+# Oldest files are removed beyond these limits.
+MAX_CAPTURE_SIZE = 50 * 1024 * 1024
+MAX_CAPTURE_AGE = 7 * 24 * 3600
+# Seconds entries are collected before being written.
+FLUSH_INTERVAL = 5
+# Entries that are written straight away rather than waiting for the interval.
+FLUSH_SIZE = 200
+
+FILE_PREFIX = "capture"
+FILE_SUFFIX = ".jsonl.gz"
+
+
+def encode_entry(
+    received: float,
+    port: int,
+    peer: str | None,
+    message: bytes,
+    response: bytes | None,
+) -> str:
+    """Return capture line of a message.
+
+    Messages are stored as latin-1 text so that any byte survives the round trip
+    while ASCII frames stay readable.
+    """
+    return json.dumps(
+        {
+            "received": received,
+            "port": port,
+            "peer": peer,
+            "message": message.decode("latin-1"),
+            "response": None if response is None else response.decode("latin-1"),
+        }
+    )
+
+
+def decode_entry(line: str) -> dict:
+    """Return capture entry of a line with message and response as bytes."""
+    entry = json.loads(line)
+    entry["message"] = entry["message"].encode("latin-1")
+    if entry["response"] is not None:
+        entry["response"] = entry["response"].encode("latin-1")
+    return entry
+
+
+class FrameCapture:
+    """Append messages of one port to gzip compressed JSON lines files.
+
+    Entries are collected and written in batches in the executor, each batch as a
+    gzip member so that a file stays readable if writing is interrupted.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        port: int,
+        max_file_size: int = MAX_FILE_SIZE,
+        max_file_age: float = MAX_FILE_AGE,
+        max_size: int = MAX_CAPTURE_SIZE,
+        max_age: float = MAX_CAPTURE_AGE,
+    ) -> None:
+        """Initialise capture."""
+        self.directory = directory
+        self.port = port
+        self.max_file_size = max_file_size
+        self.max_file_age = max_file_age
+        self.max_size = max_size
+        self.max_age = max_age
+
+        self.captured = 0
+        self._pending: list[str] = []
+        self._path: str | None = None
+        self._path_started = 0.0
+        self._flush_task: asyncio.Task | None = None
+        self._wake = asyncio.Event()
+
+    def record(
+        self,
+        received: float,
+        peer: str | None,
+        message: bytes,
+        response: bytes | None,
+    ) -> None:
+        """Queue message and EMA response, if any, to be written."""
+        self._pending.append(encode_entry(received, self.port, peer, message, response))
+        if self._flush_task is None:
+            self._flush_task = asyncio.create_task(self._flush())
+        elif len(self._pending) >= FLUSH_SIZE:
+            self._wake.set()
+
+    async def stop(self) -> None:
+        """Write out pending entries."""
+        if self._flush_task:
+            self._wake.set()
+            await self._flush_task
+
+    async def _flush(self) -> None:
+        """Write queued entries after the flush interval."""
+        loop = asyncio.get_running_loop()
+        try:
+            try:
+                async with asyncio.timeout(FLUSH_INTERVAL):
+                    await self._wake.wait()
+            except TimeoutError:
+                pass
+            self._wake.clear()
+            while self._pending:
+                pending, self._pending = self._pending, []
+                await loop.run_in_executor(None, self._write, pending)
+                self.captured += len(pending)
+        except OSError as ex:
+            _LOGGER.warning("Unable to write capture for port %s - %s", self.port, ex)
+        finally:
+            self._flush_task = None
+
+    # Executor functions.
+
+    def _write(self, lines: list[str]) -> None:
+        """Append lines to the current file, rotating files as needed."""
+        now = time.time()
+        if (
+            self._path is None
+            or now - self._path_started >= self.max_file_age
+            or not os.path.exists(self._path)
+            or os.path.getsize(self._path) >= self.max_file_size
+        ):
+            self._rotate(now)
+
+        with gzip.open(self._path, "at", encoding="utf-8") as file:
+            file.write("\n".join(lines))
+            file.write("\n")
+
+    def _rotate(self, now: float) -> None:
+        """Start a new file and apply retention limits."""
+        os.makedirs(self.directory, exist_ok=True)
+        # Milliseconds keep names unique when files fill up quickly.
+        stamp = time.strftime("%Y%m%d-%H%M%S", time.localtime(now))
+        stamp = f"{stamp}-{int(now * 1000) % 1000:03d}"
+        self._path = os.path.join(
+            self.directory, f"{FILE_PREFIX}-{self.port}-{stamp}{FILE_SUFFIX}"
+        )
+        self._path_started = now
+
+        prefix = f"{FILE_PREFIX}-{self.port}-"
+        files = sorted(
+            (entry.stat().st_mtime, entry.stat().st_size, entry.path)
+            for entry in os.scandir(self.directory)
+            if entry.name.startswith(prefix) and entry.name.endswith(FILE_SUFFIX)
+        )
+        total = sum(size for _, size, _ in files)
+        for mtime, size, path in files:
+            if total <= self.max_size and mtime >= now - self.max_age:
+                break
+            _LOGGER.debug("Removing capture file %s", path)
+            os.remove(path)
+            total -= size
@@ -8,10 +8,17 @@ import voluptuous as vol
 from homeassistant import config_entries
 from homeassistant.core import callback
 
-from .const import DOMAIN, KEYS
+from .const import DEFAULTS, DOMAIN, KEYS, WriteMode
 
 _LOGGER = logging.getLogger(__name__)
 
+# Validators of keys that are not free text.
+KEY_VALIDATORS = {
+    "send_to_ema": bool,
+    "capture": bool,
+    "write_mode": vol.In([mode.value for mode in WriteMode]),
+}
+
 
 async def validate_ip(ip_address: str) -> bool:
     """Validate EMA server ip."""
@@ -51,6 +58,13 @@ class ConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
                 vol.Required(KEYS[2], default="300"): str,
                 vol.Required(KEYS[3], default="660"): str,
                 vol.Required(KEYS[4], default=True): bool,
+                vol.Required(KEYS[5], default=DEFAULTS[KEYS[5]]): str,
+                vol.Required(KEYS[6], default=DEFAULTS[KEYS[6]]): str,
+                vol.Required(KEYS[7], default=DEFAULTS[KEYS[7]]): KEY_VALIDATORS[
+                    KEYS[7]
+                ],
+                vol.Required(KEYS[8], default=DEFAULTS[KEYS[8]]): str,
+                vol.Required(KEYS[9], default=DEFAULTS[KEYS[9]]): bool,
             }
         )
 
@@ -87,9 +101,9 @@ class OptionsFlowHandler(config_entries.OptionsFlow):
 
         schema = vol.Schema(
             {
-                vol.Required(key, default=current_options.get(key)): (
-                    str if key != "send_to_ema" else bool
-                )
+                vol.Required(
+                    key, default=current_options.get(key, DEFAULTS.get(key))
+                ): KEY_VALIDATORS.get(key, str)
                 for key in KEYS
             }
         )
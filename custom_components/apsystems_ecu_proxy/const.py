@@ -33,8 +33,22 @@ KEYS = [
     "max_stub_interval",
     "no_update_timeout",
     "send_to_ema",
+    "ema_connect_timeout",
+    "ema_read_timeout",
+    "write_mode",
+    "force_write_interval",
+    "capture",
 ]
 
+# Defaults for keys added after the first release, which existing entries lack.
+DEFAULTS = {
+    "ema_connect_timeout": "5",
+    "ema_read_timeout": "15",
+    "write_mode": "changed",
+    "force_write_interval": "10",
+    "capture": False,
+}
+
 
 class SummationPeriod(StrEnum):
     """Summation period Enum."""
@@ -53,3 +67,14 @@ class SummationType(StrEnum):
     SUM = "sum"
     MAX = "max"
     MIN = "min"
+
+
+class WriteMode(StrEnum):
+    """When sensors write their state."""
+
+    # On every update.
+    ALWAYS = "always"
+    # When value or attributes have changed.
+    CHANGED = "changed"
+    # When value has changed by more than the deadband of its device class.
+    DEADBAND = "deadband"
@@ -0,0 +1,63 @@
+"""Recognise data frames already received on any port."""
+
+from collections import OrderedDict
+
+# Frames remembered, over all ECUs.
+DEDUP_SIZE = 2048
+# Seconds a frame is remembered, unless set to the message ignore age.
+DEDUP_MAX_AGE = 3600
+
+# Positions of the ECU id and timestamp, which identify a reading.
+ECU_ID = slice(18, 30)
+TIMESTAMP = slice(60, 74)
+
+
+class FrameDedup:
+    """Bounded LRU set of (ECU id, frame timestamp) keys.
+
+    An ECU can send the same reading on more than one port and resends readings
+    after reconnecting. One instance is shared by the ports of a config entry, so
+    a reading is interpreted once. Keys are taken from the raw frame, so checking
+    costs two slices and one dict lookup.
+    """
+
+    def __init__(self, size: int = DEDUP_SIZE, max_age: float = DEDUP_MAX_AGE) -> None:
+        """Initialise cache."""
+        self.size = size
+        # Older frames are dropped by the message ignore age before being checked,
+        # so they do not need to be remembered.
+        self.max_age = max_age
+        # Key -> monotonic time last seen, least recently seen first.
+        self._seen: OrderedDict[tuple[bytes, bytes], float] = OrderedDict()
+        self.duplicates = 0
+
+    def __len__(self) -> int:
+        """Return frames remembered."""
+        return len(self._seen)
+
+    def is_duplicate(self, frame: bytes, now: float) -> bool:
+        """Return if frame was seen before, remembering it if not.
+
+        Now is monotonic time in seconds.
+        """
+        key = (frame[ECU_ID], frame[TIMESTAMP])
+        seen = self._seen
+        if key in seen:
+            seen[key] = now
+            seen.move_to_end(key)
+            self.duplicates += 1
+            return True
+
+        seen[key] = now
+        self._evict(now)
+        return False
+
+    def _evict(self, now: float) -> None:
+        """Drop least recently seen frames over size or max age."""
+        seen = self._seen
+        oldest = now - self.max_age
+        while seen:
+            key, last_seen = next(iter(seen.items()))
+            if len(seen) <= self.size and last_seen >= oldest:
+                return
+            del seen[key]
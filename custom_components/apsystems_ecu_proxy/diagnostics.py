@@ -0,0 +1,105 @@
+"""Diagnostics of the proxy."""
+
+import time
+from typing import Any
+
+from homeassistant.components.diagnostics import async_redact_data
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.const import CONF_HOST, CONF_IP_ADDRESS
+from homeassistant.core import HomeAssistant
+
+from .api import MySocketAPI
+from .const import DOMAIN
+from .stats import STAGE_SENSOR_WRITE
+
+# Hosts and addresses, as diagnostics get attached to public issues.
+TO_REDACT = {"ema_host", "peer", CONF_HOST, CONF_IP_ADDRESS}
+
+
+def _age(last: float, now: float) -> float:
+    """Return seconds since monotonic time."""
+    return round(now - last, 1)
+
+
+def _port_diagnostics(server: MySocketAPI) -> dict[str, Any]:
+    """Return state of one port."""
+    pool = server.ema_pool
+    spool = server.spool
+    return {
+        "connections": [
+            {
+                "peer": writer.get_extra_info("peername"),
+                "relay_queue": relay_queue.qsize(),
+            }
+            for writer, relay_queue in server.connections.items()
+        ],
+        "traffic": dict(server.traffic),
+        "messages": dict(server.message_counts),
+        "parse_queue": server.parse_queue.qsize(),
+        "send_to_ema": server.send_to_ema,
+        "ema_pool": {
+            "idle_connections": pool.idle_connections,
+            "connections_opened": pool.connections_opened,
+            "breaker_open": pool.breaker.is_open,
+            "breaker_failures": pool.breaker.failures,
+            "cached_acks": len(server.ema_acks),
+        },
+        "spool": {
+            "size": spool.size,
+            "offset": spool.offset,
+            "pending": spool.has_pending,
+            "forwarded": spool.forwarded,
+            "evicted": spool.evicted,
+        }
+        if spool
+        else None,
+        "captured": server.capture.captured if server.capture else None,
+        "timings": {
+            stage: server.timings.summary(stage) for stage in server.timings.samples
+        },
+        "recent_exceptions": list(server.recent_exceptions),
+    }
+
+
+async def async_get_config_entry_diagnostics(
+    hass: HomeAssistant, config_entry: ConfigEntry
+) -> dict[str, Any]:
+    """Return diagnostics for a config entry."""
+    api_handler = hass.data[DOMAIN][config_entry.entry_id]["api_handler"]
+    now = time.monotonic()
+
+    diagnostics = {
+        "config": dict(config_entry.data),
+        "ports": {
+            server.port: _port_diagnostics(server)
+            for server in api_handler.socket_servers
+        },
+        "sensor_write_timing": api_handler.write_timings.summary(STAGE_SENSOR_WRITE),
+        "frame_dedup": {
+            "remembered": len(api_handler.frame_dedup),
+            "duplicates": api_handler.frame_dedup.duplicates,
+        },
+        "energy": {
+            ecu_id: {
+                f"{period}_{summation_type}": accumulator.value
+                for (period, summation_type), accumulator in (
+                    integrator.accumulators.items()
+                )
+            }
+            for ecu_id, integrator in api_handler.energy.items()
+        },
+        "known_devices": len(api_handler.known_devices),
+        "watched_devices": len(api_handler.watchdog.deadlines),
+        "frame_listeners": api_handler.hub.listener_count,
+        "seconds_since_frame": {
+            "ecus": {
+                ecu_id: _age(last, now)
+                for ecu_id, last in api_handler.ecu_last_frame.items()
+            },
+            "inverters": {
+                uid: _age(last, now)
+                for uid, last in api_handler.inverter_last_frame.items()
+            },
+        },
+    }
+    return async_redact_data(diagnostics, TO_REDACT)
@@ -0,0 +1,253 @@
+"""Connections to the APsystems EMA server."""
+
+import asyncio
+import logging
+import socket
+import time
+
+from .framing import FrameBuffer, read_frames
+
+_LOGGER = logging.getLogger(__name__)
+
+# Connections unused for longer than this are closed.
+IDLE_TIMEOUT = 900
+# Maximum idle connections kept per port.
+MAX_IDLE_CONNECTIONS = 2
+# Consecutive failures after which requests to EMA fail fast.
+FAILURE_THRESHOLD = 3
+# Seconds to fail fast before trying EMA again.
+RESET_TIMEOUT = 60
+
+
+class EMAUnavailableError(Exception):
+    """EMA is considered unavailable and is not contacted."""
+
+
+class CircuitBreaker:
+    """Stop contacting EMA after repeated failures.
+
+    Once open, one trial request is let through every reset timeout. A success
+    closes the breaker again.
+    """
+
+    def __init__(
+        self,
+        failure_threshold: int = FAILURE_THRESHOLD,
+        reset_timeout: float = RESET_TIMEOUT,
+    ) -> None:
+        """Initialise breaker."""
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: float | None = None
+
+    @property
+    def is_open(self) -> bool:
+        """Return if requests fail fast."""
+        return self.opened_at is not None
+
+    def allow_request(self) -> bool:
+        """Return if a request may be made."""
+        if self.opened_at is None:
+            return True
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            # Let this trial through and keep failing fast for others meanwhile.
+            self.opened_at = time.monotonic()
+            return True
+        return False
+
+    def record_success(self) -> None:
+        """Record successful request."""
+        if self.opened_at is not None:
+            _LOGGER.info("EMA is reachable again")
+        self.failures = 0
+        self.opened_at = None
+
+    def record_failure(self) -> None:
+        """Record failed request."""
+        self.failures += 1
+        if self.failures >= self.failure_threshold:
+            if self.opened_at is None:
+                _LOGGER.warning(
+                    "EMA failed %s times, not contacting it for %s seconds",
+                    self.failures,
+                    self.reset_timeout,
+                )
+            self.opened_at = time.monotonic()
+
+
+class EMAConnection:
+    """Persistent connection to EMA."""
+
+    def __init__(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        """Initialise connection."""
+        self.reader = reader
+        self.writer = writer
+        self.frame_buffer = FrameBuffer()
+        self.last_used = time.monotonic()
+
+    @property
+    def is_usable(self) -> bool:
+        """Return if connection can be used for a request."""
+        return not self.writer.is_closing() and not self.reader.at_eof()
+
+    async def request(self, data: bytes, timeout: float) -> bytes:
+        """Send data and return the response."""
+        async with asyncio.timeout(timeout):
+            self.writer.write(data)
+            await self.writer.drain()
+            response = b"".join(await read_frames(self.reader, self.frame_buffer))
+        self.last_used = time.monotonic()
+        return response
+
+    async def close(self) -> None:
+        """Close connection."""
+        self.writer.close()
+        try:
+            await self.writer.wait_closed()
+        except OSError:
+            pass
+
+
+class EMAConnectionPool:
+    """Pool of persistent connections to EMA for one port.
+
+    Connections are reused between requests and reopened when EMA has closed them.
+    Requests fail fast with EMAUnavailableError while the circuit breaker is open.
+    """
+
+    def __init__(
+        self,
+        host: str,
+        port: int,
+        connect_timeout: float,
+        read_timeout: float,
+        max_idle: int = MAX_IDLE_CONNECTIONS,
+        idle_timeout: float = IDLE_TIMEOUT,
+    ) -> None:
+        """Initialise pool."""
+        self.host = host
+        self.port = port
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.breaker = CircuitBreaker()
+        self.max_idle = max_idle
+        self.idle_timeout = idle_timeout
+        self._idle: list[EMAConnection] = []
+        self._evict_handle: asyncio.TimerHandle | None = None
+        self.connections_opened = 0
+
+    async def send(self, data: bytes) -> bytes:
+        """Send data to EMA and return the response."""
+        if not self.breaker.allow_request():
+            raise EMAUnavailableError(f"EMA unavailable on port {self.port}")
+        try:
+            response = await self._send(data)
+        except (OSError, TimeoutError, asyncio.IncompleteReadError):
+            self.breaker.record_failure()
+            raise
+        self.breaker.record_success()
+        return response
+
+    async def _send(self, data: bytes) -> bytes:
+        """Send data over a pooled or new connection."""
+        connection = self._get_idle_connection()
+        if connection is not None:
+            try:
+                response = await connection.request(data, self.read_timeout)
+            except TimeoutError:
+                # EMA is slow rather than the connection closed, do not retry.
+                await connection.close()
+                raise
+            except (OSError, asyncio.IncompleteReadError) as ex:
+                _LOGGER.debug("Pooled EMA connection failed, reconnecting - %s", ex)
+                response = b""
+            if response:
+                self._release(connection)
+                return response
+            # EMA has closed the pooled connection, retry on a new one.
+            await connection.close()
+
+        connection = await self._open_connection()
+        try:
+            response = await connection.request(data, self.read_timeout)
+        except BaseException:
+            await connection.close()
+            raise
+        if not response:
+            await connection.close()
+            raise ConnectionResetError("EMA closed connection without response")
+        self._release(connection)
+        return response
+
+    def _get_idle_connection(self) -> EMAConnection | None:
+        """Return most recently used idle connection, closing expired ones."""
+        expire = time.monotonic() - self.idle_timeout
+        while self._idle:
+            connection = self._idle.pop()
+            if connection.is_usable and connection.last_used > expire:
+                return connection
+            connection.writer.close()
+        return None
+
+    async def _open_connection(self) -> EMAConnection:
+        """Open new connection with TCP keepalive."""
+        _LOGGER.debug("Opening EMA connection to %s:%s", self.host, self.port)
+        async with asyncio.timeout(self.connect_timeout):
+            reader, writer = await asyncio.open_connection(self.host, self.port)
+        if (sock := writer.get_extra_info("socket")) is not None:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+        self.connections_opened += 1
+        return EMAConnection(reader, writer)
+
+    def _release(self, connection: EMAConnection) -> None:
+        """Return connection to pool or close it if the pool is full."""
+        if connection.is_usable and len(self._idle) < self.max_idle:
+            self._idle.append(connection)
+            self._schedule_eviction()
+        else:
+            connection.writer.close()
+
+    def _schedule_eviction(self) -> None:
+        """Schedule closing of idle connections once they expire."""
+        if self._evict_handle is None and self._idle:
+            self._evict_handle = asyncio.get_running_loop().call_later(
+                self.idle_timeout, self._evict_expired
+            )
+
+    def _evict_expired(self) -> None:
+        """Close idle connections that have expired."""
+        self._evict_handle = None
+        expire = time.monotonic() - self.idle_timeout
+        keep = []
+        for connection in self._idle:
+            if connection.is_usable and connection.last_used > expire:
+                keep.append(connection)
+            else:
+                connection.writer.close()
+        self._idle = keep
+        self._schedule_eviction()
+
+    @property
+    def idle_connections(self) -> int:
+        """Return number of idle connections."""
+        return len(self._idle)
+
+    def set_host(self, host: str) -> None:
+        """Change EMA host, dropping connections to the previous one."""
+        if host != self.host:
+            self.host = host
+            for connection in self._idle:
+                connection.writer.close()
+            self._idle.clear()
+
+    async def close(self) -> None:
+        """Close all idle connections."""
+        if self._evict_handle is not None:
+            self._evict_handle.cancel()
+            self._evict_handle = None
+        idle, self._idle = self._idle, []
+        for connection in idle:
+            await connection.close()
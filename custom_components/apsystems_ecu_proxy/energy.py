@@ -0,0 +1,374 @@
+"""Integration of ECU power over the summation periods."""
+
+from array import array
+from collections.abc import Callable
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any
+
+from .const import SummationPeriod, SummationType
+from .helpers import get_period_start_timestamp
+from .parser import MAX_CHANNELS
+
+# Key of the period a timestamp is in, changing when a period starts.
+PERIOD_KEYS: dict[SummationPeriod, Callable[[datetime], tuple]] = {
+    SummationPeriod.HOURLY: lambda ts: (ts.year, ts.month, ts.day, ts.hour),
+    SummationPeriod.DAILY: lambda ts: (ts.year, ts.month, ts.day),
+    SummationPeriod.WEEKLY: lambda ts: ts.isocalendar()[:2],
+    SummationPeriod.MONTHLY: lambda ts: (ts.year, ts.month),
+    SummationPeriod.YEARLY: lambda ts: (ts.year,),
+    SummationPeriod.LIFETIME: lambda ts: (),
+}
+
+
+@dataclass(slots=True)
+class Accumulator:
+    """Running sum, max or min of power over a period.
+
+    Sums are in Wh, max and min in W. Timestamp is when the value last changed.
+    """
+
+    period: SummationPeriod
+    summation_type: SummationType
+    value: float | None = None
+    period_key: tuple | None = None
+    timestamp: datetime | None = None
+    restored: bool = False
+
+
+class EnergyIntegrator:
+    """Integrate the power of one ECU once per frame for all summation sensors.
+
+    Energy is summed in exact float arithmetic, assuming the power of a frame was
+    produced since the previous frame. There is a sum for every summation period,
+    max and min accumulators are added when a sensor tracks them. Timestamps are
+    the naive local time of the frames.
+    """
+
+    def __init__(self, max_stub_interval: float) -> None:
+        """Initialise integrator."""
+        # Most of the previous period a frame may count in a new period.
+        self.max_stub_interval = max_stub_interval
+        self.timestamp: datetime | None = None
+        self.accumulators: dict[tuple[SummationPeriod, SummationType], Accumulator] = {
+            (period, SummationType.SUM): Accumulator(period, SummationType.SUM)
+            for period in SummationPeriod
+        }
+
+    def track(
+        self, period: SummationPeriod, summation_type: SummationType
+    ) -> Accumulator:
+        """Return accumulator of period and type, adding it if needed."""
+        key = (period, summation_type)
+        if (accumulator := self.accumulators.get(key)) is None:
+            accumulator = self.accumulators[key] = Accumulator(period, summation_type)
+        return accumulator
+
+    def restore(
+        self, accumulator: Accumulator, value: float, timestamp: datetime
+    ) -> None:
+        """Continue accumulator from a restored sensor.
+
+        A restore after frames were integrated is merged into the running value,
+        unless it is of an earlier period.
+        """
+        if accumulator.restored:
+            return
+        accumulator.restored = True
+        timestamp = timestamp.replace(tzinfo=None)
+        if accumulator.period_key is not None:
+            if PERIOD_KEYS[accumulator.period](timestamp) != accumulator.period_key:
+                return
+            if accumulator.summation_type == SummationType.SUM:
+                accumulator.value += value
+            elif accumulator.summation_type == SummationType.MAX:
+                accumulator.value = max(accumulator.value, value)
+            else:
+                accumulator.value = min(accumulator.value, value)
+            return
+        accumulator.value = value
+        accumulator.period_key = PERIOD_KEYS[accumulator.period](timestamp)
+        accumulator.timestamp = timestamp
+        if accumulator.summation_type == SummationType.SUM and (
+            self.timestamp is None or timestamp > self.timestamp
+        ):
+            self.timestamp = timestamp
+
+    def integrate(self, power: float, timestamp: datetime) -> bool:
+        """Add power of a frame, return if it was added.
+
+        Frames older than the last one are not added. A period started since the
+        last frame only gets the part of the interval after its start, also when
+        it was already started by advance.
+        """
+        last_timestamp = self.timestamp
+        interval = None
+        last_period_keys = None
+        if last_timestamp is not None:
+            interval = (timestamp - last_timestamp).total_seconds()
+            if interval < 0:
+                return False
+            last_period_keys = {
+                period: period_key(last_timestamp)
+                for period, period_key in PERIOD_KEYS.items()
+            }
+        self.timestamp = timestamp
+        energy = power * (interval or 0) / 3600
+
+        period_keys = {
+            period: period_key(timestamp) for period, period_key in PERIOD_KEYS.items()
+        }
+        for accumulator in self.accumulators.values():
+            period_key = period_keys[accumulator.period]
+            summation_type = accumulator.summation_type
+            if (
+                accumulator.period_key is not None
+                and accumulator.period_key > period_key
+            ):
+                # Frame of a period that advance already ended.
+                continue
+            if accumulator.period_key != period_key or (
+                last_period_keys is not None
+                and last_period_keys[accumulator.period] != period_key
+            ):
+                accumulator.period_key = period_key
+                accumulator.value = (
+                    self._period_start_energy(accumulator, power, interval, timestamp)
+                    if summation_type == SummationType.SUM
+                    else power
+                )
+                accumulator.timestamp = timestamp
+            elif summation_type == SummationType.SUM:
+                accumulator.value += energy
+                accumulator.timestamp = timestamp
+            elif (
+                summation_type == SummationType.MAX
+                and power >= accumulator.value
+                or summation_type == SummationType.MIN
+                and power <= accumulator.value
+            ):
+                accumulator.value = power
+                accumulator.timestamp = timestamp
+        return True
+
+    def _period_start_energy(
+        self,
+        accumulator: Accumulator,
+        power: float,
+        interval: float | None,
+        timestamp: datetime,
+    ) -> float:
+        """Return energy of the part of the last interval in a new period."""
+        if accumulator.value is None:
+            # First frame, nothing was produced yet.
+            return 0
+        period_start = get_period_start_timestamp(accumulator.period, timestamp)
+        seconds = min(
+            (timestamp - period_start).total_seconds(),
+            self.max_stub_interval,
+            interval if interval is not None else self.max_stub_interval,
+        )
+        return power * seconds / 3600
+
+    def advance(self, timestamp: datetime) -> None:
+        """Start periods that have begun by timestamp, without power.
+
+        The time of the last frame is kept, so the energy of the next frame before
+        the start still counts in the periods that continue.
+        """
+        timestamp = timestamp.replace(tzinfo=None)
+        for accumulator in self.accumulators.values():
+            period_key = PERIOD_KEYS[accumulator.period](timestamp)
+            if accumulator.period_key is not None and (
+                accumulator.period_key < period_key
+            ):
+                accumulator.period_key = period_key
+                accumulator.value = 0
+                accumulator.timestamp = timestamp
+
+
+# Slots per inverter in the arrays: the inverter total, then one per channel.
+INVERTER_STRIDE = 1 + MAX_CHANNELS
+# Periods integrated per inverter and channel.
+INVERTER_PERIODS = (SummationPeriod.DAILY, SummationPeriod.LIFETIME)
+
+
+class EnergySlot:
+    """Energy of an inverter or channel in the arrays of an integrator."""
+
+    __slots__ = ("integrator", "period", "index")
+    summation_type = SummationType.SUM
+
+    def __init__(
+        self,
+        integrator: "InverterEnergyIntegrator",
+        period: SummationPeriod,
+        index: int,
+    ) -> None:
+        """Initialise slot."""
+        self.integrator = integrator
+        self.period = period
+        self.index = index
+
+    @property
+    def value(self) -> float | None:
+        """Return energy in Wh, None before anything was integrated or restored."""
+        integrator = self.integrator
+        if integrator.timestamp is None:
+            return None
+        return integrator.energy[self.period][self.index]
+
+    @property
+    def timestamp(self) -> datetime | None:
+        """Return time of the last frame integrated."""
+        return self.integrator.timestamp
+
+
+class InverterEnergyIntegrator:
+    """Integrate the channel power of all inverters in one pass per frame.
+
+    Daily and lifetime energy in Wh is kept in flat float arrays, with a row of
+    INVERTER_STRIDE slots per inverter: its total followed by its channels. Rows
+    are given out on first sight of an inverter uid, so a frame updates them with
+    index arithmetic only. Energy is summed since the previous frame of the same
+    ECU.
+    """
+
+    def __init__(self, max_stub_interval: float) -> None:
+        """Initialise integrator."""
+        self.max_stub_interval = max_stub_interval
+        self.rows: dict[str, int] = {}
+        self.energy: dict[SummationPeriod, array] = {
+            period: array("d") for period in INVERTER_PERIODS
+        }
+        # Last frame integrated per ECU id and of any ECU.
+        self.ecu_timestamps: dict[str, datetime] = {}
+        self.timestamp: datetime | None = None
+        self.day_key: tuple | None = None
+        self._integrated = False
+        # Slots restored by a sensor, by period and index.
+        self._restored: set[tuple[SummationPeriod, int]] = set()
+
+    def _row(self, uid: str) -> int:
+        """Return first slot of inverter, adding its row if needed."""
+        if (row := self.rows.get(uid)) is None:
+            row = self.rows[uid] = len(self.rows) * INVERTER_STRIDE
+            zeros = array("d", bytes(8 * INVERTER_STRIDE))
+            for energy in self.energy.values():
+                energy.extend(zeros)
+        return row
+
+    def track(
+        self, uid: str, channel: int | None, period: SummationPeriod
+    ) -> EnergySlot:
+        """Return slot of inverter, or of a channel of it, for period."""
+        if period not in self.energy:
+            raise ValueError(f"Inverter energy is not summed {period}")
+        index = self._row(uid) + (0 if channel is None else 1 + channel)
+        return EnergySlot(self, period, index)
+
+    def restore(self, slot: EnergySlot, value: float, timestamp: datetime) -> None:
+        """Continue slot from a restored sensor.
+
+        Restored energy is added to the slot, which holds what was integrated
+        since the first frame, if any. Daily energy restored from an earlier day
+        than other slots or the frames is dropped.
+        """
+        if (key := (slot.period, slot.index)) in self._restored:
+            return
+        self._restored.add(key)
+        timestamp = timestamp.replace(tzinfo=None)
+        if slot.period == SummationPeriod.DAILY:
+            day_key = PERIOD_KEYS[SummationPeriod.DAILY](timestamp)
+            if self.day_key is not None and day_key < self.day_key:
+                return
+            if self.day_key is not None and day_key > self.day_key:
+                self._clear_daily()
+            self.day_key = day_key
+        self.energy[slot.period][slot.index] += value
+        if not self._integrated and (
+            self.timestamp is None or timestamp > self.timestamp
+        ):
+            self.timestamp = timestamp
+
+    def _clear_daily(self) -> None:
+        """Zero daily energy of all inverters."""
+        daily = self.energy[SummationPeriod.DAILY]
+        daily[:] = array("d", bytes(8 * len(daily)))
+
+    def integrate(
+        self, ecu_id: str, inverters: dict[str, dict[str, Any]], timestamp: datetime
+    ) -> bool:
+        """Add channel power of the inverters of a frame, return if added.
+
+        Frames older than the last one of the ECU are not added. Daily energy only
+        gets the part of the interval after the start of the day, and nothing of
+        frames of a day that was already ended.
+        """
+        last_timestamp = self.ecu_timestamps.get(ecu_id)
+        if last_timestamp is None and not self._integrated:
+            # Continue from restored energy.
+            last_timestamp = self.timestamp
+        interval = None
+        if last_timestamp is not None:
+            interval = (timestamp - last_timestamp).total_seconds()
+            if interval < 0:
+                return False
+        self.ecu_timestamps[ecu_id] = timestamp
+        if self.timestamp is None or timestamp > self.timestamp:
+            self.timestamp = timestamp
+        self._integrated = True
+
+        # Hours of power to add, to the daily energy only part of it on a new day.
+        hours = (interval or 0) / 3600
+        daily_hours = hours
+        day_key = PERIOD_KEYS[SummationPeriod.DAILY](timestamp)
+        if self.day_key is not None and day_key < self.day_key:
+            daily_hours = 0
+        else:
+            if day_key != self.day_key:
+                if self.day_key is not None:
+                    self._clear_daily()
+                self.day_key = day_key
+            if (
+                last_timestamp is not None
+                and PERIOD_KEYS[SummationPeriod.DAILY](last_timestamp) != day_key
+            ):
+                period_start = get_period_start_timestamp(
+                    SummationPeriod.DAILY, timestamp
+                )
+                daily_hours = (
+                    min(
+                        (timestamp - period_start).total_seconds(),
+                        self.max_stub_interval,
+                        interval,
+                    )
+                    / 3600
+                )
+
+        daily = self.energy[SummationPeriod.DAILY]
+        lifetime = self.energy[SummationPeriod.LIFETIME]
+        row_of = self.rows.get
+        for uid, inverter in inverters.items():
+            if (row := row_of(uid)) is None:
+                row = self._row(uid)
+            total = 0.0
+            for index, power in enumerate(inverter["power"], row + 1):
+                total += power
+                daily[index] += power * daily_hours
+                lifetime[index] += power * hours
+            daily[row] += total * daily_hours
+            lifetime[row] += total * hours
+        return True
+
+    def advance(self, timestamp: datetime) -> None:
+        """Start a new day if it has begun by timestamp, without power.
+
+        The times of the last frames are kept, so the energy of the next frames
+        before midnight still counts in the lifetime energy.
+        """
+        timestamp = timestamp.replace(tzinfo=None)
+        day_key = PERIOD_KEYS[SummationPeriod.DAILY](timestamp)
+        if self.day_key is not None and self.day_key < day_key:
+            self._clear_daily()
+            self.day_key = day_key
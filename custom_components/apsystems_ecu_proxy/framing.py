@@ -0,0 +1,117 @@
+"""Reassemble ECU frames from a TCP stream."""
+
+import asyncio
+import logging
+
+from .parser import FRAME_HEADER
+
+_LOGGER = logging.getLogger(__name__)
+
+FRAME_TRAILER = b"END\n"
+READ_SIZE = 4096
+# Largest frame accepted, ample for 120 four channel inverters.
+MAX_FRAME_SIZE = 65536
+
+
+class FrameBuffer:
+    """Per connection buffer returning complete frames.
+
+    Data frames (APS18AA) are returned once the length stated in the header is
+    reached with the END trailer, or else the END trailer is found. The header only
+    has room for 3 digits, so frames over 999 bytes rely on the trailer. A data
+    frame cut short by the start of another is returned as is, to be filtered out.
+    Any other message is returned as received, up to the start of a following data
+    frame.
+    """
+
+    def __init__(self, max_frame_size: int = MAX_FRAME_SIZE) -> None:
+        """Initialise buffer."""
+        self.max_frame_size = max_frame_size
+        self._buffer = bytearray()
+        # Position up to which the current frame has been searched for a trailer.
+        self._searched = 0
+
+    def __len__(self) -> int:
+        """Return number of buffered bytes."""
+        return len(self._buffer)
+
+    def feed(self, data: bytes) -> list[bytes]:
+        """Add received data and return any completed frames."""
+        buffer = self._buffer
+        buffer += data
+        frames = []
+
+        while buffer:
+            if not buffer.startswith(FRAME_HEADER):
+                if FRAME_HEADER.startswith(buffer):
+                    # Header itself is split over reads.
+                    break
+                # Pass on up to a following data frame, if any.
+                if (end := buffer.find(FRAME_HEADER, 1)) == -1:
+                    end = len(buffer)
+                frames.append(bytes(buffer[:end]))
+                del buffer[:end]
+                continue
+
+            if (end := self._frame_end()) is None:
+                if len(buffer) > self.max_frame_size:
+                    _LOGGER.warning(
+                        "Discarding %s bytes without frame end", len(buffer)
+                    )
+                    buffer.clear()
+                    self._searched = 0
+                break
+
+            frames.append(bytes(buffer[:end]))
+            del buffer[:end]
+            self._searched = 0
+
+        return frames
+
+    def _frame_end(self) -> int | None:
+        """Return end position of the frame at the start of the buffer."""
+        buffer = self._buffer
+
+        # Use the stated length when it lines up with the trailer.
+        length_field = buffer[7:10]
+        if len(length_field) == 3 and length_field.isdigit():
+            end = int(length_field) + 1
+            if buffer[end - len(FRAME_TRAILER) : end] == FRAME_TRAILER:
+                return end
+
+        # Otherwise search for the trailer, skipping what has already been searched.
+        # The header holds digits only, so the trailer cannot occur within it.
+        start = max(len(FRAME_HEADER) + 3, self._searched - len(FRAME_TRAILER))
+        pos = buffer.find(FRAME_TRAILER, start)
+        end = len(buffer) if pos == -1 else pos
+
+        # A frame starting before the trailer means this one was cut short.
+        header_start = max(1, self._searched - len(FRAME_HEADER))
+        if (next_frame := buffer.find(FRAME_HEADER, header_start, end)) != -1:
+            return next_frame
+
+        if pos == -1:
+            self._searched = len(buffer)
+            return None
+        return pos + len(FRAME_TRAILER)
+
+    def clear(self) -> None:
+        """Discard buffered data."""
+        self._buffer.clear()
+        self._searched = 0
+
+
+async def read_frames(reader: asyncio.StreamReader, buffer: FrameBuffer) -> list[bytes]:
+    """Read from stream until at least one frame is complete.
+
+    Returns an empty list if the stream has closed.
+    """
+    while True:
+        data = await reader.read(READ_SIZE)
+        if data == b"":
+            if len(buffer):
+                _LOGGER.debug("Stream closed with %s bytes unframed", len(buffer))
+                buffer.clear()
+            return []
+        if frames := buffer.feed(data):
+            return frames
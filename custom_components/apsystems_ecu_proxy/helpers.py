@@ -1,6 +1,6 @@
 """Helper functions."""
 
-from datetime import datetime
+from datetime import datetime, timedelta
 
 from homeassistant.core import HomeAssistant
 from homeassistant.util import dt as dt_util
@@ -23,47 +23,36 @@ def get_period_start_timestamp(
 ) -> datetime:
     """Get timestamp of start of summation period."""
     if summation_period == SummationPeriod.HOURLY:
-        return timestamp.replace(minute=0, second=0)
+        return timestamp.replace(minute=0, second=0, microsecond=0)
     if summation_period == SummationPeriod.DAILY:
-        return timestamp.replace(hour=0, minute=0, second=0)
+        return timestamp.replace(hour=0, minute=0, second=0, microsecond=0)
     if summation_period == SummationPeriod.WEEKLY:
-        return datetime.strptime(
-            f"{timestamp.year}-{timestamp.isocalendar()[1]}-1", "%Y-%W-%w"
+        # Weeks start on Monday, as ISO weeks do.
+        return (timestamp - timedelta(days=timestamp.weekday())).replace(
+            hour=0, minute=0, second=0, microsecond=0
         )
     if summation_period == SummationPeriod.MONTHLY:
-        return timestamp.replace(day=1, hour=0, minute=0, second=0)
+        return timestamp.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
     if summation_period == SummationPeriod.YEARLY:
-        return timestamp.replace(month=1, day=1, hour=0, minute=0, second=0)
+        return timestamp.replace(
+            month=1, day=1, hour=0, minute=0, second=0, microsecond=0
+        )
     return datetime.fromtimestamp(0)
 
 
-def has_changed_period(
-    summation_period: SummationPeriod,
-    base_timestamp: datetime,
-    timestamp: datetime,
-) -> bool:
-    """Return if period of interval has exceeded."""
-    if (
-        (
-            summation_period == SummationPeriod.HOURLY
-            and base_timestamp.hour != timestamp.hour
-        )
-        or (
-            summation_period == SummationPeriod.DAILY
-            and base_timestamp.day != timestamp.day
-        )
-        or (
-            summation_period == SummationPeriod.WEEKLY
-            and base_timestamp.isocalendar()[1] != timestamp.isocalendar()[1]
-        )
-        or (
-            summation_period == SummationPeriod.MONTHLY
-            and base_timestamp.month != timestamp.month
-        )
-        or (
-            summation_period == SummationPeriod.YEARLY
-            and base_timestamp.year != timestamp.year
-        )
-    ):
-        return True
-    return False
+def get_next_period_start_timestamp(
+    summation_period: SummationPeriod, timestamp: datetime
+) -> datetime | None:
+    """Get timestamp of start of the next summation period, None if lifetime."""
+    start = get_period_start_timestamp(summation_period, timestamp)
+    if summation_period == SummationPeriod.HOURLY:
+        return start + timedelta(hours=1)
+    if summation_period == SummationPeriod.DAILY:
+        return start + timedelta(days=1)
+    if summation_period == SummationPeriod.WEEKLY:
+        return start + timedelta(weeks=1)
+    if summation_period == SummationPeriod.MONTHLY:
+        return (start + timedelta(days=32)).replace(day=1)
+    if summation_period == SummationPeriod.YEARLY:
+        return start.replace(year=start.year + 1)
+    return None
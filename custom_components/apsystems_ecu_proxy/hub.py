@@ -0,0 +1,78 @@
+"""Distribute ECU frames to the sensors of each device."""
+
+from collections.abc import Callable
+import logging
+from typing import Any
+
+from homeassistant.core import CALLBACK_TYPE, callback
+
+from .const import ATTR_INVERTERS
+
+_LOGGER = logging.getLogger(__name__)
+
+# Called with the whole frame and the data of the device (frame or inverter).
+FrameListener = Callable[[dict[str, Any], dict[str, Any]], None]
+
+
+class FrameHub:
+    """Publish each frame once to the listeners of the devices in it.
+
+    Listeners subscribe by device identifier, ecu_<id> or inverter_<uid>. The
+    identifier is split once on subscribing, so publishing looks listeners up by
+    the ids in the frame without building keys.
+    """
+
+    def __init__(self) -> None:
+        """Initialise hub."""
+        self._ecu_listeners: dict[str, list[FrameListener]] = {}
+        self._inverter_listeners: dict[str, list[FrameListener]] = {}
+
+    @callback
+    def async_subscribe(
+        self, device_key: str, listener: FrameListener
+    ) -> CALLBACK_TYPE:
+        """Subscribe listener to frames of a device."""
+        device_type, _, device_id = device_key.partition("_")
+        if device_type == "inverter":
+            registry = self._inverter_listeners
+        else:
+            registry = self._ecu_listeners
+        listeners = registry.setdefault(device_id, [])
+        listeners.append(listener)
+
+        @callback
+        def async_unsubscribe() -> None:
+            listeners.remove(listener)
+            if not listeners and registry.get(device_id) is listeners:
+                del registry[device_id]
+
+        return async_unsubscribe
+
+    @callback
+    def async_publish(self, frame: dict[str, Any]) -> None:
+        """Pass frame to the listeners of the ECU and its inverters.
+
+        A listener raising is logged, the other listeners still get the frame.
+        """
+        for listener in self._ecu_listeners.get(frame["ecu-id"], ()):
+            try:
+                listener(frame, frame)
+            except Exception:
+                _LOGGER.exception("Error passing frame to %s", listener)
+
+        inverter_listeners = self._inverter_listeners
+        for uid, inverter in frame.get(ATTR_INVERTERS, {}).items():
+            for listener in inverter_listeners.get(uid, ()):
+                try:
+                    listener(frame, inverter)
+                except Exception:
+                    _LOGGER.exception("Error passing frame to %s", listener)
+
+    @property
+    def listener_count(self) -> int:
+        """Return number of subscribed listeners."""
+        return sum(
+            len(listeners)
+            for registry in (self._ecu_listeners, self._inverter_listeners)
+            for listeners in registry.values()
+        )
@@ -0,0 +1,291 @@
+"""Parser for APsystems ECU data frames.
+
+Works on the raw bytes received from the ECU so that frames do not need to be
+decoded to a string before being interpreted. All field positions are fixed, so
+the offsets are resolved once at import time.
+
+Inverter models are looked up by model code in a registry built at import time,
+which can be extended with models from a JSON file.
+"""
+
+from datetime import datetime
+import json
+import logging
+import os
+from typing import Any
+
+_LOGGER = logging.getLogger(__name__)
+
+FRAME_HEADER = b"APS18AA"
+INVERTER_MARKER = b"END"
+
+ECU_MODELS_216 = {
+    "2160": "ECU-R",
+    "2162": "ECU-R Pro",
+    "2163": "ECU-B",
+}
+
+ECU_MODELS_215 = {"215": "ECU-C"}
+YC500_MODEL_CODES = ["403", "404"]
+YC600_MODEL_CODES = ["406", "407", "408", "409", "703", "706"]
+QS1_MODEL_CODES = ["801", "802", "805", "806"]
+YC1000_MODEL_CODES = ["501", "502", "503", "504"]
+
+# Channel offsets relative to the start of an inverter's END marker.
+POWER_CHANNELS = [63, 83, 103, 123]
+VOLTAGE_CHANNELS = [51, 71, 91, 111]
+CURRENT_CHANNELS = [60, 80, 100, 120]
+
+INVERTER_MODELS = [
+    {
+        "name": "YC500 series",
+        "channels": 2,
+        "model_codes": YC500_MODEL_CODES,
+    },
+    {
+        "name": "YC600/DS3 series",
+        "channels": 2,
+        "model_codes": YC600_MODEL_CODES,
+    },
+    {
+        "name": "QS1",
+        "channels": 4,
+        "model_codes": QS1_MODEL_CODES,
+    },
+    {
+        "name": "YC1000/QT2",
+        "channels": 4,
+        "model_codes": YC1000_MODEL_CODES,
+    },
+]
+
+UNKNOWN_MODEL = "Unknown"
+# Most channels a model can have.
+MAX_CHANNELS = 8
+# Models added by the user, in the integration folder of the config directory.
+MODELS_FILE = "inverter_models.json"
+
+# Inverter records start after the fixed ECU header.
+INVERTER_START = 77
+# Record of an inverter of unknown model, up to and including the temperature.
+INVERTER_BASE_SIZE = 28
+
+
+def _channel_slices(offsets: list[int], channels: int) -> tuple[tuple[int, int], ...]:
+    """Return (start, end) positions of the 3 digit channel fields."""
+    return tuple((offset, offset + 3) for offset in offsets[:channels])
+
+
+def _model_layout(model: dict[str, Any]) -> tuple:
+    """Return (name, channels, power, voltage, current slices, record size)."""
+    channels = model["channels"]
+    get = model.get
+    power = _channel_slices(get("power_offsets", POWER_CHANNELS), channels)
+    voltage = _channel_slices(get("voltage_offsets", VOLTAGE_CHANNELS), channels)
+    current = _channel_slices(get("current_offsets", CURRENT_CHANNELS), channels)
+    record_size = max(
+        (end for _, end in (*power, *voltage, *current)), default=INVERTER_BASE_SIZE
+    )
+    return (
+        model["name"],
+        channels,
+        power,
+        voltage,
+        current,
+        max(record_size, INVERTER_BASE_SIZE),
+    )
+
+
+# Model code (as bytes) -> layout, see _model_layout.
+_MODEL_LAYOUTS: dict[bytes, tuple] = {
+    model_code.encode(): _model_layout(model)
+    for model in INVERTER_MODELS
+    for model_code in model["model_codes"]
+}
+# Unknown model codes already warned about.
+_unknown_model_codes: set[bytes] = set()
+
+
+def _validate_model(model: Any) -> None:
+    """Raise TypeError or ValueError if model is not a valid model definition."""
+    if not isinstance(model, dict):
+        raise TypeError(f"model must be an object, not {model!r}")
+    if not isinstance(model.get("name"), str):
+        raise TypeError(f"model needs a name: {model!r}")
+    name = model["name"]
+    codes = model.get("model_codes")
+    if not isinstance(codes, list) or not all(
+        isinstance(code, str) and len(code) == 3 and code.isdigit() for code in codes
+    ):
+        raise ValueError(f"{name}: model_codes must be a list of 3 digit strings")
+    channels = model.get("channels")
+    if not isinstance(channels, int) or not 0 <= channels <= MAX_CHANNELS:
+        raise ValueError(f"{name}: channels must be a number from 0 to {MAX_CHANNELS}")
+    for key in ("power_offsets", "voltage_offsets", "current_offsets"):
+        offsets = model.get(key, POWER_CHANNELS)
+        if not isinstance(offsets, list) or not all(
+            isinstance(offset, int) and offset >= INVERTER_BASE_SIZE
+            for offset in offsets
+        ):
+            raise ValueError(
+                f"{name}: {key} must be a list of offsets from {INVERTER_BASE_SIZE}"
+            )
+        if len(offsets) < channels:
+            raise ValueError(f"{name}: {key} needs an offset for each channel")
+
+
+def register_models(models: list[dict[str, Any]]) -> list[str]:
+    """Add inverter models to the registry and return their model codes.
+
+    Models are validated before any is added. Offsets default to the layout of the
+    built-in models and a model code already known is replaced.
+    """
+    if not isinstance(models, list):
+        raise TypeError("models must be a list")
+    for model in models:
+        _validate_model(model)
+
+    added = []
+    for model in models:
+        layout = _model_layout(model)
+        for model_code in model["model_codes"]:
+            if (code := model_code.encode()) in _MODEL_LAYOUTS:
+                _LOGGER.info(
+                    "Model code %s of %s replaced by %s",
+                    model_code,
+                    _MODEL_LAYOUTS[code][0],
+                    model["name"],
+                )
+            _MODEL_LAYOUTS[code] = layout
+            _unknown_model_codes.discard(code)
+            added.append(model_code)
+    return added
+
+
+def load_models(path: str) -> list[str]:
+    """Add inverter models from a JSON file, if it exists.
+
+    Does I/O, so run it in the executor.
+    """
+    if not os.path.exists(path):
+        return []
+    try:
+        with open(path, encoding="utf-8") as file:
+            added = register_models(json.load(file))
+    except (OSError, TypeError, ValueError) as err:
+        _LOGGER.error("Inverter models not loaded from %s: %s", path, err)
+        return []
+    _LOGGER.info("Loaded inverter model codes %s from %s", added, path)
+    return added
+
+
+def is_data_frame(frame: bytes) -> bool:
+    """Return if frame is an ECU data frame."""
+    return frame.startswith(FRAME_HEADER)
+
+
+def frame_length(frame: bytes) -> int:
+    """Return length stated in the frame header."""
+    return int(frame[7:10])
+
+
+def has_valid_length(frame: bytes) -> bool:
+    """Return if the stated length matches the frame.
+
+    The length excludes the trailing newline. As the header only has room for 3
+    digits, frames over 999 bytes are compared on the last 3 digits.
+    """
+    return frame_length(frame) == (len(frame) - 1) % 1000
+
+
+def get_model(model_code: str) -> str:
+    """Get ECU model from model code."""
+    if model := ECU_MODELS_216.get(model_code) or ECU_MODELS_215.get(model_code[:3]):
+        return model
+    return UNKNOWN_MODEL
+
+
+def parse_timestamp(frame: bytes) -> datetime:
+    """Get frame timestamp (YYYYmmddHHMMSS)."""
+    return datetime(
+        int(frame[60:64]),
+        int(frame[64:66]),
+        int(frame[66:68]),
+        int(frame[68:70]),
+        int(frame[70:72]),
+        int(frame[72:74]),
+    )
+
+
+def parse_frame(frame: bytes) -> dict[str, Any]:
+    """Get & interpret ECU data from a validated data frame."""
+    ecu_id = frame[18:30].decode()
+    return {
+        "ecu-id": ecu_id,
+        "model": get_model(ecu_id[:4]),
+        "lifetime_energy": int(frame[42:60]) / 10,
+        "current_power": int(frame[30:42]) / 100,
+        "qty_of_online_inverters": int(frame[74:77]),
+        "inverters": parse_inverters(frame),
+        "timestamp": parse_timestamp(frame),
+    }
+
+
+def parse_inverters(frame: bytes) -> dict[str, dict[str, Any]]:
+    """Get inverters keyed by uid.
+
+    Inverter records start with END followed by the inverter uid. The closing END
+    of the frame is not followed by a digit and so is skipped. Inverters of an
+    unknown model are reported without channels.
+    """
+    inverters = {}
+    find = frame.find
+    get_layout = _MODEL_LAYOUTS.get
+    frame_end = len(frame)
+    index = 0
+
+    pos = find(INVERTER_MARKER, INVERTER_START)
+    while pos != -1:
+        if pos + 3 >= frame_end or not 48 <= frame[pos + 3] <= 57:
+            pos = find(INVERTER_MARKER, pos + 3)
+            continue
+
+        model_code = frame[pos + 3 : pos + 6]
+        if (layout := get_layout(model_code)) is None:
+            layout = _unknown_layout(model_code, frame[pos + 3 : pos + 15])
+        name, channels, power, voltage, current, record_size = layout
+
+        record = frame[pos : pos + record_size]
+        uid = record[3:15].decode()
+        inverters[uid] = {
+            "uid": uid,
+            "index": index,
+            "temperature": int(record[25:28]) - 100,
+            "frequency": int(record[20:25]) / 10,
+            "model": name,
+            "channel_qty": channels,
+            "power": [int(record[start:end]) for start, end in power],
+            "voltage": [int(record[start:end]) / 10 for start, end in voltage],
+            "current": [int(record[start:end]) / 100 for start, end in current],
+        }
+        index += 1
+
+        pos = find(INVERTER_MARKER, pos + 15)
+    return inverters
+
+
+_UNKNOWN_LAYOUT = (UNKNOWN_MODEL, 0, (), (), (), INVERTER_BASE_SIZE)
+
+
+def _unknown_layout(model_code: bytes, uid: bytes) -> tuple:
+    """Return layout without channels, warning once per model code."""
+    if model_code not in _unknown_model_codes:
+        _unknown_model_codes.add(model_code)
+        _LOGGER.warning(
+            "Inverter %s has unknown model code %s and is added without channels. "
+            "Add the model to apsystems_ecu_proxy/%s in the config directory",
+            uid.decode(errors="replace"),
+            model_code.decode(errors="replace"),
+            MODELS_FILE,
+        )
+    return _UNKNOWN_LAYOUT
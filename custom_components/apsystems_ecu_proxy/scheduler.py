@@ -0,0 +1,71 @@
+"""Timer for the start of summation periods."""
+
+from collections.abc import Callable
+from datetime import datetime
+import logging
+
+from homeassistant.core import CALLBACK_TYPE, HomeAssistant, callback
+from homeassistant.helpers.event import async_track_point_in_time
+from homeassistant.util import dt as dt_util
+
+from .const import SummationPeriod
+from .helpers import get_next_period_start_timestamp
+
+_LOGGER = logging.getLogger(__name__)
+
+# Called with the period that started and the local time it started.
+PeriodStartAction = Callable[[SummationPeriod, datetime], None]
+
+
+class PeriodScheduler:
+    """Call an action at the start of each summation period.
+
+    The start of the next period is computed once per period, when the previous
+    one starts. One timer is armed, for the earliest of them.
+    """
+
+    def __init__(self, hass: HomeAssistant, action: PeriodStartAction) -> None:
+        """Initialise scheduler."""
+        self.hass = hass
+        self.action = action
+        self.next_starts: dict[SummationPeriod, datetime] = {}
+        self._unsub_timer: CALLBACK_TYPE | None = None
+
+    @callback
+    def async_start(self) -> None:
+        """Compute the next period starts and arm the timer."""
+        now = dt_util.now()
+        for period in SummationPeriod:
+            if next_start := get_next_period_start_timestamp(period, now):
+                self.next_starts[period] = next_start
+        self._arm()
+
+    @callback
+    def async_stop(self) -> None:
+        """Cancel the timer."""
+        if self._unsub_timer is not None:
+            self._unsub_timer()
+            self._unsub_timer = None
+
+    @callback
+    def _arm(self) -> None:
+        """Arm the timer for the earliest period start."""
+        self._unsub_timer = async_track_point_in_time(
+            self.hass, self._fire, min(self.next_starts.values())
+        )
+
+    @callback
+    def _fire(self, now: datetime) -> None:
+        """Call action for each period started, shortest period first."""
+        self._unsub_timer = None
+        now = dt_util.as_local(now)
+        try:
+            for period, start in list(self.next_starts.items()):
+                if start <= now:
+                    _LOGGER.debug("Start of %s period at %s", period, start)
+                    self.next_starts[period] = get_next_period_start_timestamp(
+                        period, now
+                    )
+                    self.action(period, start)
+        finally:
+            self._arm()
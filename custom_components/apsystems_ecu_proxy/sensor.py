@@ -2,9 +2,12 @@
 
 from __future__ import annotations
 
+from collections.abc import Callable, Iterable
 from dataclasses import dataclass
 from datetime import datetime
 import logging
+from operator import itemgetter
+import time
 from typing import Any
 
 from homeassistant.components.sensor import (
@@ -16,12 +19,14 @@ from homeassistant.components.sensor import (
 from homeassistant.config_entries import ConfigEntry
 from homeassistant.const import (
     ATTR_UNIT_OF_MEASUREMENT,
+    Platform,
     UnitOfElectricCurrent,
     UnitOfElectricPotential,
     UnitOfEnergy,
     UnitOfFrequency,
     UnitOfPower,
     UnitOfTemperature,
+    UnitOfTime,
 )
 from homeassistant.core import HomeAssistant, callback
 from homeassistant.helpers import device_registry as dr, entity_registry as er
@@ -37,20 +42,32 @@ from .const import (
     ATTR_SUMMATION_TYPE,
     ATTR_TIMESTAMP,
     ATTR_VALUE_IF_NO_UPDATE,
+    DEFAULTS,
     DOMAIN,
+    SOCKET_PORTS,
     SOLAR_ICON,
     SummationPeriod,
     SummationType,
+    WriteMode,
 )
-from .helpers import (
-    add_local_timezone,
-    get_period_start_timestamp,
-    has_changed_period,
-    slugify,
+from .energy import (
+    Accumulator,
+    EnergyIntegrator,
+    EnergySlot,
+    InverterEnergyIntegrator,
 )
+from .helpers import add_local_timezone, slugify
+from .stats import PORT_STAGES, STAGE_SENSOR_WRITE, StageTimings
 
 _LOGGER = logging.getLogger(__name__)
 
+# Changes within these are not written in deadband write mode.
+DEADBANDS: dict[SensorDeviceClass, float] = {
+    SensorDeviceClass.CURRENT: 0.01,
+    SensorDeviceClass.POWER: 1,
+    SensorDeviceClass.VOLTAGE: 0.1,
+}
+
 
 @dataclass
 class SensorData:
@@ -78,6 +95,7 @@ class APSystemSensorConfig:
     initial_value: SensorData | None = None
     display_uom: str | None = None
     display_precision: int | None = None
+    channel: int | None = None
 
 
 @dataclass(frozen=True, kw_only=True)
@@ -230,6 +248,175 @@ INVERTER_CHANNEL_SENSORS: tuple[APSystemSensorDefinition, ...] = (
     ),
 )
 
+# Energy of inverters and of their channels, integrated from channel power.
+INVERTER_ENERGY_SENSORS: tuple[APSystemSensorDefinition, ...] = (
+    APSystemSensorDefinition(
+        name="Daily Energy Production",
+        icon=SOLAR_ICON,
+        parameter="power",
+        device_class=SensorDeviceClass.ENERGY,
+        state_class=SensorStateClass.TOTAL,
+        unit_of_measurement=UnitOfEnergy.KILO_WATT_HOUR,
+        summation_entity=True,
+        summation_period=SummationPeriod.DAILY,
+        summation_type=SummationType.SUM,
+        summation_factor=1000,
+    ),
+    APSystemSensorDefinition(
+        name="Lifetime Energy Production",
+        icon=SOLAR_ICON,
+        parameter="power",
+        device_class=SensorDeviceClass.ENERGY,
+        state_class=SensorStateClass.TOTAL_INCREASING,
+        unit_of_measurement=UnitOfEnergy.KILO_WATT_HOUR,
+        summation_entity=True,
+        summation_period=SummationPeriod.LIFETIME,
+        summation_type=SummationType.SUM,
+        summation_factor=1000,
+    ),
+)
+
+# Definitions by device type (ecu or inverter) and name slug.
+SENSOR_DEFINITIONS: dict[tuple[str, str], APSystemSensorDefinition] = {
+    **{("ecu", slugify(sensor.name)): sensor for sensor in ECU_SENSORS},
+    **{
+        ("inverter", slugify(sensor.name)): sensor
+        for sensor in (
+            *INVERTER_SENSORS,
+            *INVERTER_CHANNEL_SENSORS,
+            *INVERTER_ENERGY_SENSORS,
+        )
+    },
+}
+
+
+@dataclass(frozen=True, slots=True)
+class SensorUpdatePlan:
+    """How a sensor is updated, compiled once when it is added."""
+
+    get_value: Callable[[dict[str, Any]], Any] | None
+    # Fixed attributes, set once rather than on every update.
+    attributes: dict[str, Any]
+    summation: bool
+    total_increasing: bool
+    timestamp: bool
+    # Skip writing unchanged values, and values changed within deadband if set.
+    dedup: bool
+    deadband: float | None
+
+
+def value_getter(
+    parameter: str, channel: int | None
+) -> Callable[[dict[str, Any]], Any]:
+    """Return function getting the sensor value from device data."""
+    if channel is None:
+        return itemgetter(parameter)
+
+    def get_channel_value(data: dict[str, Any]) -> Any:
+        return data[parameter][channel]
+
+    return get_channel_value
+
+
+def get_device_key(device_identifiers: set[tuple[str, str]]) -> str | None:
+    """Return identifier of device in this domain, ecu_<id> or inverter_<uid>."""
+    return next(
+        (identifier for domain, identifier in device_identifiers if domain == DOMAIN),
+        None,
+    )
+
+
+def parse_unique_id(unique_id: str, device_key: str) -> tuple[str, int | None]:
+    """Return sensor name slug and channel index from a sensor unique id.
+
+    Unique ids are <ecu_id>_<slug> for ECU sensors, <ecu_id>_<uid>_<slug> for
+    inverter sensors and <ecu_id>_<uid>_<slug>_<channel> for channel sensors.
+    """
+    parts = 3 if device_key.startswith("inverter_") else 2
+    name = unique_id.split("_", parts - 1)[-1]
+    slug, _, channel = name.rpartition("_")
+    if slug and channel.isdigit():
+        return slug, int(channel) - 1
+    return name, None
+
+
+# Marks unique ids of proxy statistics sensors, <ecu_id>_proxy_<statistic>.
+PROXY_STATS_ID = "_proxy_"
+
+# Counter sensors of frames of the ECU on all ports: name, message count keys.
+PROXY_COUNTERS: tuple[tuple[str, tuple[str, ...]], ...] = (
+    ("Frames Accepted", ("accepted",)),
+    ("Frames Filtered", ("ignored", "too_old", "duplicate")),
+    ("Checksum Failures", ("checksum_error",)),
+    ("Exceptions", ("exception",)),
+)
+
+
+def proxy_stats_sensors(
+    ecu_id: str, device_identifiers: set[tuple[str, str]], config_entry: ConfigEntry
+) -> list[SensorEntity]:
+    """Return proxy statistics sensors of an ECU device."""
+    sensors: list[SensorEntity] = [
+        APSystemsProxyStatsSensor(
+            unique_id=f"{ecu_id}{PROXY_STATS_ID}{port}_{stage}",
+            name=f"Port {port} {stage.replace('_', ' ').capitalize()} Latency",
+            device_identifiers=device_identifiers,
+            config_entry=config_entry,
+            port=port,
+            stage=stage,
+        )
+        for port in SOCKET_PORTS
+        for stage in PORT_STAGES
+    ]
+    sensors.append(
+        APSystemsProxyStatsSensor(
+            unique_id=f"{ecu_id}{PROXY_STATS_ID}{STAGE_SENSOR_WRITE}",
+            name="Sensor Write Latency",
+            device_identifiers=device_identifiers,
+            config_entry=config_entry,
+            stage=STAGE_SENSOR_WRITE,
+        )
+    )
+    sensors.extend(
+        APSystemsProxyStatsSensor(
+            unique_id=f"{ecu_id}{PROXY_STATS_ID}{slugify(name)}",
+            name=name,
+            device_identifiers=device_identifiers,
+            config_entry=config_entry,
+            ecu_id=ecu_id,
+            counter_keys=keys,
+        )
+        for name, keys in PROXY_COUNTERS
+    )
+    return sensors
+
+
+def inverter_energy_sensors(
+    ecu_id: str,
+    uid: str,
+    device_identifiers: set[tuple[str, str]],
+    channels: Iterable[int],
+    config_entry: ConfigEntry,
+) -> list[APSystemsSensor]:
+    """Return energy sensors of an inverter and its channels."""
+    sensors = []
+    for channel in (None, *channels):
+        for sensor in INVERTER_ENERGY_SENSORS:
+            unique_id = f"{ecu_id}_{uid}_{slugify(sensor.name)}"
+            name = None
+            if channel is not None:
+                unique_id = f"{unique_id}_{channel + 1}"
+                name = f"{sensor.name} Ch {channel + 1}"
+            config = APSystemSensorConfig(
+                unique_id=unique_id,
+                device_identifier=device_identifiers,
+                initial_value=SensorData(data=0, attributes={}),
+                name=name,
+                channel=channel,
+            )
+            sensors.append(APSystemsSensor(sensor, config, config_entry))
+    return sensors
+
 
 # ===============================================================================
 async def async_setup_entry(
@@ -257,14 +444,36 @@ async def async_setup_entry(
             entity_registry, config_entry.entry_id
         )
 
+        # ECU id and channels of inverters, to add energy sensors they miss.
+        inverter_channels: dict[str, tuple[str, set[int]]] = {}
         for entry in entries:
+            # Statistics sensors are created for each ECU device below.
+            if PROXY_STATS_ID in entry.unique_id:
+                continue
             if device := get_device_entry(entry.device_id):
+                # Get what is needed to update the sensor from its definition.
+                device_key = get_device_key(device.identifiers)
+                slug, channel = parse_unique_id(entry.unique_id, device_key)
+                if device_key.startswith("inverter_"):
+                    _, channels = inverter_channels.setdefault(
+                        device.id, (entry.unique_id.partition("_")[0], set())
+                    )
+                    if channel is not None:
+                        channels.add(channel)
+                source = SENSOR_DEFINITIONS.get((device_key.partition("_")[0], slug))
+
                 definition = APSystemSensorDefinition(
                     name=entry.original_name,
                     icon=entry.original_icon,
+                    parameter=source.parameter if source else None,
                     device_class=entry.device_class or entry.original_device_class,
                     unit_of_measurement=entry.unit_of_measurement,
                     entity_category=entry.entity_category,
+                    summation_entity=source.summation_entity if source else False,
+                    summation_period=source.summation_period if source else None,
+                    summation_type=source.summation_type if source else None,
+                    summation_factor=source.summation_factor if source else 1,
+                    value_if_no_update=source.value_if_no_update if source else -1,
                 )
 
                 config = APSystemSensorConfig(
@@ -273,16 +482,43 @@ async def async_setup_entry(
                     display_uom=entry.options.get("sensor", {}).get(
                         "unit_of_measurement"
                     ),
+                    channel=channel,
                 )
 
                 sensors.append(APSystemsSensor(definition, config, config_entry))
 
+        restored_ids = {entry.unique_id for entry in entries}
+        device_registry = dr.async_get(hass)
+        for device in dr.async_entries_for_config_entry(
+            device_registry, config_entry.entry_id
+        ):
+            device_key = get_device_key(device.identifiers)
+            if device_key and device_key.startswith("ecu_"):
+                ecu_id = device_key.removeprefix("ecu_")
+                sensors.extend(
+                    proxy_stats_sensors(ecu_id, device.identifiers, config_entry)
+                )
+            elif device.id in inverter_channels:
+                ecu_id, channels = inverter_channels[device.id]
+                sensors.extend(
+                    sensor
+                    for sensor in inverter_energy_sensors(
+                        ecu_id,
+                        device_key.removeprefix("inverter_"),
+                        device.identifiers,
+                        sorted(channels),
+                        config_entry,
+                    )
+                    if sensor.unique_id not in restored_ids
+                )
+
         if sensors:
             add_entities(sensors)
 
-    @callback
-    def handle_ecu_registration(data: dict[str, Any]):
-        """Handle ECU entity creation."""
+    def create_ecu(
+        device_registry: dr.DeviceRegistry, data: dict[str, Any]
+    ) -> list[SensorEntity]:
+        """Create ECU device and return its sensors."""
 
         # We have found an ECU that is not registered in the device registry
         # So, create all sensors described in ECU_SENSORS
@@ -293,7 +529,6 @@ async def async_setup_entry(
         device_identifiers = {(DOMAIN, f"ecu_{ecu_id}")}
 
         # Create device
-        device_registry = dr.async_get(hass)
         device_registry.async_get_or_create(
             config_entry_id=config_entry.entry_id,
             identifiers=device_identifiers,
@@ -322,11 +557,13 @@ async def async_setup_entry(
                 ),
             )
             sensors.append(APSystemsSensor(sensor, config, config_entry))
-        add_entities(sensors)
+        sensors.extend(proxy_stats_sensors(ecu_id, device_identifiers, config_entry))
+        return sensors
 
-    @callback
-    def handle_inverter_registration(data: dict[str, Any]):
-        """Handle inverter entity creation."""
+    def create_inverter(
+        device_registry: dr.DeviceRegistry, data: dict[str, Any]
+    ) -> list[SensorEntity]:
+        """Create inverter device and return its sensors."""
 
         # We have found an Inverter that is not registered in the device registry
         # So, create all sensors described in INVERTER_SENSORS and
@@ -338,8 +575,8 @@ async def async_setup_entry(
         uid = data.get("uid")
         device_identifiers = {(DOMAIN, f"inverter_{uid}")}
 
-        # Create device
-        device_registry = dr.async_get(hass)
+        # Create device, or update the model of an inverter registered when its
+        # model was unknown.
         device_registry.async_get_or_create(
             config_entry_id=config_entry.entry_id,
             identifiers=device_identifiers,
@@ -385,23 +622,57 @@ async def async_setup_entry(
                         attributes=initial_attribute_values,
                     ),
                     name=f"{sensor.name} Ch {channel + 1}",
+                    channel=channel,
                 )
                 sensors.append(APSystemsSensor(sensor, config, config_entry))
 
-        add_entities(sensors)
+        sensors.extend(
+            inverter_energy_sensors(
+                ecu_id,
+                uid,
+                device_identifiers,
+                range(data.get("channel_qty", 0)),
+                config_entry,
+            )
+        )
+
+        return sensors
+
+    @callback
+    def handle_device_registration(devices: dict[str, Any]):
+        """Create the new ECU and inverters of a frame and add their sensors.
+
+        All sensors are added in one call, so that the entity platform adds them
+        as one batch.
+        """
+        device_registry = dr.async_get(hass)
+        sensors = []
+        if (ecu := devices.get("ecu")) is not None:
+            sensors.extend(create_ecu(device_registry, ecu))
+        for inverter in devices.get("inverters", ()):
+            sensors.extend(create_inverter(device_registry, inverter))
+
+        # Skip sensors that exist already, when an inverter gets channel sensors.
+        entity_registry = er.async_get(hass)
+        add_entities(
+            [
+                sensor
+                for sensor in sensors
+                if not entity_registry.async_get_entity_id(
+                    Platform.SENSOR, DOMAIN, sensor.unique_id
+                )
+            ]
+        )
 
-    # Create listener for ecu or inverter registration.
+    # Create listener for ecu and inverter registration.
     # Called by update callback in APManager class.
     # Allows dynamic creating of sensors.
-    async_dispatcher_connect(
-        hass,
-        f"{DOMAIN}_ecu_register",
-        handle_ecu_registration,
-    )
-    async_dispatcher_connect(
-        hass,
-        f"{DOMAIN}_inverter_register",
-        handle_inverter_registration,
+    config_entry.async_on_unload(
+        async_dispatcher_connect(
+            hass,
+            f"{DOMAIN}_register",
+            handle_device_registration,
+        )
     )
 
     # Restore sensors for this config entry that have been registered previously.
@@ -415,6 +686,8 @@ class APSystemsSensor(RestoreSensor, SensorEntity):
 
     _attr_has_entity_name = True
     _attr_extra_state_attributes = {}
+    # Updated by frames, not by polling.
+    _attr_should_poll = False
 
     def __init__(
         self,
@@ -435,7 +708,24 @@ class APSystemsSensor(RestoreSensor, SensorEntity):
         self._attr_state_class = definition.state_class
         self._attr_unique_id = self._config.unique_id
 
-        self.max_stub_interval = int(self.config_entry.data.get("max_stub_interval"))
+        self._update_plan: SensorUpdatePlan | None = None
+        self._write_timings: StageTimings | None = None
+        # Summation sensors show an accumulator of an energy integrator.
+        self._energy: EnergyIntegrator | InverterEnergyIntegrator | None = None
+        self._accumulator: Accumulator | EnergySlot | None = None
+        self._summation_factor: float = 1
+
+        self.read_write_settings()
+        self._written_at = float("-inf")
+        self._written_attributes: dict[str, Any] | None = None
+
+    def read_write_settings(self) -> None:
+        """Read write mode and force write interval from the config entry."""
+        data = self.config_entry.data
+        self.write_mode = WriteMode(data.get("write_mode", DEFAULTS["write_mode"]))
+        self.force_write_interval = 60 * float(
+            data.get("force_write_interval", DEFAULTS["force_write_interval"])
+        )
 
     @property
     def is_summation_sensor(self) -> bool:
@@ -452,46 +742,72 @@ class APSystemsSensor(RestoreSensor, SensorEntity):
 
     async def async_added_to_hass(self) -> None:
         """Run when entity about to be added to hass."""
-        self.async_on_remove(
-            async_dispatcher_connect(
-                self.hass,
-                f"{DOMAIN}_{self._config.unique_id}",
-                self.update_state,
-            )
-        )
         # Restore state
         if self._config.initial_value:
             self.set_initial_value()
         else:
             await self.restore_state()
 
-        # Dispatcher Listener for midnight reset
-        if self.is_summation_sensor:
+        self._update_plan = self.compile_update_plan()
+        if self._update_plan.attributes:
+            self.update_attributes(self._update_plan.attributes)
+
+        api_handler = self.hass.data[DOMAIN][self.config_entry.entry_id]["api_handler"]
+        self._write_timings = api_handler.write_timings
+        if self._update_plan.summation:
+            self.track_energy(api_handler)
+        if self._update_plan.get_value is not None:
+            self.async_on_remove(
+                api_handler.hub.async_subscribe(
+                    get_device_key(self._config.device_identifier), self.handle_frame
+                )
+            )
+
+        # Dispatcher Listener for the start of the summation period
+        if self._update_plan.summation and (
+            self._accumulator.period != SummationPeriod.LIFETIME
+        ):
             self.async_on_remove(
                 async_dispatcher_connect(
                     self.hass,
-                    f"{DOMAIN}_midnight_reset",
-                    self.update_state,
+                    f"{DOMAIN}_{self._accumulator.period}_start",
+                    self.handle_period_start,
                 )
             )
 
-        # Dispatcher Listener for 0 or None then no update
+        # Dispatcher Listener for changed options
+        self.async_on_remove(
+            async_dispatcher_connect(
+                self.hass,
+                f"{DOMAIN}_write_settings",
+                self.handle_write_settings,
+            )
+        )
+
+        # Dispatcher Listener for 0 or None then no update of the device
         if self.no_update_value != -1:
+            device_key = get_device_key(self._config.device_identifier)
             self.async_on_remove(
                 async_dispatcher_connect(
                     self.hass,
-                    f"{DOMAIN}_no_update",
+                    f"{DOMAIN}_no_update_{device_key}",
                     self.set_no_update_value,
                 )
             )
 
+    @callback
+    def handle_write_settings(self):
+        """Apply changed write settings from the next frame."""
+        self.read_write_settings()
+        self._update_plan = self.compile_update_plan()
+
     async def set_no_update_value(self):
         """Set no update value."""
         _LOGGER.debug(
             "Setting no update value of %s on %s", self.no_update_value, self.name
         )
         self._attr_native_value = self.no_update_value
-        self.async_write_ha_state()
+        self.write_state()
 
     async def restore_state(self):
         """Get restored state from store."""
@@ -564,166 +880,252 @@ class APSystemsSensor(RestoreSensor, SensorEntity):
         current_attributes.update(attributes)
         self._attr_extra_state_attributes = current_attributes
 
+    def compile_update_plan(self) -> SensorUpdatePlan:
+        """Compile how to update this sensor from device data."""
+        get_value = None
+        if (parameter := self._definition.parameter) is not None:
+            get_value = value_getter(parameter, self._config.channel)
+
+        # Added to support no update value changes
+        attributes = {}
+        if self._definition.value_if_no_update != -1:
+            attributes[ATTR_VALUE_IF_NO_UPDATE] = self._definition.value_if_no_update
+
+        # Summation sensors accumulate, so only skip them when unchanged.
+        deadband = None
+        if self.write_mode == WriteMode.DEADBAND and not self.is_summation_sensor:
+            deadband = DEADBANDS.get(self.device_class)
+
+        return SensorUpdatePlan(
+            get_value=get_value,
+            attributes=attributes,
+            summation=self.is_summation_sensor,
+            total_increasing=self.state_class == SensorStateClass.TOTAL_INCREASING,
+            timestamp=self.device_class == SensorDeviceClass.TIMESTAMP,
+            dedup=self.write_mode != WriteMode.ALWAYS,
+            deadband=deadband,
+        )
+
     @callback
-    def update_state(self, update_data: SensorData):
-        """Update sensor value."""
-        update_value = update_data.data
-
-        # If summation entity, calculate value
-        # This will error reading _attr_extra_state_attributes when sensor first created,
-        # so check.
-        if self.is_summation_sensor:
-            summation_period = self._attr_extra_state_attributes.get(
-                ATTR_SUMMATION_PERIOD
+    def handle_frame(self, frame: dict[str, Any], device_data: dict[str, Any]):
+        """Update sensor from a frame published by the hub."""
+        plan = self._update_plan
+        if plan.summation:
+            # Integrated for all summation sensors before the frame is published.
+            value = self.summation_value()
+        else:
+            try:
+                value = plan.get_value(device_data)
+            except (KeyError, IndexError, TypeError):
+                _LOGGER.warning("There was a value or index error")
+                return
+
+        if plan.dedup and self.is_unchanged(value):
+            return
+        self.set_value(value)
+
+    def is_unchanged(self, value: Any) -> bool:
+        """Return if value and attributes do not need to be written.
+
+        The timestamp attribute of summation sensors is not compared, it is written
+        with the next changed value or forced write.
+        """
+        if time.monotonic() - self._written_at >= self.force_write_interval:
+            return False
+        if self.attributes_changed():
+            return False
+        current_value = self._attr_native_value
+        if value == current_value:
+            return True
+        deadband = self._update_plan.deadband
+        return (
+            deadband is not None
+            and isinstance(value, (int, float))
+            and isinstance(current_value, (int, float))
+            and round(abs(value - current_value), 6) <= deadband
+        )
+
+    def attributes_changed(self) -> bool:
+        """Return if attributes have changed since the last write."""
+        attributes = self._attr_extra_state_attributes
+        written = self._written_attributes
+        if attributes is written:
+            return False
+        if written is None or attributes.keys() != written.keys():
+            return True
+        summation = self._update_plan.summation
+        return any(
+            value != written[key]
+            for key, value in attributes.items()
+            if not (summation and key == ATTR_TIMESTAMP)
+        )
+
+    @callback
+    def handle_period_start(self):
+        """Show the accumulator, started again by the energy integrator."""
+        self.set_value(self.summation_value())
+
+    def track_energy(self, api_handler: Any) -> None:
+        """Show accumulator of the ECU or inverter integrator.
+
+        The accumulator continues from the restored value.
+        """
+        attributes = self._attr_extra_state_attributes
+        definition = self._definition
+        period = SummationPeriod(
+            attributes.get(ATTR_SUMMATION_PERIOD, definition.summation_period)
+        )
+        device_key = get_device_key(self._config.device_identifier)
+        if device_key.startswith("inverter_"):
+            integrator = api_handler.inverter_energy
+            self._accumulator = integrator.track(
+                device_key.removeprefix("inverter_"), self._config.channel, period
             )
-            summation_type = self._attr_extra_state_attributes.get(ATTR_SUMMATION_TYPE)
-            summation_factor = self._attr_extra_state_attributes.get(
-                ATTR_SUMMATION_FACTOR
+        else:
+            integrator = api_handler.energy_integrator(device_key.removeprefix("ecu_"))
+            self._accumulator = integrator.track(
+                period,
+                SummationType(
+                    attributes.get(ATTR_SUMMATION_TYPE, definition.summation_type)
+                ),
             )
+        self._energy = integrator
+        self._summation_factor = float(
+            attributes.get(ATTR_SUMMATION_FACTOR, definition.summation_factor)
+        )
 
-            current_timestamp = update_data.attributes.get(ATTR_TIMESTAMP)
-            last_timestamp = self._attr_extra_state_attributes.get(ATTR_TIMESTAMP)
-            # Convert base timestamp attribute from string if needed
-            if not isinstance(last_timestamp, datetime):
-                last_timestamp = dt_util.parse_datetime(last_timestamp)
-
-            update_value, has_changed = self.summation_calculation(
-                summation_period,
-                summation_type,
-                summation_factor,
-                last_timestamp,
-                current_timestamp,
-                self.native_value,
-                update_value,
+        timestamp = attributes.get(ATTR_TIMESTAMP)
+        if self._config.initial_value or self.native_value is None or not timestamp:
+            return
+        if not isinstance(timestamp, datetime):
+            timestamp = dt_util.parse_datetime(timestamp)
+        if timestamp is not None:
+            integrator.restore(
+                self._accumulator,
+                float(self.native_value) * self._summation_factor,
+                timestamp,
             )
 
-            # Set timestamp if value changed
-            # To only update on min/max summation sensor if changed
-            if has_changed:
-                self.update_attributes({ATTR_TIMESTAMP: current_timestamp})
-
-        # Update value if no update attribute to allow changes to definition to take effect
-        if update_data.attributes.get(ATTR_VALUE_IF_NO_UPDATE, -1) != -1:
-            self.update_attributes(
-                {
-                    ATTR_VALUE_IF_NO_UPDATE: update_data.attributes.get(
-                        ATTR_VALUE_IF_NO_UPDATE
-                    ),
-                }
-            )
+    def summation_value(self) -> float | None:
+        """Return value of the accumulator, setting the timestamp it changed."""
+        accumulator = self._accumulator
+        if accumulator.value is None:
+            return self.native_value
+        if accumulator.timestamp != self._attr_extra_state_attributes.get(
+            ATTR_TIMESTAMP
+        ):
+            self.update_attributes({ATTR_TIMESTAMP: accumulator.timestamp})
+        return round(accumulator.value / self._summation_factor, 2)
+
+    @callback
+    def set_value(self, update_value: Any):
+        """Set and write sensor value."""
+        plan = self._update_plan
 
         # Prevent updating total increasing sensors (ie historical energy sensors)
         # with lower values.
-        if (
-            self.state_class == SensorStateClass.TOTAL_INCREASING
-            and update_value < self.native_value
-        ):
+        if plan.total_increasing and update_value < self.native_value:
             return
 
         # Timestamp sensor needs a timezone.  As our timestamp data is timezone unaware,
         # give it timezone.
-        if self.device_class == SensorDeviceClass.TIMESTAMP and isinstance(
-            update_value, datetime
-        ):
+        if plan.timestamp and isinstance(update_value, datetime):
             update_value = add_local_timezone(self.hass, update_value)
 
-        _LOGGER.debug(
-            "Updating sensor: %s with value %s and attributes %s",
-            self.entity_id,
-            update_value,
-            update_data.attributes,
-        )
+        _LOGGER.debug("Updating sensor: %s with value %s", self.entity_id, update_value)
         self._attr_native_value = update_value
-        self.async_write_ha_state()
-
-    def summation_calculation(
-        self,
-        summation_period: SummationPeriod,
-        summation_type: SummationType,
-        summation_factor: float,
-        last_timestamp: datetime,
-        current_timestamp: datetime,
-        current_value: float,
-        value: float,
-    ) -> int | float:
-        """Return summation value of value over time.
-
-        If change in period, calculates a value over time from start of new period with
-        max of MAX_STUB_INTERVAL.
-        If no change in period, assumes value persisted since last timestamp.
-        """
+        self.write_state()
 
-        _LOGGER.debug(
-            "Summation values: Period: %s, Timestamp - current: %s, last: %s, Value - sensor: %s, current: %s",
-            summation_period,
-            current_timestamp.replace(tzinfo=None),
-            last_timestamp.replace(tzinfo=None),
-            current_value,
-            value,
-        )
+    @callback
+    def write_state(self) -> None:
+        """Write state, noting when for forced writes."""
+        self._written_at = time.monotonic()
+        self._written_attributes = self._attr_extra_state_attributes
+        timings = self._write_timings
+        start = timings.enabled and time.perf_counter()
+        self.async_write_ha_state()
+        if start:
+            timings.record(STAGE_SENSOR_WRITE, start)
 
-        # Removing TZ info enables maths on mixed TZ-aware or TZ-naive values used
-        interval = (
-            current_timestamp.replace(tzinfo=None) - last_timestamp.replace(tzinfo=None)
-        ).seconds
 
-        sum_value = None
-        has_changed = False
+class APSystemsProxyStatsSensor(SensorEntity):
+    """Diagnostic statistics of the proxy, updated by polling.
 
-        # Get configuration. If initial data else options.
+    Latency sensors show p50 with p95 and max as attributes, and enable timing of
+    their stage while added.
+    """
 
-        _LOGGER.debug("Max stub interval = %s", self.max_stub_interval)
+    _attr_has_entity_name = True
+    _attr_entity_category = EntityCategory.DIAGNOSTIC
+    _attr_entity_registry_enabled_default = False
 
-        # Has it crossed calculation period boundry?
-        if has_changed_period(summation_period, last_timestamp, current_timestamp):
-            # Set to last recorded value if new recording period
-            has_changed = True
-            if summation_type in [SummationType.MAX, SummationType.MIN]:
-                sum_value = value
-                _LOGGER.debug(
-                    "New summation period - Value: %f",
-                    sum_value,
-                )
-            elif summation_type == SummationType.SUM:
-                # Calculate portion of current value to set as start value
-                new_period_interval = max(
-                    (
-                        current_timestamp
-                        - get_period_start_timestamp(
-                            summation_period, current_timestamp
-                        )
-                    ).total_seconds(),
-                    self.max_stub_interval,
-                )
-                sum_value = round(
-                    int(value * (new_period_interval / 3600)) / summation_factor, 2
-                )
-                _LOGGER.debug(
-                    "New summation period - Period interval(s): %i, Value: %f",
-                    new_period_interval,
-                    sum_value,
-                )
+    def __init__(
+        self,
+        unique_id: str,
+        name: str,
+        device_identifiers: set[tuple[str, str]],
+        config_entry: ConfigEntry,
+        port: int | None = None,
+        stage: str | None = None,
+        ecu_id: str | None = None,
+        counter_keys: tuple[str, ...] = (),
+    ) -> None:
+        """Initialise sensor."""
+        self.config_entry = config_entry
+        self.port = port
+        self.stage = stage
+        self.ecu_id = ecu_id
+        self.counter_keys = counter_keys
+        self._timings: StageTimings | None = None
+        self._servers = []
+
+        self._attr_device_info = DeviceInfo(identifiers=device_identifiers)
+        self._attr_name = name
+        self._attr_unique_id = unique_id
+        if stage:
+            self._attr_device_class = SensorDeviceClass.DURATION
+            self._attr_native_unit_of_measurement = UnitOfTime.MILLISECONDS
+            self._attr_state_class = SensorStateClass.MEASUREMENT
+            self._attr_suggested_display_precision = 2
         else:
-            sum_value = current_value
-            if (
-                summation_type == SummationType.MAX
-                and value >= current_value
-                or summation_type == SummationType.MIN
-                and value <= current_value
-            ):
-                sum_value = value
-                has_changed = True
-            elif summation_type == SummationType.SUM:
-                has_changed = True
-                sum_value = round(
-                    (current_value + int(value * (interval / 3600)) / summation_factor),
-                    2,
-                )
+            self._attr_state_class = SensorStateClass.TOTAL_INCREASING
 
-            _LOGGER.debug(
-                "Same summation period - Period interval(s): %s, Value: %f",
-                interval,
-                sum_value,
+    async def async_added_to_hass(self) -> None:
+        """Run when entity about to be added to hass."""
+        api_handler = self.hass.data[DOMAIN][self.config_entry.entry_id]["api_handler"]
+        self._servers = api_handler.socket_servers
+        if self.stage == STAGE_SENSOR_WRITE:
+            self._timings = api_handler.write_timings
+        elif self.stage:
+            self._timings = next(
+                (
+                    server.timings
+                    for server in self._servers
+                    if server.port == self.port
+                ),
+                None,
             )
+        if self._timings:
+            self._timings.enable()
+            self.async_on_remove(self._timings.disable)
 
-        return sum_value, has_changed
+    @property
+    def native_value(self) -> float | int | None:
+        """Return p50 latency or count."""
+        if self.stage:
+            if self._timings and (summary := self._timings.summary(self.stage)):
+                return summary["p50"]
+            return None
+        return sum(
+            counts[key]
+            for server in self._servers
+            if (counts := server.ecu_message_counts.get(self.ecu_id))
+            for key in self.counter_keys
+        )
+
+    @property
+    def extra_state_attributes(self) -> dict[str, Any] | None:
+        """Return p95, max and sample count of latency."""
+        if self._timings and (summary := self._timings.summary(self.stage)):
+            return {key: value for key, value in summary.items() if key != "p50"}
+        return None
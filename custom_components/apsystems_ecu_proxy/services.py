@@ -0,0 +1,106 @@
+"""Services of the proxy."""
+
+import asyncio
+import cProfile
+from datetime import datetime
+import io
+import logging
+import pstats
+import time
+
+import voluptuous as vol
+
+from homeassistant.core import HomeAssistant, ServiceCall
+from homeassistant.exceptions import HomeAssistantError
+import homeassistant.helpers.config_validation as cv
+
+from .const import DOMAIN
+
+_LOGGER = logging.getLogger(__name__)
+
+SERVICE_PROFILE = "profile"
+ATTR_SECONDS = "seconds"
+ATTR_FRAMES = "frames"
+
+PROFILE_SCHEMA = vol.Schema(
+    {
+        vol.Optional(ATTR_SECONDS, default=60): vol.All(
+            vol.Coerce(float), vol.Range(min=1, max=3600)
+        ),
+        vol.Optional(ATTR_FRAMES): cv.positive_int,
+    }
+)
+# Seconds between checks whether enough frames have been profiled.
+PROFILE_POLL_INTERVAL = 0.5
+# Functions listed in the text summary.
+PROFILE_SUMMARY_LINES = 60
+
+
+def _accepted_frames(hass: HomeAssistant) -> int:
+    """Return frames accepted by all ports."""
+    return sum(
+        server.message_counts["accepted"]
+        for entry in hass.data.get(DOMAIN, {}).values()
+        for server in entry["api_handler"].socket_servers
+    )
+
+
+def _write_profile(profiler: cProfile.Profile, path: str) -> None:
+    """Write profile in pstats format and a text summary next to it."""
+    profiler.dump_stats(path)
+    summary = io.StringIO()
+    stats = pstats.Stats(profiler, stream=summary)
+    stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(PROFILE_SUMMARY_LINES)
+    with open(f"{path}.txt", "w", encoding="utf-8") as file:
+        file.write(summary.getvalue())
+
+
+async def async_setup_services(hass: HomeAssistant) -> None:
+    """Register services."""
+    lock = asyncio.Lock()
+
+    async def async_profile(call: ServiceCall) -> None:
+        """Profile the event loop for a time or number of frames.
+
+        Everything run by the event loop is profiled, which includes receiving,
+        interpreting and relaying frames and updating the sensors.
+        """
+        if lock.locked():
+            raise HomeAssistantError("Profiling is already running")
+
+        async with lock:
+            seconds = call.data[ATTR_SECONDS]
+            frames = call.data.get(ATTR_FRAMES)
+            path = hass.config.path(
+                f"{DOMAIN}_profile_{datetime.now():%Y%m%d_%H%M%S}.prof"
+            )
+            _LOGGER.info(
+                "Profiling for %s seconds%s",
+                seconds,
+                f" or {frames} frames" if frames else "",
+            )
+
+            start_frames = _accepted_frames(hass)
+            end = time.monotonic() + seconds
+            profiler = cProfile.Profile()
+            profiler.enable()
+            try:
+                while time.monotonic() < end:
+                    if frames and _accepted_frames(hass) - start_frames >= frames:
+                        break
+                    await asyncio.sleep(PROFILE_POLL_INTERVAL)
+            finally:
+                profiler.disable()
+
+            profiled = _accepted_frames(hass) - start_frames
+            await hass.async_add_executor_job(_write_profile, profiler, path)
+            _LOGGER.info("Profile of %s frames written to %s", profiled, path)
+
+    hass.services.async_register(
+        DOMAIN, SERVICE_PROFILE, async_profile, schema=PROFILE_SCHEMA
+    )
+
+
+async def async_unload_services(hass: HomeAssistant) -> None:
+    """Remove services."""
+    hass.services.async_remove(DOMAIN, SERVICE_PROFILE)
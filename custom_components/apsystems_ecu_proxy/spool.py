@@ -0,0 +1,274 @@
+"""Store and forward of data frames that could not be relayed to EMA."""
+
+import asyncio
+from collections.abc import Awaitable, Callable
+import logging
+import os
+import struct
+import time
+
+from .ema import EMAUnavailableError
+
+_LOGGER = logging.getLogger(__name__)
+
+# Record header: time received (unix), frame length.
+RECORD_HEADER = struct.Struct("<dI")
+MAX_SPOOL_SIZE = 20 * 1024 * 1024
+# Frames older than this are not forwarded anymore.
+MAX_SPOOL_AGE = 3 * 24 * 3600
+# Frames forwarded per disk read.
+DRAIN_BATCH_SIZE = 20
+# Seconds between attempts to forward spooled frames.
+DRAIN_INTERVAL = 60
+
+
+class FrameSpool:
+    """Append-only file of frames waiting to be forwarded to EMA.
+
+    Frames are written in batches in the executor. A drain task forwards them in
+    order once EMA can be reached again, keeping the position of the next frame in
+    an offset file so that a restart does not resend forwarded frames.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        send: Callable[[bytes], Awaitable[bytes]],
+        max_size: int = MAX_SPOOL_SIZE,
+        max_age: float = MAX_SPOOL_AGE,
+    ) -> None:
+        """Initialise spool."""
+        self.path = path
+        self.offset_path = f"{path}.offset"
+        self.send = send
+        self.max_size = max_size
+        self.max_age = max_age
+
+        self.size = 0
+        self.offset = 0
+        self.forwarded = 0
+        self.evicted = 0
+
+        self._pending: list[tuple[float, bytes]] = []
+        # End of the frame being forwarded, compaction drops it as forwarded.
+        self._in_flight: int | None = None
+        # Changes whenever the spool file is rewritten or emptied.
+        self._generation = 0
+        self._lock = asyncio.Lock()
+        self._wake = asyncio.Event()
+        self._flush_task: asyncio.Task | None = None
+        self._drain_task: asyncio.Task | None = None
+
+    @property
+    def has_pending(self) -> bool:
+        """Return if frames are waiting to be forwarded."""
+        return self.offset < self.size or bool(self._pending)
+
+    async def start(self) -> None:
+        """Load spool state and start forwarding."""
+        async with self._lock:
+            self.size, self.offset = await self._run(self._load)
+        if self.has_pending:
+            _LOGGER.debug("Spool %s has %s bytes to forward", self.path, self.size)
+        self._drain_task = asyncio.create_task(self._drain_worker())
+
+    async def stop(self) -> None:
+        """Stop forwarding and write out pending frames."""
+        if self._drain_task:
+            self._drain_task.cancel()
+            self._drain_task = None
+        if self._flush_task:
+            await self._flush_task
+
+    def append(self, frame: bytes, received: float | None = None) -> None:
+        """Queue frame to be written to the spool."""
+        self._pending.append((time.time() if received is None else received, frame))
+        if self._flush_task is None:
+            self._flush_task = asyncio.create_task(self._flush())
+
+    def wake(self) -> None:
+        """Try forwarding now, for example when EMA is reachable again."""
+        self._wake.set()
+
+    async def _run(self, func, *args):
+        """Run blocking file operation in the executor."""
+        return await asyncio.get_running_loop().run_in_executor(None, func, *args)
+
+    async def _flush(self) -> None:
+        """Write queued frames to disk."""
+        try:
+            while self._pending:
+                pending, self._pending = self._pending, []
+                async with self._lock:
+                    self.size = await self._run(self._write, pending)
+                    if self.size > self.max_size:
+                        await self._compact()
+        except OSError as ex:
+            _LOGGER.warning("Unable to write spool %s - %s", self.path, ex)
+        finally:
+            self._flush_task = None
+
+    async def _compact(self) -> None:
+        """Drop forwarded, expired and, if still too large, oldest frames."""
+        start = self.offset if self._in_flight is None else self._in_flight
+        self.size, evicted = await self._run(self._rewrite, start)
+        self.offset = 0
+        self._generation += 1
+        self.evicted += evicted
+        if evicted:
+            _LOGGER.warning(
+                "Spool %s full, discarded %s frames not forwarded to EMA",
+                self.path,
+                evicted,
+            )
+
+    async def _drain_worker(self) -> None:
+        """Periodically forward spooled frames."""
+        while True:
+            try:
+                async with asyncio.timeout(DRAIN_INTERVAL):
+                    await self._wake.wait()
+            except TimeoutError:
+                pass
+            self._wake.clear()
+            if self.offset < self.size:
+                await self._drain()
+
+    async def _drain(self) -> None:
+        """Forward spooled frames until done or EMA fails."""
+        expire = time.time() - self.max_age
+        generation = self._generation
+        while self.offset < self.size:
+            try:
+                async with self._lock:
+                    records = await self._run(self._read, self.offset, DRAIN_BATCH_SIZE)
+            except OSError as ex:
+                _LOGGER.warning("Unable to read spool %s - %s", self.path, ex)
+                return
+            if not records:
+                break
+            done = self.offset
+            try:
+                for offset, received, frame in records:
+                    if received >= expire:
+                        self._in_flight = offset
+                        try:
+                            await self.send(frame)
+                        except BaseException:
+                            if generation != self._generation:
+                                # Compacted away meanwhile, spool it again.
+                                self.append(frame, received)
+                            raise
+                        finally:
+                            self._in_flight = None
+                        self.forwarded += 1
+                    else:
+                        self.evicted += 1
+                    if generation != self._generation:
+                        break
+                    # Compaction starts after the frames done.
+                    done = self.offset = offset
+            except (OSError, EMAUnavailableError, asyncio.IncompleteReadError) as ex:
+                _LOGGER.debug("Stopped forwarding spooled frames - %s", ex)
+                return
+            finally:
+                # Offsets no longer apply if the spool was compacted meanwhile.
+                if generation == self._generation:
+                    await self._save_offset(done)
+            if generation != self._generation:
+                return
+
+        async with self._lock:
+            if self.offset >= self.size:
+                self.size = self.offset = await self._run(self._truncate)
+                self._generation += 1
+        _LOGGER.debug("Spool %s forwarded", self.path)
+
+    async def _save_offset(self, offset: int) -> None:
+        """Store position of the next frame to forward."""
+        async with self._lock:
+            self.offset = offset
+            await self._run(self._write_offset, offset)
+
+    # Executor functions.
+
+    def _load(self) -> tuple[int, int]:
+        """Return spool size and stored offset."""
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        try:
+            size = os.path.getsize(self.path)
+        except FileNotFoundError:
+            return 0, 0
+        try:
+            with open(self.offset_path, encoding="ascii") as file:
+                offset = int(file.read() or 0)
+        except (FileNotFoundError, ValueError):
+            offset = 0
+        return size, min(offset, size)
+
+    def _write(self, records: list[tuple[float, bytes]]) -> int:
+        """Append records and return spool size."""
+        with open(self.path, "ab") as file:
+            for received, frame in records:
+                file.write(RECORD_HEADER.pack(received, len(frame)))
+                file.write(frame)
+            return file.tell()
+
+    def _read(self, offset: int, count: int) -> list[tuple[int, float, bytes]]:
+        """Return up to count records from offset with the offset following each."""
+        records = []
+        with open(self.path, "rb") as file:
+            file.seek(offset)
+            while len(records) < count:
+                if len(header := file.read(RECORD_HEADER.size)) < RECORD_HEADER.size:
+                    break
+                received, length = RECORD_HEADER.unpack(header)
+                if len(frame := file.read(length)) < length:
+                    break
+                records.append((file.tell(), received, frame))
+        return records
+
+    def _rewrite(self, offset: int) -> tuple[int, int]:
+        """Rewrite spool without forwarded frames and within limits.
+
+        Returns new size and number of frames discarded.
+        """
+        records = []
+        with open(self.path, "rb") as file:
+            file.seek(offset)
+            while len(header := file.read(RECORD_HEADER.size)) == RECORD_HEADER.size:
+                received, length = RECORD_HEADER.unpack(header)
+                records.append((received, file.read(length)))
+
+        expire = time.time() - self.max_age
+        kept = [record for record in records if record[0] >= expire]
+        # Keep the newest frames within 3/4 of the limit to not compact every write.
+        budget = self.max_size * 3 // 4
+        size = 0
+        for idx in range(len(kept) - 1, -1, -1):
+            size += RECORD_HEADER.size + len(kept[idx][1])
+            if size > budget:
+                kept = kept[idx + 1 :]
+                break
+
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "wb") as file:
+            for received, frame in kept:
+                file.write(RECORD_HEADER.pack(received, len(frame)))
+                file.write(frame)
+            size = file.tell()
+        os.replace(tmp_path, self.path)
+        self._write_offset(0)
+        return size, len(records) - len(kept)
+
+    def _truncate(self) -> int:
+        """Empty spool once everything is forwarded."""
+        with open(self.path, "wb"):
+            pass
+        self._write_offset(0)
+        return 0
+
+    def _write_offset(self, offset: int) -> None:
+        """Write offset file."""
+        with open(self.offset_path, "w", encoding="ascii") as file:
+            file.write(str(offset))
@@ -0,0 +1,63 @@
+"""Latency statistics of the proxy stages."""
+
+from collections import deque
+from collections.abc import Iterable
+import time
+
+# Stages of a message through a port.
+STAGE_RECEIVE = "receive"
+STAGE_EMA = "ema"
+STAGE_ECU_REPLY = "ecu_reply"
+STAGE_PARSE = "parse"
+STAGE_FAN_OUT = "fan_out"
+PORT_STAGES = (STAGE_RECEIVE, STAGE_EMA, STAGE_ECU_REPLY, STAGE_PARSE, STAGE_FAN_OUT)
+# Writes of sensor states, over all ports.
+STAGE_SENSOR_WRITE = "sensor_write"
+
+# Latest samples per stage the statistics are taken over.
+ROLLING_WINDOW = 500
+
+
+class StageTimings:
+    """Rolling latency samples per stage.
+
+    Timing is only done while enabled, by the statistics sensors being in use.
+    Callers take the start time as `timings.enabled and time.perf_counter()` and
+    only record if it is set, so disabled timing costs an attribute lookup.
+    """
+
+    def __init__(self, stages: Iterable[str], window: int = ROLLING_WINDOW) -> None:
+        """Initialise timings."""
+        self.samples = {stage: deque(maxlen=window) for stage in stages}
+        self.enabled = False
+        self._users = 0
+
+    def enable(self) -> None:
+        """Start timing for a user of the statistics."""
+        self._users += 1
+        self.enabled = True
+
+    def disable(self) -> None:
+        """Stop timing once no user is left, dropping samples."""
+        self._users -= 1
+        if self._users <= 0:
+            self._users = 0
+            self.enabled = False
+            for samples in self.samples.values():
+                samples.clear()
+
+    def record(self, stage: str, start: float) -> None:
+        """Record time passed since start for stage."""
+        self.samples[stage].append(time.perf_counter() - start)
+
+    def summary(self, stage: str) -> dict[str, float] | None:
+        """Return p50, p95 and max in milliseconds and sample count, if any."""
+        if not (samples := self.samples[stage]):
+            return None
+        ordered = sorted(samples)
+        return {
+            "p50": round(ordered[len(ordered) // 2] * 1000, 3),
+            "p95": round(ordered[int(len(ordered) * 0.95)] * 1000, 3),
+            "max": round(ordered[-1] * 1000, 3),
+            "samples": len(ordered),
+        }
@@ -0,0 +1,106 @@
+"""Watchdog for devices that stopped reporting."""
+
+from collections.abc import Callable
+import heapq
+import logging
+import time
+
+from homeassistant.core import CALLBACK_TYPE, HomeAssistant, callback
+from homeassistant.helpers.event import async_call_later
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class StaleDeviceWatchdog:
+    """Call an action for each device not seen for a timeout.
+
+    Devices are keyed by identifier, ecu_<id> or inverter_<uid>. Seeing a device
+    only moves its deadline in a dict. A heap holds one entry per watched device
+    and a single timer is armed for the earliest entry. When it fires, an entry
+    whose deadline has moved is pushed back with the new deadline, and devices
+    past their deadline are reported stale and no longer watched until seen again.
+    """
+
+    def __init__(
+        self, hass: HomeAssistant, timeout: float, action: Callable[[str], None]
+    ) -> None:
+        """Initialise watchdog."""
+        self.hass = hass
+        self.timeout = timeout
+        self.action = action
+        # Monotonic deadline per watched device.
+        self.deadlines: dict[str, float] = {}
+        self._heap: list[tuple[float, str]] = []
+        self._unsub_timer: CALLBACK_TYPE | None = None
+        self._timer_at: float | None = None
+
+    @callback
+    def seen(self, device_key: str, now: float) -> None:
+        """Move deadline of device, watching it if not yet watched."""
+        deadline = now + self.timeout
+        if device_key in self.deadlines:
+            self.deadlines[device_key] = deadline
+            return
+        self.deadlines[device_key] = deadline
+        heapq.heappush(self._heap, (deadline, device_key))
+        if self._timer_at is None or deadline < self._timer_at:
+            self._arm(now)
+
+    @callback
+    def set_timeout(self, timeout: float, now: float) -> None:
+        """Change timeout, moving the deadlines of watched devices."""
+        change = timeout - self.timeout
+        self.timeout = timeout
+        if not change:
+            return
+        deadlines = self.deadlines
+        for device_key in deadlines:
+            deadlines[device_key] += change
+        self._heap = [
+            (deadline, device_key) for device_key, deadline in deadlines.items()
+        ]
+        heapq.heapify(self._heap)
+        self._arm(now)
+
+    @callback
+    def async_stop(self) -> None:
+        """Cancel the timer."""
+        if self._unsub_timer is not None:
+            self._unsub_timer()
+            self._unsub_timer = None
+        self._timer_at = None
+
+    @callback
+    def _arm(self, now: float) -> None:
+        """Arm the timer for the earliest entry."""
+        self.async_stop()
+        if self._heap:
+            self._timer_at = self._heap[0][0]
+            self._unsub_timer = async_call_later(
+                self.hass, max(self._timer_at - now, 0), self._fire
+            )
+
+    @callback
+    def _fire(self, _now) -> None:
+        """Report devices past their deadline when the timer fires."""
+        self._unsub_timer = None
+        self._timer_at = None
+        self.expire(time.monotonic())
+
+    @callback
+    def expire(self, now: float) -> None:
+        """Report devices past their deadline at monotonic time now."""
+        heap = self._heap
+        deadlines = self.deadlines
+        try:
+            while heap and heap[0][0] <= now:
+                _, device_key = heapq.heappop(heap)
+                deadline = deadlines[device_key]
+                if deadline > now:
+                    heapq.heappush(heap, (deadline, device_key))
+                    continue
+                del deadlines[device_key]
+                _LOGGER.debug("No update from %s", device_key)
+                self.action(device_key)
+        finally:
+            self._arm(now)
@@ -0,0 +1,135 @@
+"""Tests of the socket API of a port."""
+
+import asyncio
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+from custom_components.apsystems_ecu_proxy.api import RELAY_QUEUE_SIZE, MySocketAPI
+from tools.frames import build_frame
+
+CONFIG = {
+    "ema_host": "127.0.0.2",
+    "message_ignore_age": "1800",
+    "max_stub_interval": "300",
+    "no_update_timeout": "600",
+    "send_to_ema": True,
+}
+
+
+class FakeWriter:
+    """ECU side of a connection, collecting what is written to it."""
+
+    def __init__(self) -> None:
+        """Initialise writer."""
+        self.written: list[bytes] = []
+
+    def get_extra_info(self, name: str):
+        """Return peer address."""
+        return ("192.168.1.10", 50000) if name == "peername" else None
+
+    def write(self, data: bytes) -> None:
+        """Collect data."""
+        self.written.append(data)
+
+    async def drain(self) -> None:
+        """Do nothing."""
+
+    def close(self) -> None:
+        """Do nothing."""
+
+    async def wait_closed(self) -> None:
+        """Do nothing."""
+
+
+def make_api() -> MySocketAPI:
+    """Return API of a port, without listening."""
+    return MySocketAPI(
+        "127.0.0.1", 8995, lambda frame: None, SimpleNamespace(data=CONFIG)
+    )
+
+
+def data_frames(count: int) -> list[bytes]:
+    """Return data frames of consecutive readings."""
+    now = datetime.now().replace(microsecond=0)
+    return [
+        build_frame(inverters=2, timestamp=now - timedelta(minutes=idx))
+        for idx in range(count)
+    ]
+
+
+def reader_of(data: bytes) -> asyncio.StreamReader:
+    """Return stream that has received data and closed."""
+    reader = asyncio.StreamReader()
+    reader.feed_data(data)
+    reader.feed_eof()
+    return reader
+
+
+def test_parsing_does_not_wait_on_ema() -> None:
+    """Test frames are queued for parsing while EMA does not respond."""
+    frames = data_frames(RELAY_QUEUE_SIZE + 4)
+
+    async def run() -> tuple[int, MySocketAPI]:
+        api = make_api()
+        ema_responds = asyncio.Event()
+
+        async def send_data_to_ema(data: bytes) -> bytes:
+            await ema_responds.wait()
+            return b"APS1100160001END\n"
+
+        api.send_data_to_ema = send_data_to_ema
+        task = asyncio.create_task(
+            api.data_received(reader_of(b"".join(frames)), FakeWriter())
+        )
+        for _ in range(10):
+            await asyncio.sleep(0)
+        queued = api.parse_queue.qsize()
+        ema_responds.set()
+        await task
+        return queued, api
+
+    queued, api = asyncio.run(run())
+    assert queued == len(frames)
+    assert api.message_counts["relay_overflow"] >= 3
+
+
+def test_error_in_message_keeps_next_messages() -> None:
+    """Test an error handling one message does not drop the others of a read."""
+    frames = data_frames(3)
+
+    async def run() -> MySocketAPI:
+        api = make_api()
+        api.send_to_ema = False
+        filter_message = api.filter_message
+
+        def failing_filter(data: bytes, addr: tuple, message: str) -> bool:
+            if data == frames[1]:
+                raise ValueError("bad message")
+            return filter_message(data, addr, message)
+
+        api.filter_message = failing_filter
+        await api.data_received(reader_of(b"".join(frames)), FakeWriter())
+        return api
+
+    api = asyncio.run(run())
+    assert [api.parse_queue.get_nowait() for _ in range(2)] == [frames[0], frames[2]]
+    assert api.message_counts["exception"] == 1
+
+
+def test_message_counts_by_ecu() -> None:
+    """Test frames are counted for the ECU that sent them."""
+    api = make_api()
+    addr = ("192.168.1.10", 50000)
+    frame = data_frames(1)[0]
+    other = build_frame(ecu_id="216300054321", inverters=1)
+
+    assert api.filter_message(frame, addr, "")
+    assert not api.filter_message(frame[:-10], addr, "")
+    assert api.filter_message(other, addr, "")
+    assert not api.filter_message(b"APS1100160001END\n", addr, "")
+
+    assert api.ecu_message_counts == {
+        "216300012345": {"accepted": 1, "checksum_error": 1},
+        "216300054321": {"accepted": 1},
+    }
+    assert api.message_counts == {"accepted": 2, "checksum_error": 1, "ignored": 1}
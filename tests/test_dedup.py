@@ -0,0 +1,44 @@
+"""Tests of duplicate frame detection."""
+
+from custom_components.apsystems_ecu_proxy.dedup import FrameDedup
+
+
+def frame(ecu_id: int, timestamp: int) -> bytes:
+    """Return frame with ECU id and timestamp at their positions."""
+    return b"APS18AA" + b"0" * 11 + b"%012d" % ecu_id + b"0" * 30 + b"%014d" % timestamp
+
+
+def test_duplicate_frames() -> None:
+    """Test frames are duplicates by ECU id and timestamp."""
+    cache = FrameDedup()
+    assert not cache.is_duplicate(frame(1, 20240601120000), 0)
+    assert cache.is_duplicate(frame(1, 20240601120000), 0)
+    assert not cache.is_duplicate(frame(2, 20240601120000), 0)
+    assert not cache.is_duplicate(frame(1, 20240601120500), 0)
+    assert cache.duplicates == 1
+    assert len(cache) == 3
+
+
+def test_evicts_least_recently_seen() -> None:
+    """Test the least recently seen frame is dropped over size."""
+    cache = FrameDedup(size=2)
+    cache.is_duplicate(frame(1, 1), 0)
+    cache.is_duplicate(frame(1, 2), 0)
+    # Seen again, so the frame with timestamp 2 is now the oldest.
+    assert cache.is_duplicate(frame(1, 1), 0)
+    cache.is_duplicate(frame(1, 3), 0)
+
+    assert len(cache) == 2
+    assert cache.is_duplicate(frame(1, 1), 0)
+    assert not cache.is_duplicate(frame(1, 2), 0)
+
+
+def test_evicts_over_max_age() -> None:
+    """Test frames are forgotten after max age."""
+    cache = FrameDedup(max_age=60)
+    cache.is_duplicate(frame(1, 1), 0)
+    cache.is_duplicate(frame(1, 2), 30)
+    cache.is_duplicate(frame(1, 3), 61)
+
+    assert len(cache) == 2
+    assert not cache.is_duplicate(frame(1, 1), 61)
@@ -0,0 +1,167 @@
+"""Tests of relaying to EMA."""
+
+import asyncio
+from pathlib import Path
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from custom_components.apsystems_ecu_proxy.api import MySocketAPI
+from custom_components.apsystems_ecu_proxy.ema import (
+    CircuitBreaker,
+    EMAConnectionPool,
+    EMAUnavailableError,
+)
+from tools.frames import build_frame
+
+ACK = b"APS1100160001END\n"
+CONFIG = {
+    "ema_host": "127.0.0.2",
+    "message_ignore_age": "1800",
+    "max_stub_interval": "300",
+    "no_update_timeout": "600",
+    "send_to_ema": True,
+}
+
+
+def test_breaker_opens_after_failures() -> None:
+    """Test the breaker fails fast after the failure threshold."""
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=60)
+    for _ in range(2):
+        breaker.record_failure()
+    assert not breaker.is_open
+    assert breaker.allow_request()
+
+    breaker.record_failure()
+    assert breaker.is_open
+    assert not breaker.allow_request()
+
+
+def test_breaker_lets_one_trial_through() -> None:
+    """Test one trial request per reset timeout, closing the breaker on success."""
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=60)
+    breaker.record_failure()
+    breaker.opened_at = time.monotonic() - 60
+
+    assert breaker.allow_request()
+    # Others keep failing fast while the trial runs.
+    assert not breaker.allow_request()
+
+    breaker.record_success()
+    assert not breaker.is_open
+    assert breaker.failures == 0
+    assert breaker.allow_request()
+
+
+def test_breaker_reopens_on_failed_trial() -> None:
+    """Test a failed trial keeps the breaker open for another reset timeout."""
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=60)
+    breaker.record_failure()
+    breaker.opened_at = time.monotonic() - 60
+
+    assert breaker.allow_request()
+    breaker.record_failure()
+    assert breaker.is_open
+    assert not breaker.allow_request()
+
+
+async def start_ema(close_after: int) -> tuple[asyncio.Server, int]:
+    """Start EMA closing each connection after acknowledging a number of messages.
+
+    The message after them is read and left unanswered.
+    """
+
+    async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        for _ in range(close_after):
+            await reader.readuntil(b"END\n")
+            writer.write(ACK)
+            await writer.drain()
+        await reader.readuntil(b"END\n")
+        writer.close()
+
+    server = await asyncio.start_server(handle, "127.0.0.1", 0)
+    return server, server.sockets[0].getsockname()[1]
+
+
+def test_pool_reuses_connection() -> None:
+    """Test requests share a pooled connection."""
+
+    async def run() -> EMAConnectionPool:
+        server, port = await start_ema(close_after=2)
+        pool = EMAConnectionPool("127.0.0.1", port, 5, 5)
+        assert await pool.send(build_frame()) == ACK
+        assert await pool.send(build_frame()) == ACK
+        await pool.close()
+        server.close()
+        return pool
+
+    pool = asyncio.run(run())
+    assert pool.connections_opened == 1
+
+
+def test_pool_retries_closed_connection() -> None:
+    """Test a pooled connection closed by EMA is retried on a new one."""
+
+    async def run() -> EMAConnectionPool:
+        server, port = await start_ema(close_after=1)
+        pool = EMAConnectionPool("127.0.0.1", port, 5, 5)
+        assert await pool.send(build_frame()) == ACK
+        assert await pool.send(build_frame()) == ACK
+        await pool.close()
+        server.close()
+        return pool
+
+    pool = asyncio.run(run())
+    assert pool.connections_opened == 2
+    assert pool.breaker.failures == 0
+
+
+def test_pool_fails_fast_when_ema_is_down() -> None:
+    """Test requests fail fast once the breaker has opened."""
+
+    async def run() -> None:
+        server, port = await start_ema(close_after=1)
+        server.close()
+        await server.wait_closed()
+        pool = EMAConnectionPool("127.0.0.1", port, 5, 5)
+        for _ in range(pool.breaker.failure_threshold):
+            with pytest.raises(OSError):
+                await pool.send(build_frame())
+        with pytest.raises(EMAUnavailableError):
+            await pool.send(build_frame())
+
+    asyncio.run(run())
+
+
+def test_send_replays_ack_and_spools_frame(tmp_path: Path) -> None:
+    """Test a frame not relayed is spooled and answered with the cached ack."""
+    frames = [build_frame(), build_frame(ecu_id="216300054321")]
+    sent = []
+
+    async def ema_send(data: bytes) -> bytes:
+        if sent:
+            raise ConnectionRefusedError("EMA down")
+        sent.append(data)
+        return ACK
+
+    async def run() -> tuple[list[bytes], int]:
+        api = MySocketAPI(
+            "127.0.0.1",
+            8995,
+            lambda frame: None,
+            SimpleNamespace(data=CONFIG),
+            spool_path=str(tmp_path / "8995.spool"),
+        )
+        api.ema_pool.send = ema_send
+        responses = [await api.send_data_to_ema(frame) for frame in frames]
+        # No response to replay for other message types.
+        with pytest.raises(ConnectionRefusedError):
+            await api.send_data_to_ema(b"APS1400290002216300012345END\n")
+        await api.spool.stop()
+        return responses, api.spool.size
+
+    responses, spool_size = asyncio.run(run())
+    assert responses == [ACK, ACK]
+    assert sent == frames[:1]
+    assert spool_size > len(frames[1])
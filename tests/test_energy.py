@@ -0,0 +1,232 @@
+"""Tests of the energy integrators."""
+
+from datetime import datetime, timedelta
+
+import pytest
+
+from custom_components.apsystems_ecu_proxy.const import SummationPeriod, SummationType
+from custom_components.apsystems_ecu_proxy.energy import (
+    EnergyIntegrator,
+    InverterEnergyIntegrator,
+)
+
+FRAME_INTERVAL = timedelta(minutes=5)
+MAX_STUB_INTERVAL = 600
+
+
+def frame_times(start: datetime, end: datetime):
+    """Return times of the frames from start to before end."""
+    timestamp = start
+    while timestamp < end:
+        yield timestamp
+        timestamp += FRAME_INTERVAL
+
+
+def run(integrator, integrate, start: datetime, end: datetime) -> None:
+    """Integrate frames, starting periods at every hour as the scheduler does."""
+    next_hour = start.replace(minute=0, second=0) + timedelta(hours=1)
+    for timestamp in frame_times(start, end):
+        while next_hour <= timestamp:
+            integrator.advance(next_hour)
+            next_hour += timedelta(hours=1)
+        integrate(timestamp)
+
+
+def test_energy_across_hour_boundaries() -> None:
+    """Test starting hours keeps the energy of the continuing periods."""
+    integrator = EnergyIntegrator(MAX_STUB_INTERVAL)
+    hourly = integrator.track(SummationPeriod.HOURLY, SummationType.SUM)
+    daily = integrator.track(SummationPeriod.DAILY, SummationType.SUM)
+    lifetime = integrator.track(SummationPeriod.LIFETIME, SummationType.SUM)
+
+    run(
+        integrator,
+        lambda timestamp: integrator.integrate(1000, timestamp),
+        datetime(2024, 6, 3, 9, 2, 30),
+        datetime(2024, 6, 3, 15, 2, 30),
+    )
+
+    # 72 frames, the first one starts the integration.
+    assert daily.value == pytest.approx(71 * 1000 / 12)
+    assert lifetime.value == pytest.approx(71 * 1000 / 12)
+    # 14:02:30 to 14:57:30 and the 150 seconds since 14:00.
+    assert hourly.value == pytest.approx(11 * 1000 / 12 + 1000 * 150 / 3600)
+
+
+def test_energy_across_midnight() -> None:
+    """Test a new day only gets the energy since midnight."""
+    integrator = EnergyIntegrator(MAX_STUB_INTERVAL)
+    daily = integrator.track(SummationPeriod.DAILY, SummationType.SUM)
+    lifetime = integrator.track(SummationPeriod.LIFETIME, SummationType.SUM)
+    minimum = integrator.track(SummationPeriod.DAILY, SummationType.MIN)
+
+    integrator.integrate(1000, datetime(2024, 6, 3, 23, 57, 30))
+    integrator.advance(datetime(2024, 6, 4))
+    assert daily.value == 0
+    integrator.integrate(1000, datetime(2024, 6, 4, 0, 2, 30))
+
+    assert daily.value == pytest.approx(1000 * 150 / 3600)
+    assert lifetime.value == pytest.approx(1000 * 300 / 3600)
+    assert minimum.value == 1000
+
+
+def test_energy_of_frame_before_period_start() -> None:
+    """Test a frame of an ended period arriving late only adds to later periods."""
+    integrator = EnergyIntegrator(MAX_STUB_INTERVAL)
+    daily = integrator.track(SummationPeriod.DAILY, SummationType.SUM)
+    lifetime = integrator.track(SummationPeriod.LIFETIME, SummationType.SUM)
+
+    integrator.integrate(1000, datetime(2024, 6, 3, 23, 55))
+    integrator.advance(datetime(2024, 6, 4))
+
+    assert integrator.integrate(1000, datetime(2024, 6, 3, 23, 59))
+    assert daily.value == 0
+    assert daily.period_key == (2024, 6, 4)
+    assert lifetime.value == pytest.approx(1000 * 240 / 3600)
+
+    integrator.integrate(1000, datetime(2024, 6, 4, 0, 4))
+    assert daily.value == pytest.approx(1000 * 240 / 3600)
+    assert lifetime.value == pytest.approx(1000 * 540 / 3600)
+
+
+def test_energy_skips_older_frames() -> None:
+    """Test frames older than the last one are not added."""
+    integrator = EnergyIntegrator(MAX_STUB_INTERVAL)
+    lifetime = integrator.track(SummationPeriod.LIFETIME, SummationType.SUM)
+
+    assert integrator.integrate(1000, datetime(2024, 6, 3, 12))
+    assert not integrator.integrate(1000, datetime(2024, 6, 3, 11, 55))
+    assert lifetime.value == 0
+
+
+def test_energy_continues_restored_value() -> None:
+    """Test integration continues from a restored sensor."""
+    integrator = EnergyIntegrator(MAX_STUB_INTERVAL)
+    lifetime = integrator.track(SummationPeriod.LIFETIME, SummationType.SUM)
+    integrator.restore(lifetime, 5000, datetime(2024, 6, 3, 12))
+
+    integrator.integrate(1200, datetime(2024, 6, 3, 12, 5))
+
+    assert lifetime.value == pytest.approx(5100)
+
+
+def test_inverter_energy_across_hour_and_midnight() -> None:
+    """Test inverter energy keeps the energy before period starts."""
+    integrator = InverterEnergyIntegrator(MAX_STUB_INTERVAL)
+    daily = integrator.track("801000000001", None, SummationPeriod.DAILY)
+    channel = integrator.track("801000000001", 1, SummationPeriod.DAILY)
+    lifetime = integrator.track("801000000001", None, SummationPeriod.LIFETIME)
+    inverters = {"801000000001": {"power": [600, 400]}}
+
+    run(
+        integrator,
+        lambda timestamp: integrator.integrate("216000000001", inverters, timestamp),
+        datetime(2024, 6, 3, 21, 2, 30),
+        datetime(2024, 6, 4, 1, 2, 30),
+    )
+
+    # 48 frames, the last 12 on the new day, the first of them 150 seconds after
+    # midnight.
+    assert lifetime.value == pytest.approx(47 * 1000 / 12)
+    assert daily.value == pytest.approx(11 * 1000 / 12 + 1000 * 150 / 3600)
+    assert channel.value == pytest.approx(0.4 * daily.value)
+
+
+def test_inverter_energy_of_frame_before_midnight() -> None:
+    """Test a frame of the day before arriving late only adds lifetime energy."""
+    integrator = InverterEnergyIntegrator(MAX_STUB_INTERVAL)
+    daily = integrator.track("801000000001", None, SummationPeriod.DAILY)
+    lifetime = integrator.track("801000000001", None, SummationPeriod.LIFETIME)
+    inverters = {"801000000001": {"power": [1000]}}
+
+    integrator.integrate("216000000001", inverters, datetime(2024, 6, 3, 23, 55))
+    integrator.advance(datetime(2024, 6, 4))
+    integrator.integrate("216000000001", inverters, datetime(2024, 6, 3, 23, 59))
+
+    assert daily.value == 0
+    assert lifetime.value == pytest.approx(1000 * 240 / 3600)
+
+    integrator.integrate("216000000001", inverters, datetime(2024, 6, 4, 0, 4))
+    assert daily.value == pytest.approx(1000 * 240 / 3600)
+    assert lifetime.value == pytest.approx(1000 * 540 / 3600)
+
+
+def test_energy_max_and_min() -> None:
+    """Test max and min accumulators start again with a new period."""
+    integrator = EnergyIntegrator(MAX_STUB_INTERVAL)
+    maximum = integrator.track(SummationPeriod.HOURLY, SummationType.MAX)
+    minimum = integrator.track(SummationPeriod.HOURLY, SummationType.MIN)
+
+    for minute, power in ((0, 300), (5, 800), (10, 200), (15, 500)):
+        integrator.integrate(power, datetime(2024, 6, 3, 12, minute))
+    assert (maximum.value, minimum.value) == (800, 200)
+
+    integrator.integrate(400, datetime(2024, 6, 3, 13, 0))
+    assert (maximum.value, minimum.value) == (400, 400)
+
+
+def test_energy_new_period_limited_to_max_stub_interval() -> None:
+    """Test a new period gets at most the max stub interval of a long gap."""
+    integrator = EnergyIntegrator(MAX_STUB_INTERVAL)
+    daily = integrator.track(SummationPeriod.DAILY, SummationType.SUM)
+    lifetime = integrator.track(SummationPeriod.LIFETIME, SummationType.SUM)
+
+    integrator.integrate(1000, datetime(2024, 6, 3, 20))
+    integrator.integrate(1000, datetime(2024, 6, 4, 7))
+
+    assert daily.value == pytest.approx(1000 * MAX_STUB_INTERVAL / 3600)
+    assert lifetime.value == pytest.approx(1000 * 11)
+
+
+def test_energy_restore_after_first_frame() -> None:
+    """Test a sensor restored after the first frame continues its energy."""
+    integrator = EnergyIntegrator(MAX_STUB_INTERVAL)
+    daily = integrator.track(SummationPeriod.DAILY, SummationType.SUM)
+    lifetime = integrator.track(SummationPeriod.LIFETIME, SummationType.SUM)
+    hourly = integrator.track(SummationPeriod.HOURLY, SummationType.SUM)
+
+    integrator.integrate(1200, datetime(2024, 6, 3, 12))
+    integrator.integrate(1200, datetime(2024, 6, 3, 12, 5))
+    integrator.restore(lifetime, 5000, datetime(2024, 6, 3, 11, 55))
+    integrator.restore(daily, 800, datetime(2024, 6, 3, 11, 55))
+    # Of an hour that is over.
+    integrator.restore(hourly, 300, datetime(2024, 6, 3, 11, 55))
+
+    assert lifetime.value == pytest.approx(5100)
+    assert daily.value == pytest.approx(900)
+    assert hourly.value == pytest.approx(100)
+
+
+def test_inverter_energy_restore_after_first_frame() -> None:
+    """Test inverter sensors restored after the first frame continue their energy."""
+    integrator = InverterEnergyIntegrator(MAX_STUB_INTERVAL)
+    daily = integrator.track("801000000001", None, SummationPeriod.DAILY)
+    channel = integrator.track("801000000001", 0, SummationPeriod.LIFETIME)
+    lifetime = integrator.track("801000000001", None, SummationPeriod.LIFETIME)
+    inverters = {"801000000001": {"power": [600, 600]}}
+
+    integrator.integrate("216000000001", inverters, datetime(2024, 6, 3, 12))
+    integrator.integrate("216000000001", inverters, datetime(2024, 6, 3, 12, 5))
+    integrator.restore(lifetime, 5000, datetime(2024, 6, 3, 11, 55))
+    integrator.restore(channel, 2500, datetime(2024, 6, 3, 11, 55))
+    integrator.restore(daily, 800, datetime(2024, 6, 3, 11, 55))
+    # Restored again, for example by a sensor added later.
+    integrator.restore(lifetime, 5000, datetime(2024, 6, 3, 11, 55))
+
+    assert lifetime.value == pytest.approx(5100)
+    assert channel.value == pytest.approx(2550)
+    assert daily.value == pytest.approx(900)
+    assert lifetime.timestamp == datetime(2024, 6, 3, 12, 5)
+
+
+def test_inverter_energy_restore_of_earlier_day() -> None:
+    """Test daily energy restored from an earlier day than the frames is dropped."""
+    integrator = InverterEnergyIntegrator(MAX_STUB_INTERVAL)
+    daily = integrator.track("801000000001", None, SummationPeriod.DAILY)
+    inverters = {"801000000001": {"power": [600]}}
+
+    integrator.integrate("216000000001", inverters, datetime(2024, 6, 4, 7))
+    integrator.integrate("216000000001", inverters, datetime(2024, 6, 4, 7, 5))
+    integrator.restore(daily, 3000, datetime(2024, 6, 3, 20))
+
+    assert daily.value == pytest.approx(50)
@@ -0,0 +1,85 @@
+"""Tests of frame reassembly."""
+
+import asyncio
+
+from custom_components.apsystems_ecu_proxy.framing import FrameBuffer, read_frames
+
+
+def data_frame(body_size: int) -> bytes:
+    """Return data frame with body of digits, stating its length if it fits."""
+    length = 7 + 3 + body_size + 3
+    header = b"APS18AA" + (b"%03d" % length if length < 1000 else b"999")
+    return header + b"0" * body_size + b"END\n"
+
+
+def test_feed_whole_frame() -> None:
+    """Test a frame received in one read."""
+    frame = data_frame(100)
+    buffer = FrameBuffer()
+    assert buffer.feed(frame) == [frame]
+    assert len(buffer) == 0
+
+
+def test_feed_frame_split_over_reads() -> None:
+    """Test a frame split anywhere, also within header and trailer."""
+    frame = data_frame(100)
+    for split in (3, 8, 50, len(frame) - 2):
+        buffer = FrameBuffer()
+        assert buffer.feed(frame[:split]) == []
+        assert buffer.feed(frame[split:]) == [frame]
+
+
+def test_feed_frame_over_stated_length() -> None:
+    """Test frames over 999 bytes end at the trailer, over many reads."""
+    frame = data_frame(3000)
+    buffer = FrameBuffer()
+    reads = [frame[pos : pos + 512] for pos in range(0, len(frame), 512)]
+    frames = []
+    for data in reads:
+        frames += buffer.feed(data)
+    assert frames == [frame]
+
+
+def test_feed_frames_in_one_read() -> None:
+    """Test several frames and other messages received together."""
+    first = data_frame(100)
+    second = data_frame(40)
+    other = b"APS1100160001END\n"
+    buffer = FrameBuffer()
+    assert buffer.feed(first + other + second[:20]) == [first, other]
+    assert buffer.feed(second[20:]) == [second]
+
+
+def test_feed_frame_cut_short() -> None:
+    """Test a frame cut short by the start of another is returned as is."""
+    cut = data_frame(100)[:60]
+    frame = data_frame(100)
+    buffer = FrameBuffer()
+    assert buffer.feed(cut + frame) == [cut, frame]
+
+
+def test_feed_discards_frame_without_end() -> None:
+    """Test data without frame end over the maximum frame size is discarded."""
+    buffer = FrameBuffer(max_frame_size=200)
+    assert buffer.feed(data_frame(300)[:-4]) == []
+    assert len(buffer) == 0
+    frame = data_frame(50)
+    assert buffer.feed(frame) == [frame]
+
+
+def test_read_frames() -> None:
+    """Test reading frames from a stream until it closes."""
+    frame = data_frame(100)
+
+    async def read() -> list[list[bytes]]:
+        reader = asyncio.StreamReader()
+        reader.feed_data(frame[:30])
+        reader.feed_data(frame[30:] + frame[:10])
+        reader.feed_eof()
+        buffer = FrameBuffer()
+        return [
+            await read_frames(reader, buffer),
+            await read_frames(reader, buffer),
+        ]
+
+    assert asyncio.run(read()) == [[frame], []]
@@ -0,0 +1,49 @@
+"""Tests of the frame hub."""
+
+import pytest
+
+from custom_components.apsystems_ecu_proxy.hub import FrameHub
+
+FRAME = {
+    "ecu-id": "216000000001",
+    "inverters": {"801000000001": {"uid": "801000000001"}},
+}
+
+
+def test_publish_to_device_listeners() -> None:
+    """Test frames reach the listeners of the ECU and its inverters."""
+    hub = FrameHub()
+    received = []
+    hub.async_subscribe("ecu_216000000001", lambda frame, data: received.append(data))
+    unsubscribe = hub.async_subscribe(
+        "inverter_801000000001", lambda frame, data: received.append(data)
+    )
+    hub.async_subscribe("inverter_801000000002", lambda frame, data: received.append(1))
+
+    hub.async_publish(FRAME)
+    assert received == [FRAME, FRAME["inverters"]["801000000001"]]
+
+    unsubscribe()
+    assert hub.listener_count == 2
+
+
+def test_publish_isolates_listener_errors(caplog: pytest.LogCaptureFixture) -> None:
+    """Test a listener raising does not stop the other listeners."""
+    hub = FrameHub()
+    received = []
+
+    def failing(frame, data) -> None:
+        raise ValueError("bad value")
+
+    hub.async_subscribe("ecu_216000000001", failing)
+    hub.async_subscribe("ecu_216000000001", lambda frame, data: received.append(1))
+    hub.async_subscribe("inverter_801000000001", failing)
+    hub.async_subscribe("inverter_801000000001", lambda frame, data: received.append(2))
+
+    hub.async_publish(FRAME)
+
+    assert received == [1, 2]
+    assert [record.exc_info[1].args for record in caplog.records] == [
+        ("bad value",),
+        ("bad value",),
+    ]
@@ -0,0 +1,72 @@
+"""Tests of the inverter model registry."""
+
+import json
+from pathlib import Path
+
+import pytest
+
+from custom_components.apsystems_ecu_proxy import parser
+from custom_components.apsystems_ecu_proxy.parser import load_models, parse_inverters
+from tools.frames import build_frame
+
+MODEL = {"name": "DS3-H", "channels": 2, "model_codes": ["999"]}
+
+
+@pytest.fixture(autouse=True)
+def registry(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Keep models registered by a test out of the others."""
+    monkeypatch.setattr(parser, "_MODEL_LAYOUTS", dict(parser._MODEL_LAYOUTS))
+    monkeypatch.setattr(parser, "_unknown_model_codes", set())
+
+
+def write_models(tmp_path: Path, models) -> str:
+    """Write models to a JSON file and return its path."""
+    path = tmp_path / parser.MODELS_FILE
+    path.write_text(json.dumps(models), encoding="utf-8")
+    return str(path)
+
+
+def test_unknown_model_has_no_channels() -> None:
+    """Test an inverter of an unknown model code is reported without channels."""
+    inverters = parse_inverters(build_frame(inverters=2, model=MODEL))
+
+    assert len(inverters) == 2
+    for inverter in inverters.values():
+        assert inverter["model"] == parser.UNKNOWN_MODEL
+        assert inverter["channel_qty"] == 0
+        assert inverter["power"] == []
+
+
+def test_load_models(tmp_path: Path) -> None:
+    """Test models loaded from a JSON file are used to parse inverters."""
+    assert load_models(write_models(tmp_path, [MODEL])) == ["999"]
+
+    inverters = parse_inverters(build_frame(inverters=2, model=MODEL))
+    first = inverters["999000000000"]
+    assert first["model"] == "DS3-H"
+    assert first["channel_qty"] == 2
+    assert first["power"] == [200, 201]
+    assert first["voltage"] == [30.0, 30.1]
+
+
+@pytest.mark.parametrize(
+    "models",
+    [
+        MODEL,
+        [MODEL, "QS1"],
+        [{**MODEL, "channels": 9}],
+        [{**MODEL, "model_codes": ["99"]}],
+        [{**MODEL, "power_offsets": [10, 20]}],
+    ],
+)
+def test_invalid_models_rejected(tmp_path: Path, models) -> None:
+    """Test no model of an invalid file is registered."""
+    assert load_models(write_models(tmp_path, models)) == []
+
+    inverters = parse_inverters(build_frame(inverters=1, model=MODEL))
+    assert inverters["999000000000"]["channel_qty"] == 0
+
+
+def test_missing_file(tmp_path: Path) -> None:
+    """Test a missing models file is not an error."""
+    assert load_models(str(tmp_path / parser.MODELS_FILE)) == []
@@ -0,0 +1,74 @@
+"""Tests of the period start scheduler."""
+
+from datetime import datetime
+
+import pytest
+
+from custom_components.apsystems_ecu_proxy import scheduler
+from custom_components.apsystems_ecu_proxy.const import SummationPeriod
+from custom_components.apsystems_ecu_proxy.scheduler import PeriodScheduler
+
+
+@pytest.fixture
+def timer(monkeypatch: pytest.MonkeyPatch) -> list[datetime]:
+    """Return times the scheduler armed its timer for."""
+    armed = []
+
+    def track_point_in_time(hass, action, point_in_time):
+        armed.append(point_in_time)
+        return lambda: None
+
+    monkeypatch.setattr(scheduler, "async_track_point_in_time", track_point_in_time)
+    monkeypatch.setattr(scheduler.dt_util, "now", lambda: datetime(2024, 6, 30, 23, 30))
+    monkeypatch.setattr(scheduler.dt_util, "as_local", lambda timestamp: timestamp)
+    return armed
+
+
+def test_starts_periods_at_boundary(timer: list[datetime]) -> None:
+    """Test periods starting together are started shortest first."""
+    started = []
+    period_scheduler = PeriodScheduler(
+        None, lambda period, start: started.append((period, start))
+    )
+    period_scheduler.async_start()
+    midnight = datetime(2024, 7, 1)
+    assert timer == [midnight]
+
+    period_scheduler._fire(midnight)
+
+    # Monday 1 July starts a week and a month, but not a year.
+    assert started == [
+        (SummationPeriod.HOURLY, midnight),
+        (SummationPeriod.DAILY, midnight),
+        (SummationPeriod.WEEKLY, midnight),
+        (SummationPeriod.MONTHLY, midnight),
+    ]
+    assert timer[-1] == datetime(2024, 7, 1, 1)
+    assert period_scheduler.next_starts == {
+        SummationPeriod.HOURLY: datetime(2024, 7, 1, 1),
+        SummationPeriod.DAILY: datetime(2024, 7, 2),
+        SummationPeriod.WEEKLY: datetime(2024, 7, 8),
+        SummationPeriod.MONTHLY: datetime(2024, 8, 1),
+        SummationPeriod.YEARLY: datetime(2025, 1, 1),
+    }
+
+
+def test_starts_periods_missed(timer: list[datetime]) -> None:
+    """Test a late timer starts the periods it missed once."""
+    started = []
+    period_scheduler = PeriodScheduler(
+        None, lambda period, start: started.append((period, start))
+    )
+    period_scheduler.async_start()
+
+    period_scheduler._fire(datetime(2024, 7, 1, 2, 10))
+
+    assert [period for period, _ in started] == [
+        SummationPeriod.HOURLY,
+        SummationPeriod.DAILY,
+        SummationPeriod.WEEKLY,
+        SummationPeriod.MONTHLY,
+    ]
+    assert period_scheduler.next_starts[SummationPeriod.HOURLY] == datetime(
+        2024, 7, 1, 3
+    )
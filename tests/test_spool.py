@@ -0,0 +1,188 @@
+"""Tests of the spool of frames not relayed to EMA."""
+
+import asyncio
+from pathlib import Path
+
+import pytest
+
+from custom_components.apsystems_ecu_proxy.ema import EMAUnavailableError
+from custom_components.apsystems_ecu_proxy.spool import RECORD_HEADER, FrameSpool
+
+FRAMES = [b"APS18AA%03dEND\n" % idx for idx in range(5)]
+
+
+class FakeEMA:
+    """Record frames sent, failing after a number of them."""
+
+    def __init__(self, fail_after: int | None = None) -> None:
+        """Initialise fake."""
+        self.fail_after = fail_after
+        self.sent: list[bytes] = []
+
+    async def send(self, frame: bytes) -> bytes:
+        """Accept frame or fail."""
+        if self.fail_after is not None and len(self.sent) >= self.fail_after:
+            raise EMAUnavailableError("EMA down")
+        self.sent.append(frame)
+        return b"APS1100160001END\n"
+
+
+async def spool_frames(spool: FrameSpool, frames: list[bytes]) -> None:
+    """Append frames and wait until they are written."""
+    for frame in frames:
+        spool.append(frame)
+    if spool._flush_task:
+        await spool._flush_task
+
+
+def test_spool_forwards_in_order(tmp_path: Path) -> None:
+    """Test frames are forwarded in order and the spool is emptied."""
+    ema = FakeEMA()
+
+    async def run() -> FrameSpool:
+        spool = FrameSpool(str(tmp_path / "8995.spool"), ema.send)
+        await spool.start()
+        await spool_frames(spool, FRAMES)
+        await spool._drain()
+        await spool.stop()
+        return spool
+
+    spool = asyncio.run(run())
+    assert ema.sent == FRAMES
+    assert spool.forwarded == len(FRAMES)
+    assert not spool.has_pending
+    assert (tmp_path / "8995.spool").stat().st_size == 0
+
+
+def test_spool_resumes_from_offset(tmp_path: Path) -> None:
+    """Test a restart continues after the frames already forwarded."""
+    path = str(tmp_path / "8995.spool")
+    first = FakeEMA(fail_after=2)
+    second = FakeEMA()
+
+    async def run() -> tuple[int, int]:
+        spool = FrameSpool(path, first.send)
+        await spool.start()
+        await spool_frames(spool, FRAMES)
+        await spool._drain()
+        await spool.stop()
+        offset = spool.offset
+
+        spool = FrameSpool(path, second.send)
+        await spool.start()
+        resumed_offset = spool.offset
+        await spool._drain()
+        await spool.stop()
+        return offset, resumed_offset
+
+    offset, resumed_offset = asyncio.run(run())
+    assert first.sent == FRAMES[:2]
+    assert offset == resumed_offset == 2 * (RECORD_HEADER.size + len(FRAMES[0]))
+    assert second.sent == FRAMES[2:]
+
+
+def test_spool_compacts_oldest_frames(tmp_path: Path) -> None:
+    """Test a full spool drops forwarded and then the oldest frames."""
+    record_size = RECORD_HEADER.size + len(FRAMES[0])
+    ema = FakeEMA(fail_after=1)
+
+    async def run() -> FrameSpool:
+        spool = FrameSpool(
+            str(tmp_path / "8995.spool"), ema.send, max_size=4 * record_size
+        )
+        await spool.start()
+        await spool_frames(spool, FRAMES[:2])
+        await spool._drain()
+        # Over the limit, compacted to 3/4 of it.
+        await spool_frames(spool, FRAMES[2:])
+        ema.fail_after = None
+        await spool._drain()
+        await spool.stop()
+        return spool
+
+    spool = asyncio.run(run())
+    assert ema.sent == [FRAMES[0], *FRAMES[2:]]
+    assert spool.evicted == 1
+
+
+def test_spool_compaction_while_forwarding(tmp_path: Path) -> None:
+    """Test frames forwarded while the spool is compacted are not sent again."""
+    record_size = RECORD_HEADER.size + len(FRAMES[0])
+    sent = []
+
+    async def run() -> FrameSpool:
+        spool = FrameSpool(str(tmp_path / "8995.spool"), None, max_size=4 * record_size)
+
+        async def send(frame: bytes) -> bytes:
+            if frame == FRAMES[1]:
+                # Frames arriving meanwhile fill the spool.
+                await spool_frames(spool, FRAMES[3:])
+            sent.append(frame)
+            return b"APS1100160001END\n"
+
+        spool.send = send
+        await spool.start()
+        await spool_frames(spool, FRAMES[:3])
+        await spool._drain()
+        await spool._drain()
+        await spool.stop()
+        return spool
+
+    spool = asyncio.run(run())
+    assert sent == FRAMES
+    assert not spool.has_pending
+
+
+def test_spool_frame_compacted_while_failing(tmp_path: Path) -> None:
+    """Test a frame compacted away while its forwarding fails is spooled again."""
+    record_size = RECORD_HEADER.size + len(FRAMES[0])
+    ema = FakeEMA()
+
+    async def run() -> FrameSpool:
+        spool = FrameSpool(str(tmp_path / "8995.spool"), None, max_size=4 * record_size)
+
+        async def send(frame: bytes) -> bytes:
+            if frame == FRAMES[0] and not ema.sent:
+                await spool_frames(spool, FRAMES[2:])
+                raise EMAUnavailableError("EMA down")
+            return await ema.send(frame)
+
+        spool.send = send
+        await spool.start()
+        await spool_frames(spool, FRAMES[:2])
+        await spool._drain()
+        if spool._flush_task:
+            await spool._flush_task
+        await spool._drain()
+        await spool.stop()
+        return spool
+
+    spool = asyncio.run(run())
+    # Compaction keeps the newest frames within 3/4 of the limit.
+    assert ema.sent == [*FRAMES[2:], FRAMES[0]]
+    assert spool.evicted == 1
+
+
+def test_spool_read_error(tmp_path: Path, caplog: pytest.LogCaptureFixture) -> None:
+    """Test an error reading the spool stops forwarding until the next drain."""
+    ema = FakeEMA()
+
+    async def run() -> None:
+        spool = FrameSpool(str(tmp_path / "8995.spool"), ema.send)
+        await spool.start()
+        await spool_frames(spool, FRAMES)
+        read = spool._read
+
+        def failing_read(offset: int, count: int):
+            spool._read = read
+            raise OSError("disk error")
+
+        spool._read = failing_read
+        await spool._drain()
+        assert ema.sent == []
+        await spool._drain()
+        await spool.stop()
+
+    asyncio.run(run())
+    assert ema.sent == FRAMES
+    assert "disk error" in caplog.text
@@ -0,0 +1,77 @@
+"""Tests of the stale device watchdog."""
+
+import pytest
+
+from custom_components.apsystems_ecu_proxy import watchdog
+from custom_components.apsystems_ecu_proxy.watchdog import StaleDeviceWatchdog
+
+
+@pytest.fixture
+def delays(monkeypatch: pytest.MonkeyPatch) -> list[float | None]:
+    """Return delays the timer was armed with, None when cancelled."""
+    armed: list[float | None] = []
+
+    def call_later(hass, delay: float, action):
+        armed.append(delay)
+        return lambda: armed.append(None)
+
+    monkeypatch.setattr(watchdog, "async_call_later", call_later)
+    return armed
+
+
+def test_reports_devices_not_seen(delays: list[float | None]) -> None:
+    """Test only devices not seen within the timeout are reported."""
+    stale = []
+    dog = StaleDeviceWatchdog(None, 10, stale.append)
+    dog.seen("ecu_1", 0)
+    dog.seen("inverter_1", 0)
+    dog.seen("ecu_1", 5)
+    assert delays == [10]
+
+    dog.expire(10)
+    assert stale == ["inverter_1"]
+    # Armed again for the moved deadline.
+    assert delays[-1] == 5
+
+    dog.expire(15)
+    assert stale == ["inverter_1", "ecu_1"]
+    assert dog.deadlines == {}
+
+
+def test_watches_device_seen_again(delays: list[float | None]) -> None:
+    """Test a stale device is watched again once seen."""
+    stale = []
+    dog = StaleDeviceWatchdog(None, 10, stale.append)
+    dog.seen("ecu_1", 0)
+    dog.expire(10)
+
+    dog.seen("ecu_1", 12)
+    assert delays[-1] == 10
+    dog.expire(22)
+    assert stale == ["ecu_1", "ecu_1"]
+
+
+def test_lowered_timeout_applies_to_watched_devices(
+    delays: list[float | None],
+) -> None:
+    """Test lowering the timeout moves deadlines forward."""
+    stale = []
+    dog = StaleDeviceWatchdog(None, 600, stale.append)
+    dog.seen("ecu_1", 0)
+    dog.seen("inverter_1", 100)
+
+    dog.set_timeout(60, 120)
+    assert dog.deadlines == {"ecu_1": 60, "inverter_1": 160}
+    assert delays[-1] == 0
+
+    dog.expire(120)
+    assert stale == ["ecu_1"]
+    assert delays[-1] == 40
+
+
+def test_stop_cancels_timer(delays: list[float | None]) -> None:
+    """Test stopping cancels the timer."""
+    dog = StaleDeviceWatchdog(None, 10, lambda device_key: None)
+    dog.seen("ecu_1", 0)
+    dog.async_stop()
+    assert delays == [10, None]
@@ -0,0 +1,4 @@
+"""Development tools for the APsystems ECU proxy integration."""
+
+# Shown in the usage of the tools, which import the integration package.
+REQUIREMENTS = "Needs Home Assistant installed, as in a development environment."
@@ -0,0 +1,291 @@
+"""Throughput benchmarks of the proxy from frame parsing to sensor fan-out.
+
+Needs Home Assistant installed, as in a development environment. Run from the
+repository root:
+
+    python -m tools.bench --ecus 2 --inverters 40 --output bench.json
+
+Each benchmark reports frames per second and per frame latency. Relaying is
+measured against the fake EMA of tools.fake_ema. Results are written as JSON so
+that releases can be compared.
+"""
+
+import argparse
+import asyncio
+from collections.abc import Callable
+from datetime import datetime
+import json
+import logging
+import os
+import platform
+import statistics
+import time
+from types import SimpleNamespace
+from typing import Any
+
+from custom_components.apsystems_ecu_proxy.api import MySocketAPI
+from custom_components.apsystems_ecu_proxy.hub import FrameHub
+from custom_components.apsystems_ecu_proxy.parser import INVERTER_MODELS, parse_frame
+from custom_components.apsystems_ecu_proxy.sensor import (
+    ECU_SENSORS,
+    INVERTER_CHANNEL_SENSORS,
+    INVERTER_SENSORS,
+    value_getter,
+)
+
+from . import REQUIREMENTS
+from .fake_ema import FakeEMA, Faults
+from .frames import build_frames
+
+MANIFEST = os.path.join(
+    os.path.dirname(__file__),
+    "..",
+    "custom_components",
+    "apsystems_ecu_proxy",
+    "manifest.json",
+)
+
+
+def summarise(name: str, latencies: list[float], elapsed: float) -> dict[str, Any]:
+    """Return result of a benchmark from per frame latencies in seconds."""
+    latencies = sorted(latencies)
+    return {
+        "name": name,
+        "frames": len(latencies),
+        "frames_per_second": round(len(latencies) / elapsed, 1),
+        "latency_us": {
+            "mean": round(statistics.fmean(latencies) * 1e6, 1),
+            "p50": round(latencies[len(latencies) // 2] * 1e6, 1),
+            "p95": round(latencies[int(len(latencies) * 0.95)] * 1e6, 1),
+            "max": round(latencies[-1] * 1e6, 1),
+        },
+    }
+
+
+def run_timed(
+    name: str, frames: list[Any], handle: Callable[[Any], Any], repeat: int
+) -> dict[str, Any]:
+    """Time handle on each frame, repeat times over."""
+    latencies = []
+    perf_counter = time.perf_counter
+    start = perf_counter()
+    for _ in range(repeat):
+        for frame in frames:
+            frame_start = perf_counter()
+            handle(frame)
+            latencies.append(perf_counter() - frame_start)
+    return summarise(name, latencies, perf_counter() - start)
+
+
+def bench_parser(frames: list[bytes], repeat: int) -> dict[str, Any]:
+    """Benchmark interpreting frames, formerly MySocketAPI.get_inverters."""
+    return run_timed("parse_frame", frames, parse_frame, repeat)
+
+
+def bench_hub_fanout(frames: list[bytes], repeat: int) -> dict[str, Any]:
+    """Benchmark FrameHub passing frames to the value getters of all their sensors.
+
+    Only the hub is measured. The rest of APIManager.async_update_callback, such as
+    the watchdog, device checks and energy integration, needs Home Assistant and
+    is not included, nor are state writes.
+    """
+    hub = FrameHub()
+    values = []
+    collect = values.append
+
+    def subscribe(device_key: str, parameter: str, channel: int | None = None):
+        get_value = value_getter(parameter, channel)
+        hub.async_subscribe(device_key, lambda frame, data: collect(get_value(data)))
+
+    parsed = [parse_frame(frame) for frame in frames]
+    for data in parsed:
+        for sensor in ECU_SENSORS:
+            subscribe(f"ecu_{data['ecu-id']}", sensor.parameter)
+        for uid, inverter in data["inverters"].items():
+            for sensor in INVERTER_SENSORS:
+                subscribe(f"inverter_{uid}", sensor.parameter)
+            for sensor in INVERTER_CHANNEL_SENSORS:
+                for channel in range(inverter["channel_qty"]):
+                    subscribe(f"inverter_{uid}", sensor.parameter, channel)
+
+    def publish(data: dict[str, Any]) -> None:
+        values.clear()
+        hub.async_publish(data)
+
+    result = run_timed("hub_fanout", parsed, publish, repeat)
+    result["listeners"] = hub.listener_count
+    return result
+
+
+async def bench_loopback(frames: list[bytes], repeat: int) -> list[dict[str, Any]]:
+    """Benchmark data_received over a loopback socket up to the callback.
+
+    Frames are sent one at a time for latency, then all at once for throughput.
+    Relaying to EMA is disabled.
+    """
+    received = asyncio.Queue()
+
+    api = MySocketAPI(
+        "127.0.0.1",
+        0,
+        lambda data: received.put_nowait(time.perf_counter()),
+        proxy_config(send_to_ema=False),
+    )
+    await api.start()
+    port = api.server.sockets[0].getsockname()[1]
+    _, writer = await asyncio.open_connection("127.0.0.1", port)
+    results = []
+
+    try:
+        latencies = []
+        start = time.perf_counter()
+        for _ in range(repeat):
+            for frame in frames:
+                sent = time.perf_counter()
+                writer.write(frame)
+                await writer.drain()
+                latencies.append(await received.get() - sent)
+        results.append(
+            summarise("data_received", latencies, time.perf_counter() - start)
+        )
+
+        latencies = []
+        start = time.perf_counter()
+        for _ in range(repeat):
+            for frame in frames:
+                writer.write(frame)
+        await writer.drain()
+        for _ in range(repeat * len(frames)):
+            latencies.append(await received.get() - start)
+        elapsed = time.perf_counter() - start
+        result = summarise("data_received_burst", latencies, elapsed)
+        # Latency in a burst includes waiting on the frames ahead.
+        result["latency_us"] = {"last": result["latency_us"]["max"]}
+        results.append(result)
+    finally:
+        writer.close()
+        await writer.wait_closed()
+        # Let the server side finish with the connection before stopping.
+        while api.connections:
+            await asyncio.sleep(0.01)
+        await api.stop()
+    return results
+
+
+async def bench_relay(
+    frames: list[bytes], repeat: int, ema_latency: float
+) -> dict[str, Any]:
+    """Benchmark relaying frames through the proxy to a fake EMA and back.
+
+    Latency is from sending a frame until the ECU side has the acknowledgement.
+    """
+    ema = FakeEMA("127.0.0.1", [0], faults=Faults(latency=ema_latency))
+    await ema.start()
+    api = MySocketAPI("127.0.0.1", 0, lambda data: None, proxy_config(send_to_ema=True))
+    # The proxy relays to the port it listens on, redirect to the fake EMA.
+    api.ema_pool.port = ema.ports[0]
+    await api.start()
+    port = api.server.sockets[0].getsockname()[1]
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+
+    try:
+        latencies = []
+        start = time.perf_counter()
+        for _ in range(repeat):
+            for frame in frames:
+                sent = time.perf_counter()
+                writer.write(frame)
+                await writer.drain()
+                await reader.readline()
+                latencies.append(time.perf_counter() - sent)
+        result = summarise("relay_to_ema", latencies, time.perf_counter() - start)
+        result["ema_latency_us"] = round(ema_latency * 1e6, 1)
+        result["ema_connections"] = api.ema_pool.connections_opened
+    finally:
+        writer.close()
+        await writer.wait_closed()
+        while api.connections:
+            await asyncio.sleep(0.01)
+        await api.stop()
+        await ema.stop()
+    return result
+
+
+def proxy_config(send_to_ema: bool) -> SimpleNamespace:
+    """Return stand-in config entry for a proxy on loopback."""
+    return SimpleNamespace(
+        data={
+            "ema_host": "127.0.0.1",
+            "message_ignore_age": "1800",
+            "send_to_ema": send_to_ema,
+        }
+    )
+
+
+def select_models(names: list[str] | None) -> list[dict]:
+    """Return inverter models by name, all if none given."""
+    if not names:
+        return INVERTER_MODELS
+    models = [model for model in INVERTER_MODELS if model["name"] in names]
+    if len(models) != len(names):
+        known = ", ".join(model["name"] for model in INVERTER_MODELS)
+        raise SystemExit(f"Unknown inverter model, choose from: {known}")
+    return models
+
+
+def main() -> None:
+    """Run benchmarks and write results."""
+    parser = argparse.ArgumentParser(
+        description=__doc__.splitlines()[0], epilog=REQUIREMENTS
+    )
+    parser.add_argument("--ecus", type=int, default=1)
+    parser.add_argument("--inverters", type=int, default=40, help="per ECU")
+    parser.add_argument(
+        "--models", nargs="+", help="inverter models to mix, default all"
+    )
+    parser.add_argument("--repeat", type=int, default=200)
+    parser.add_argument(
+        "--ema-latency", type=float, default=0, help="seconds the fake EMA waits"
+    )
+    parser.add_argument("--output", default="bench.json")
+    args = parser.parse_args()
+
+    # Keep debug logging of the integration from skewing results.
+    logging.basicConfig(level=logging.WARNING)
+
+    models = select_models(args.models)
+    frames = build_frames(args.ecus, args.inverters, models)
+
+    results = [bench_parser(frames, args.repeat), bench_hub_fanout(frames, args.repeat)]
+    results.extend(asyncio.run(bench_loopback(frames, args.repeat)))
+    results.append(asyncio.run(bench_relay(frames, args.repeat, args.ema_latency)))
+
+    with open(MANIFEST, encoding="utf-8") as file:
+        version = json.load(file)["version"]
+    report = {
+        "version": version,
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "ecus": args.ecus,
+        "inverters": args.inverters,
+        "models": [model["name"] for model in models],
+        "frame_bytes": sum(len(frame) for frame in frames) // len(frames),
+        "repeat": args.repeat,
+        "results": results,
+    }
+    with open(args.output, "w", encoding="utf-8") as file:
+        json.dump(report, file, indent=2)
+
+    for result in results:
+        latency = "  ".join(
+            f"{key} {value:.1f}" for key, value in result["latency_us"].items()
+        )
+        print(
+            f"{result['name']:<20} {result['frames_per_second']:>10.1f} frames/s  "
+            f"latency us: {latency}"
+        )
+    print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""Micro-benchmark of the frame parser against the former decode + regex path.
+
+Needs Home Assistant installed, as in a development environment. Run from the
+repository root:
+
+    python -m tools.bench_parser --inverters 120
+"""
+
+import argparse
+import re
+import timeit
+
+from custom_components.apsystems_ecu_proxy.parser import (
+    CURRENT_CHANNELS,
+    INVERTER_MODELS,
+    POWER_CHANNELS,
+    VOLTAGE_CHANNELS,
+    parse_inverters,
+)
+
+from . import REQUIREMENTS
+from .frames import build_frame
+
+
+def legacy_get_inverters(message: str) -> dict:
+    """Former MySocketAPI.get_inverters, kept as the baseline."""
+    inverters = {}
+
+    for idx, m in enumerate(re.finditer(r"END\d+", message)):
+        inverter = {}
+
+        def msg_slice(start_pos: int, end_pos: int, m: re.Match = m) -> int:
+            s = m.start()
+            return message[s + start_pos : s + end_pos]
+
+        inverter["uid"] = str(msg_slice(3, 15))
+        inverter["index"] = idx
+        inverter["temperature"] = int(msg_slice(25, 28)) - 100
+        inverter["frequency"] = int(msg_slice(20, 25)) / 10
+
+        model_code = str(msg_slice(3, 6))
+
+        for model_refs in INVERTER_MODELS:
+            if model_code in model_refs.get("model_codes"):
+                inverter["model"] = model_refs.get("name")
+                inverter["channel_qty"] = model_refs.get("channels")
+                inverter["power"] = [
+                    int(msg_slice(offset, offset + 3))
+                    for offset in POWER_CHANNELS[: model_refs.get("channels")]
+                ]
+                inverter["voltage"] = [
+                    int(msg_slice(offset, offset + 3)) / 10
+                    for offset in VOLTAGE_CHANNELS[: model_refs.get("channels")]
+                ]
+                inverter["current"] = [
+                    int(msg_slice(offset, offset + 3)) / 100
+                    for offset in CURRENT_CHANNELS[: model_refs.get("channels")]
+                ]
+
+                inverters[inverter.get("uid")] = inverter
+    return inverters
+
+
+def main() -> None:
+    """Run benchmark."""
+    parser = argparse.ArgumentParser(
+        description=__doc__.splitlines()[0], epilog=REQUIREMENTS
+    )
+    parser.add_argument("--inverters", type=int, nargs="+", default=[8, 40, 120])
+    parser.add_argument("--number", type=int, default=500)
+    args = parser.parse_args()
+
+    for model in INVERTER_MODELS:
+        for inverters in args.inverters:
+            frame = build_frame(inverters=inverters, model=model)
+            if parse_inverters(frame) != legacy_get_inverters(frame.decode()):
+                raise SystemExit(f"Parser mismatch for {model['name']}")
+
+            legacy = timeit.timeit(
+                lambda frame=frame: legacy_get_inverters(frame.decode("utf-8")),
+                number=args.number,
+            )
+            current = timeit.timeit(
+                lambda frame=frame: parse_inverters(frame), number=args.number
+            )
+            print(
+                f"{model['name']:<18} {inverters:>4} inverters  "
+                f"legacy {legacy / args.number * 1e6:8.1f} us  "
+                f"parser {current / args.number * 1e6:8.1f} us  "
+                f"x{legacy / current:.2f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
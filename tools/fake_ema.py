@@ -0,0 +1,199 @@
+"""Stand-in EMA server for testing the proxy without network access.
+
+Needs Home Assistant installed, as in a development environment. Run from the
+repository root:
+
+    python -m tools.fake_ema --latency 0.2 --drop 0.05 --reset 0.01
+
+By default it listens on 127.0.0.2, so it does not clash with a proxy listening
+on the same ports, and the proxy is pointed at it by setting the EMA host to
+127.0.0.2. Every message is answered with the acknowledgement configured for the
+longest matching prefix, for example:
+
+    --ack APS18=APS1100160001END --ack APS11=APS1100160002END
+
+Faults are injected at random with the given probabilities per message: drop
+(no response), reset (connection reset) and partial (half a response, then the
+connection is closed). Latency, with optional jitter, delays every response.
+"""
+
+import argparse
+import asyncio
+from collections import Counter
+from dataclasses import dataclass
+import logging
+import random
+import socket
+import struct
+
+from custom_components.apsystems_ecu_proxy.const import SOCKET_PORTS
+from custom_components.apsystems_ecu_proxy.framing import FrameBuffer, read_frames
+
+from . import REQUIREMENTS
+
+_LOGGER = logging.getLogger(__name__)
+
+# Answer to messages without a configured acknowledgement.
+DEFAULT_ACK = b"APS1100160001END\n"
+
+
+@dataclass
+class Faults:
+    """Probabilities and delays of injected faults."""
+
+    latency: float = 0
+    jitter: float = 0
+    drop: float = 0
+    reset: float = 0
+    partial: float = 0
+
+
+class FakeEMA:
+    """EMA stand-in listening on one or more ports."""
+
+    def __init__(
+        self,
+        host: str = "127.0.0.2",
+        ports: list[int] | None = None,
+        acks: dict[bytes, bytes] | None = None,
+        faults: Faults | None = None,
+        seed: int | None = None,
+    ) -> None:
+        """Initialise server."""
+        self.host = host
+        self.ports = list(SOCKET_PORTS if ports is None else ports)
+        # Longest prefix first so the most specific acknowledgement is found.
+        self.acks = dict(
+            sorted((acks or {}).items(), key=lambda ack: len(ack[0]), reverse=True)
+        )
+        self.faults = faults or Faults()
+        self.random = random.Random(seed)
+        self.counts: Counter[str] = Counter()
+        self.servers: list[asyncio.Server] = []
+
+    async def start(self) -> None:
+        """Start listening. Port 0 listens on a free port."""
+        for idx, port in enumerate(self.ports):
+            server = await asyncio.start_server(
+                lambda reader, writer, port=port: self._handle(reader, writer, port),
+                self.host,
+                port,
+            )
+            self.servers.append(server)
+            self.ports[idx] = server.sockets[0].getsockname()[1]
+        _LOGGER.info("Fake EMA listening on %s ports %s", self.host, self.ports)
+
+    async def stop(self) -> None:
+        """Stop listening."""
+        for server in self.servers:
+            server.close()
+            await server.wait_closed()
+        self.servers.clear()
+
+    def ack(self, message: bytes) -> bytes:
+        """Return acknowledgement of message."""
+        for prefix, response in self.acks.items():
+            if message.startswith(prefix):
+                return response
+        return DEFAULT_ACK
+
+    async def _handle(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter, port: int
+    ) -> None:
+        """Answer messages of one connection."""
+        self.counts["connections"] += 1
+        frame_buffer = FrameBuffer()
+        faults = self.faults
+        try:
+            while frames := await read_frames(reader, frame_buffer):
+                for message in frames:
+                    self.counts["received"] += 1
+                    _LOGGER.debug("Port %s received %s bytes", port, len(message))
+                    if faults.latency or faults.jitter:
+                        await asyncio.sleep(
+                            faults.latency + self.random.uniform(0, faults.jitter)
+                        )
+
+                    response = self.ack(message)
+                    fault = self.random.random()
+                    if fault < faults.reset:
+                        self.counts["reset"] += 1
+                        # Linger of 0 makes close send a reset.
+                        sock = writer.get_extra_info("socket")
+                        sock.setsockopt(
+                            socket.SOL_SOCKET, socket.SO_LINGER, struct.pack("ii", 1, 0)
+                        )
+                        writer.transport.abort()
+                        return
+                    fault -= faults.reset
+                    if fault < faults.drop:
+                        self.counts["dropped"] += 1
+                        continue
+                    fault -= faults.drop
+                    if fault < faults.partial:
+                        self.counts["partial"] += 1
+                        writer.write(response[: len(response) // 2])
+                        await writer.drain()
+                        return
+
+                    writer.write(response)
+                    await writer.drain()
+                    self.counts["acked"] += 1
+        except (ConnectionResetError, BrokenPipeError):
+            pass
+        finally:
+            writer.close()
+
+
+def parse_ack(value: str) -> tuple[bytes, bytes]:
+    """Parse PREFIX=RESPONSE, adding the newline ending a message."""
+    prefix, separator, response = value.partition("=")
+    if not separator:
+        raise argparse.ArgumentTypeError("use PREFIX=RESPONSE")
+    return prefix.encode(), response.encode() + b"\n"
+
+
+async def serve(server: FakeEMA) -> None:
+    """Run until interrupted, then print counts."""
+    await server.start()
+    print(f"Fake EMA listening on {server.host} ports {server.ports}")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await server.stop()
+        print(dict(server.counts))
+
+
+def main() -> None:
+    """Run fake EMA."""
+    parser = argparse.ArgumentParser(
+        description=__doc__.splitlines()[0], epilog=REQUIREMENTS
+    )
+    parser.add_argument("--host", default="127.0.0.2")
+    parser.add_argument("--ports", type=int, nargs="+", default=SOCKET_PORTS)
+    parser.add_argument("--ack", type=parse_ack, action="append", default=[])
+    parser.add_argument("--latency", type=float, default=0, help="seconds")
+    parser.add_argument("--jitter", type=float, default=0, help="seconds added")
+    parser.add_argument("--drop", type=float, default=0, help="probability")
+    parser.add_argument("--reset", type=float, default=0, help="probability")
+    parser.add_argument("--partial", type=float, default=0, help="probability")
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--debug", action="store_true")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.DEBUG if args.debug else logging.INFO)
+    server = FakeEMA(
+        args.host,
+        args.ports,
+        dict(args.ack),
+        Faults(args.latency, args.jitter, args.drop, args.reset, args.partial),
+        args.seed,
+    )
+    try:
+        asyncio.run(serve(server))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""Build synthetic APS18AA data frames for benchmarking.
+
+Needs Home Assistant installed, as in a development environment.
+"""
+
+from datetime import datetime
+
+from custom_components.apsystems_ecu_proxy.parser import (
+    CURRENT_CHANNELS,
+    FRAME_HEADER,
+    INVERTER_MODELS,
+    POWER_CHANNELS,
+    VOLTAGE_CHANNELS,
+)
+
+
+def build_inverter(uid: str, channels: int, channel: int = 0) -> bytes:
+    """Build an inverter record starting with its END marker."""
+    record = bytearray(b"0" * (POWER_CHANNELS[channels - 1] + 3))
+    record[0:3] = b"END"
+    record[3:15] = uid.encode()
+    record[20:25] = b"%05d" % 500  # 50.0 Hz
+    record[25:28] = b"%03d" % 135  # 35 C
+    for idx in range(channels):
+        level = (channel + idx) % 100
+        record[VOLTAGE_CHANNELS[idx] : VOLTAGE_CHANNELS[idx] + 3] = b"%03d" % (
+            300 + level
+        )
+        record[CURRENT_CHANNELS[idx] : CURRENT_CHANNELS[idx] + 3] = b"%03d" % (
+            100 + level
+        )
+        record[POWER_CHANNELS[idx] : POWER_CHANNELS[idx] + 3] = b"%03d" % (200 + level)
+    return bytes(record)
+
+
+def build_frame(
+    ecu_id: str = "216300012345",
+    inverters: int = 8,
+    model: dict | None = None,
+    timestamp: datetime | None = None,
+    models: list[dict] | None = None,
+    uid_prefix: str = "",
+) -> bytes:
+    """Build a data frame with the given number of inverters.
+
+    Inverters are of one model, or cycle through models if given. The uid prefix
+    keeps inverter uids unique between ECUs.
+    """
+    models = models or [model or INVERTER_MODELS[0]]
+    timestamp = timestamp or datetime.now()
+    serial_size = 9 - len(uid_prefix)
+
+    records = []
+    for idx in range(inverters):
+        inverter_model = models[idx % len(models)]
+        model_code = inverter_model["model_codes"][0]
+        uid = f"{model_code}{uid_prefix}{idx:0{serial_size}d}"
+        records.append(build_inverter(uid, inverter_model["channels"], idx))
+
+    body = (
+        b"00010001"
+        + ecu_id.encode()
+        + b"%012d" % (inverters * 25000)
+        + b"%018d" % 1234567
+        + timestamp.strftime("%Y%m%d%H%M%S").encode()
+        + b"%03d" % inverters
+        + b"".join(records)
+        + b"END\n"
+    )
+    # Length excludes the trailing newline and only has room for 3 digits.
+    length = (len(FRAME_HEADER) + 3 + len(body) - 1) % 1000
+    return FRAME_HEADER + b"%03d" % length + body
+
+
+def build_frames(
+    ecus: int = 1,
+    inverters: int = 8,
+    models: list[dict] | None = None,
+    timestamp: datetime | None = None,
+) -> list[bytes]:
+    """Build one data frame per ECU, each with its own ECU id and inverter uids."""
+    return [
+        build_frame(
+            ecu_id=f"2163{ecu:08d}",
+            inverters=inverters,
+            timestamp=timestamp,
+            models=models,
+            uid_prefix=f"{ecu:03d}",
+        )
+        for ecu in range(ecus)
+    ]
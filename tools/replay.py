@@ -0,0 +1,193 @@
+"""Replay recorded ECU messages into a running proxy.
+
+Needs Home Assistant installed, as in a development environment. Run from the
+repository root against a development instance listening on loopback:
+
+    python -m tools.replay frames.txt --speed 10
+
+Input is either a capture file written by the capture option (.jsonl.gz) or a
+text file with one message per line, preceded by the time it was received:
+
+    # Comments and blank lines are skipped.
+    2024-06-01T12:00:00 APS18AA...END
+    1717236300.5 APS18AA...END
+
+The time is a unix timestamp or an ISO date and time. Lines copied from a debug
+log also work, as the log time is followed by the message from the first APS on:
+
+    2024-06-01 12:00:00.123 DEBUG (MainThread) [...] From ECU @ ... - APS18AA...END
+
+Messages are sent in real time (--speed 1), accelerated (--speed N) or as fast as
+possible (--speed 0). Data frame timestamps are shifted so the first one is now
+and the message ignore age filter does not drop them (--timestamps shift), set
+to the time sent (now) or left as recorded (keep).
+"""
+
+import argparse
+import asyncio
+from collections.abc import Iterator
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+import gzip
+import re
+import time
+
+from custom_components.apsystems_ecu_proxy.capture import FILE_SUFFIX, decode_entry
+from custom_components.apsystems_ecu_proxy.const import SOCKET_PORTS
+from custom_components.apsystems_ecu_proxy.parser import (
+    FRAME_HEADER,
+    is_data_frame,
+    parse_timestamp,
+)
+
+from . import REQUIREMENTS
+
+# Time, anything in between such as log level and logger, and the message.
+LINE = re.compile(
+    r"^(?P<time>\d+(?:\.\d+)?|\d{4}-\d\d-\d\d[ T]\d\d:\d\d:\d\d(?:[.,]\d+)?)"
+    r"\s.*?(?P<message>APS\d.*?)\s*$"
+)
+TIMESTAMP = slice(60, 74)
+
+
+@dataclass
+class Message:
+    """Recorded message."""
+
+    received: float
+    port: int | None
+    data: bytes
+
+
+def read_capture(path: str) -> Iterator[Message]:
+    """Read messages from a capture file."""
+    with gzip.open(path, "rt", encoding="utf-8") as file:
+        for line in file:
+            if line.strip():
+                entry = decode_entry(line)
+                yield Message(entry["received"], entry["port"], entry["message"])
+
+
+def read_text(path: str) -> Iterator[Message]:
+    """Read messages from a text file of time and message lines."""
+    with open(path, encoding="latin-1") as file:
+        for number, line in enumerate(file, 1):
+            if not line.strip() or line.startswith("#"):
+                continue
+            if (match := LINE.match(line)) is None:
+                raise SystemExit(f"{path}:{number}: no time and message found")
+            received = match["time"].replace(",", ".")
+            if received.replace(".", "", 1).isdigit():
+                received = float(received)
+            else:
+                received = datetime.fromisoformat(received).timestamp()
+            # Lines lose the trailing newline the ECU sends.
+            data = match["message"].encode("latin-1") + b"\n"
+            yield Message(received, None, data)
+
+
+def read_messages(path: str) -> list[Message]:
+    """Read messages of a file, oldest first."""
+    reader = read_capture if path.endswith(FILE_SUFFIX) else read_text
+    return sorted(reader(path), key=lambda message: message.received)
+
+
+def rewrite_timestamp(data: bytes, timestamp: datetime) -> bytes:
+    """Return data frame with its timestamp replaced."""
+    return (
+        data[: TIMESTAMP.start]
+        + timestamp.strftime("%Y%m%d%H%M%S").encode()
+        + data[TIMESTAMP.stop :]
+    )
+
+
+async def discard_responses(reader: asyncio.StreamReader) -> None:
+    """Read and discard what the proxy sends back."""
+    while await reader.read(4096):
+        pass
+
+
+async def replay(
+    messages: list[Message],
+    host: str,
+    port: int | None,
+    speed: float,
+    timestamps: str,
+) -> None:
+    """Send messages with their recorded spacing divided by speed."""
+    connections: dict[int, asyncio.StreamWriter] = {}
+    readers: list[asyncio.Task] = []
+    first = messages[0].received
+    shift = None
+    sent = 0
+    start = time.monotonic()
+
+    try:
+        for message in messages:
+            if speed:
+                delay = start + (message.received - first) / speed - time.monotonic()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+
+            data = message.data
+            if is_data_frame(data) and len(data) >= TIMESTAMP.stop:
+                if timestamps == "now":
+                    data = rewrite_timestamp(data, datetime.now())
+                elif timestamps == "shift":
+                    recorded = parse_timestamp(data)
+                    if shift is None:
+                        shift = datetime.now().replace(microsecond=0) - recorded
+                    data = rewrite_timestamp(data, recorded + shift)
+
+            target_port = port or message.port or SOCKET_PORTS[0]
+            if (writer := connections.get(target_port)) is None:
+                reader, writer = await asyncio.open_connection(host, target_port)
+                connections[target_port] = writer
+                readers.append(asyncio.create_task(discard_responses(reader)))
+            writer.write(data)
+            await writer.drain()
+            sent += 1
+    finally:
+        for writer in connections.values():
+            writer.close()
+        for task in readers:
+            task.cancel()
+
+    elapsed = time.monotonic() - start
+    recorded = timedelta(seconds=round(messages[-1].received - first))
+    print(
+        f"Sent {sent} messages covering {recorded} in {elapsed:.1f}s "
+        f"({sent / elapsed if elapsed else 0:.1f}/s)"
+    )
+
+
+def main() -> None:
+    """Replay a file."""
+    parser = argparse.ArgumentParser(
+        description=__doc__.splitlines()[0], epilog=REQUIREMENTS
+    )
+    parser.add_argument("file", help="capture file or text file of messages")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument(
+        "--port", type=int, help="port to send to, default as captured or 8995"
+    )
+    parser.add_argument(
+        "--speed",
+        type=float,
+        default=1,
+        help="1 for real time, N for N times faster, 0 for as fast as possible",
+    )
+    parser.add_argument(
+        "--timestamps", choices=["shift", "now", "keep"], default="shift"
+    )
+    args = parser.parse_args()
+
+    if not (messages := read_messages(args.file)):
+        raise SystemExit(f"No messages in {args.file}")
+    data_frames = sum(message.data.startswith(FRAME_HEADER) for message in messages)
+    print(f"Replaying {len(messages)} messages, {data_frames} data frames")
+    asyncio.run(replay(messages, args.host, args.port, args.speed, args.timestamps))
+
+
+if __name__ == "__main__":
+    main()